@@ -0,0 +1,69 @@
+r"""
+Benchmark for the HTML emission of HtmlFragmentRenderer: renders a large
+synthetic document (paragraphs with text formatting and links, nested
+enumerations, headings, footnotes and figures) to HTML and reports the time
+per render and the output throughput.
+
+Run with::
+
+    python bench/bench_html_render.py [--sections N] [--repeat N]
+"""
+
+import sys
+import os.path
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from llm.llmstd import LLMStandardEnvironment
+from llm.fragmentrenderer.html import HtmlFragmentRenderer
+
+
+_paragraph = (
+    r"Some \textbf{bold} and \emph{emphasized} text with \textit{more "
+    r"\textbf{nested \emph{formatting}}}, inline math \(a_{ij} + b^2\), a "
+    r"link to \href{https://example.com/?a=1&b=2}{an \emph{example} site}"
+    r"\footnote{A \textbf{footnote}.} and a reference to \ref{figure:fig-SECNO}.  "
+)
+
+_section = (
+    r"\section{Section \emph{number} SECNO}" "\n\n"
+    + _paragraph * 4 + "\n\n"
+    + r"\begin{enumerate}\item First \textbf{item}\item Second item with "
+    + r"\(x\)\begin{itemize}\item Nested \emph{item}\item Another "
+    + r"\textit{one}\end{itemize}\item Third\end{enumerate}" "\n\n"
+    + r"\paragraph{Run-in heading} " + _paragraph * 2 + "\n\n"
+    + r"\begin{figure}\includegraphics{fig-SECNO.png}\caption{Figure "
+    + r"\textbf{caption}.}\label{figure:fig-SECNO}\end{figure}" "\n\n"
+)
+
+
+def main(argv=None):
+    args_parser = argparse.ArgumentParser()
+    args_parser.add_argument('--sections', type=int, default=100)
+    args_parser.add_argument('--repeat', type=int, default=5)
+    args = args_parser.parse_args(argv)
+
+    environment = LLMStandardEnvironment()
+    fragment = environment.make_fragment(
+        "".join([ _section.replace('SECNO', str(j)) for j in range(args.sections) ])
+    )
+
+    def render():
+        doc = environment.make_document(fragment.render)
+        return doc.render(HtmlFragmentRenderer())[0]
+
+    output_size = len(render())
+    print(f"{len(fragment.llm_text)} characters of LLM text, "
+          f"{output_size} characters of HTML")
+
+    timer = timeit.Timer(render)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=args.repeat, number=number)) / number
+    print(f"HtmlFragmentRenderer: {best*1000:8.2f} ms/render, "
+          f"{output_size/best/1e6:6.2f} M characters/s")
+
+
+if __name__ == '__main__':
+    main()
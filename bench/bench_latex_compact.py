@@ -0,0 +1,116 @@
+r"""
+Benchmark for the compact output mode of LatexFragmentRenderer (see
+`LatexFragmentRenderer.latex_compact_output`): renders a large synthetic
+document to LaTeX in the default and in the compact mode and reports the size
+of the generated code and the time per render.  If `pdflatex` is available,
+the time it takes to compile each version is also reported.
+
+Run with::
+
+    python bench/bench_latex_compact.py [--sections N] [--repeat N]
+"""
+
+import sys
+import os.path
+import argparse
+import timeit
+import time
+import shutil
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from llm.llmstd import LLMStandardEnvironment
+from llm.fragmentrenderer.latex import LatexFragmentRenderer
+
+
+_paragraph = (
+    r"Some \textbf{bold} and \emph{emphasized} text with \textit{more "
+    r"\textbf{nested \emph{formatting}}}, inline math \(a_{ij} + b^2\), a "
+    r"link to \href{https://example.com/?a=1&b=2}{an \emph{example} site}"
+    r"\footnote{A \textbf{footnote}.} and a reference to \ref{figure:fig-SECNO}.  "
+)
+
+_section = (
+    r"\section{Section \emph{number} SECNO}" "\n\n"
+    + _paragraph * 4 + "\n\n"
+    + r"\begin{enumerate}\item First \textbf{item}\item Second item with "
+    + r"\(x\)\begin{itemize}\item Nested \emph{item}\item Another "
+    + r"\textit{one}\end{itemize}\item Third\end{enumerate}" "\n\n"
+    + r"\paragraph{Run-in heading} " + _paragraph * 2 + "\n\n"
+    + r"\begin{figure}\includegraphics{fig-SECNO.png}\caption{Figure "
+    + r"\textbf{caption}.}\label{figure:fig-SECNO}\end{figure}" "\n\n"
+)
+
+_latex_preamble = r"""\documentclass{report}
+\usepackage[draft]{graphicx}
+\usepackage{hyperref}
+\begin{document}
+"""
+
+_latex_postamble = r"""
+\end{document}
+"""
+
+
+def compile_latex(pdflatex, latex_code, repeat):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with open(os.path.join(tmpdir, 'doc.tex'), 'w', encoding='utf-8') as f:
+            f.write(_latex_preamble + latex_code + _latex_postamble)
+        times = []
+        for j in range(repeat):
+            t0 = time.perf_counter()
+            subprocess.run(
+                [pdflatex, '-interaction=nonstopmode', '-halt-on-error', 'doc.tex'],
+                cwd=tmpdir,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                check=True,
+            )
+            times.append(time.perf_counter() - t0)
+        return min(times)
+
+
+def main(argv=None):
+    args_parser = argparse.ArgumentParser()
+    args_parser.add_argument('--sections', type=int, default=100)
+    args_parser.add_argument('--repeat', type=int, default=5)
+    args = args_parser.parse_args(argv)
+
+    environment = LLMStandardEnvironment()
+    fragment = environment.make_fragment(
+        "".join([ _section.replace('SECNO', str(j)) for j in range(args.sections) ])
+    )
+
+    pdflatex = shutil.which('pdflatex')
+    if pdflatex is None:
+        print("(pdflatex not found, not measuring compile times)")
+
+    for latex_compact_output in (False, True):
+
+        fragment_renderer = LatexFragmentRenderer()
+        fragment_renderer.latex_compact_output = latex_compact_output
+
+        def render():
+            doc = environment.make_document(fragment.render)
+            return doc.render(fragment_renderer)[0]
+
+        latex_code = render()
+
+        timer = timeit.Timer(render)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=args.repeat, number=number)) / number
+
+        mode = "compact" if latex_compact_output else "default"
+        print(f"{mode:>8s}: {len(latex_code):9d} characters, "
+              f"{latex_code.count(chr(10)):7d} lines, "
+              f"{best*1000:8.2f} ms/render")
+
+        if pdflatex is not None:
+            compile_time = compile_latex(pdflatex, latex_code, args.repeat)
+            print(f"{'':>8s}  pdflatex: {compile_time*1000:8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+r"""
+Microbenchmark for FragmentRenderer.render_node(): renders a markup-heavy
+fragment with the HTML, text and LaTeX renderers and reports the throughput
+in rendered nodes per second.
+
+Run with::
+
+    python bench/bench_render_node.py [--repeat N]
+"""
+
+import sys
+import os.path
+import argparse
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pylatexenc.latexnodes import nodes as latexnodes_nodes
+
+from llm.llmstd import LLMStandardEnvironment
+from llm.fragmentrenderer.html import HtmlFragmentRenderer
+from llm.fragmentrenderer.text import TextFragmentRenderer
+from llm.fragmentrenderer.latex import LatexFragmentRenderer
+
+
+_paragraph = (
+    r"Some \textbf{bold} and \emph{emphasized} text with \textit{more "
+    r"\textbf{nested} formatting}, inline math \(a_{ij} + b^2\), a "
+    r"non-breaking~space and a link to \href{https://example.com/}{an "
+    r"\emph{example} site}.  "
+)
+
+_block = (
+    _paragraph * 3 + "\n\n"
+    + r"\begin{enumerate}\item First \textbf{item}\item Second item with "
+    + r"\(x\)\item Third\end{enumerate}" + "\n\n"
+    + r"\[ \sum_{k} x_k = 1 \]" + "\n\n"
+)
+
+
+class _NodeCounter:
+    def __init__(self):
+        self.count = 0
+
+    def count_nodes(self, value):
+        if value is None:
+            return
+        if isinstance(value, latexnodes_nodes.LatexNodeList):
+            for n in value:
+                self.count_nodes(n)
+            return
+        self.count += 1
+        if isinstance(value, (latexnodes_nodes.LatexGroupNode,
+                              latexnodes_nodes.LatexEnvironmentNode,
+                              latexnodes_nodes.LatexMathNode)):
+            self.count_nodes(value.nodelist)
+        if getattr(value, 'nodeargd', None) is not None:
+            for arg in value.nodeargd.argnlist:
+                self.count_nodes(arg)
+
+
+def main(argv=None):
+    args_parser = argparse.ArgumentParser()
+    args_parser.add_argument('--blocks', type=int, default=50)
+    args_parser.add_argument('--repeat', type=int, default=5)
+    args = args_parser.parse_args(argv)
+
+    environment = LLMStandardEnvironment()
+    fragment = environment.make_fragment(_block * args.blocks, standalone_mode=True)
+
+    counter = _NodeCounter()
+    counter.count_nodes(fragment.nodes)
+    num_nodes = counter.count
+
+    print(f"{num_nodes} nodes, {len(fragment.llm_text)} characters")
+
+    for fragment_renderer in (HtmlFragmentRenderer(), TextFragmentRenderer(),
+                              LatexFragmentRenderer()):
+        timer = timeit.Timer(
+            lambda: fragment.render_standalone(fragment_renderer)
+        )
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=args.repeat, number=number)) / number
+        print(f"{fragment_renderer.__class__.__name__:>24}: "
+              f"{best*1000:8.2f} ms/render, {num_nodes/best:10.0f} nodes/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,3 +6,17 @@
 __version__ = "0.1.0beta2"
 
 # ALSO BUMP VERSION NUMBER IN pyproject.toml !!
+
+
+### BEGIN_LLM_PYTHON_ONLY
+
+def render_many(*args, **kwargs):
+    r"""
+    Render many LLM texts in parallel, using a pool of worker processes.  See
+    :py:func:`llm.batchrender.render_many()`.
+    """
+    # import here to keep `import llm` free of any dependencies
+    from .batchrender import render_many as _render_many
+    return _render_many(*args, **kwargs)
+
+### END_LLM_PYTHON_ONLY
@@ -34,6 +34,11 @@ def main(cmdargs=None):
                              const=2,
                              help="Enable long verbose/debug output (include pylatexenc debug)")
 
+    args_parser.add_argument('--parse-cache-dir', action='store',
+                             default=None,
+                             help="Store parsed content in this folder and reuse it "
+                             "in subsequent runs")
+
     args_parser.add_argument('files', metavar="FILE", nargs='*',
                              help='Input files (if none specified, read from stdandard input)')
 
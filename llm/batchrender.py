@@ -0,0 +1,243 @@
+import os
+import gc
+import collections
+import concurrent.futures
+
+import logging
+logger = logging.getLogger(__name__)
+
+from pylatexenc.latexnodes import LatexWalkerParseError
+
+from .llmstd import LLMStandardEnvironment
+from .fragmentrenderer.html import HtmlFragmentRenderer
+from .fragmentrenderer.text import TextFragmentRenderer
+from .fragmentrenderer.latex import LatexFragmentRenderer
+
+
+fragment_renderer_classes_by_format = {
+    'html': HtmlFragmentRenderer,
+    'text': TextFragmentRenderer,
+    'latex': LatexFragmentRenderer,
+}
+
+
+class RenderManyTaskError(Exception):
+    r"""
+    Raised (or returned, with `return_exceptions=True`) by
+    :py:func:`render_many()` when a given LLM text could not be parsed or
+    rendered.  The attribute `index` is the position of the LLM text in the
+    input and `message` describes the error.
+
+    (Errors raised in worker processes are reported via this exception class
+    because the original exception objects cannot always be pickled.)
+    """
+    def __init__(self, index, message):
+        super().__init__(index, message)
+        self.index = index
+        self.message = message
+
+    def __str__(self):
+        return f"Error rendering LLM text #{self.index}: {self.message}"
+
+
+
+# ------------------------------------------------------------------------------
+
+# state of a render_many() worker process
+_worker_environment = None
+_worker_fragment_renderer = None
+
+
+def _init_worker(environment, fragment_renderer):
+    global _worker_environment, _worker_fragment_renderer
+    if environment is None:
+        environment = LLMStandardEnvironment()
+    _worker_environment = environment
+    _worker_fragment_renderer = fragment_renderer
+    # Setup is done; move everything allocated so far out of the reach of the
+    # garbage collector, so that it doesn't need to scan these objects over and
+    # over again (and doesn't touch copy-on-write pages of forked workers).
+    gc.freeze()
+
+
+def _render_one(environment, fragment_renderer, llm_text, options):
+    options = dict(options)
+    options.setdefault('standalone_mode', True)
+    options.setdefault('silent', True)
+    fragment = environment.make_fragment(llm_text, **options)
+    if fragment.standalone_mode:
+        return fragment.render_standalone(fragment_renderer)
+    doc = environment.make_document(fragment.render)
+    result, _ = doc.render(fragment_renderer)
+    return result
+
+
+def _render_chunk(chunk, return_exceptions):
+    results = []
+    for index, llm_text, options in chunk:
+        try:
+            result = _render_one(_worker_environment, _worker_fragment_renderer,
+                                 llm_text, options)
+        except LatexWalkerParseError as e:
+            result = RenderManyTaskError(
+                index, _worker_environment.get_parse_error_message(e)
+            )
+        except Exception as e:
+            result = RenderManyTaskError(index, f"{e.__class__.__name__}: {e}")
+        results.append( (index, result) )
+        if isinstance(result, RenderManyTaskError) and not return_exceptions:
+            # don't render the rest of the chunk; the parent process raises
+            # the error once it has yielded the results that precede it
+            break
+    return results
+
+
+def _iter_chunk_results(chunk_results, ordered, return_exceptions):
+    for index, result in chunk_results:
+        if isinstance(result, RenderManyTaskError) and not return_exceptions:
+            raise result
+        if ordered:
+            yield result
+        else:
+            yield (index, result)
+
+
+def _iter_chunks(llm_texts, chunk_size):
+    chunk = []
+    for index, item in enumerate(llm_texts):
+        if isinstance(item, str):
+            llm_text, options = item, {}
+        else:
+            llm_text, options = item
+            if options is None:
+                options = {}
+        chunk.append( (index, llm_text, options) )
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+
+def render_many(llm_texts, format='html', *,
+                environment=None,
+                fragment_renderer=None,
+                ordered=True,
+                return_exceptions=False,
+                max_workers=None,
+                chunk_size=64,
+                mp_context=None):
+    r"""
+    Render many LLM texts in parallel using a pool of worker processes.
+
+    Returns an iterator over the results.  Results are produced lazily, as the
+    workers complete them.
+
+    - `llm_texts` is an iterable whose items are either strings (the LLM text
+      to render) or tuples `(llm_text, options)` where `options` is a
+      dictionary of keyword arguments for
+      :py:meth:`LLMEnvironment.make_fragment()` (e.g., `is_block_level`,
+      `resource_info`, `what`).  The iterable is consumed progressively.
+
+      Fragments are parsed in standalone mode by default and rendered with
+      :py:meth:`LLMFragment.render_standalone()`.  If you set
+      `standalone_mode=False` in the options, the fragment is rendered in its
+      own document instead (endnotes are not included in the result).
+
+    - `format` is one of 'html', 'text' or 'latex'.  Alternatively, specify a
+      fragment renderer instance in `fragment_renderer`, which is then pickled
+      and sent to the workers.
+
+    - `environment` is the environment to use to parse the LLM texts.  It must
+      be picklable; it is sent once to each worker when the worker is started.
+      By default, each worker builds a default
+      :py:class:`~llm.llmstd.LLMStandardEnvironment`.
+
+    - If `ordered=True`, the results are yielded in the same order as the
+      input texts.  If `ordered=False`, tuples `(index, result)` are yielded as
+      soon as they are available, where `index` is the position of the
+      corresponding text in `llm_texts`.
+
+    - If a text cannot be parsed or rendered, a :py:exc:`RenderManyTaskError`
+      is raised when the corresponding result is reached, after all the
+      results that precede it have been yielded (with `ordered=False`, some
+      results for later texts may also have been yielded before).  If
+      `return_exceptions=True`, the exception object is returned in place of
+      the result instead.
+
+    - `max_workers` and `mp_context` are passed on to
+      :py:class:`concurrent.futures.ProcessPoolExecutor`.  The texts are sent to
+      the workers in chunks of `chunk_size` items to reduce communication
+      overhead.
+    """
+
+    if fragment_renderer is None:
+        fragment_renderer = fragment_renderer_classes_by_format[format]()
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    # don't read the entire input in advance -- keep a few chunks per worker
+    # in flight
+    max_pending = 4 * max_workers
+
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=mp_context,
+        initializer=_init_worker,
+        initargs=(environment, fragment_renderer),
+    )
+
+    # futures that were submitted but whose results were not yielded yet
+    pending = collections.deque() if ordered else set()
+
+    with executor:
+        try:
+            yield from _render_many_results(executor, pending, llm_texts, ordered,
+                                            return_exceptions, chunk_size, max_pending)
+        finally:
+            # If we're here because of an error or because the caller stopped
+            # iterating early, don't wait for the remaining chunks to be
+            # rendered when the executor shuts down.  (We can't use
+            # `shutdown(cancel_futures=True)`, which requires Python 3.9.)
+            for future in pending:
+                future.cancel()
+
+
+def _render_many_results(executor, pending, llm_texts, ordered, return_exceptions,
+                         chunk_size, max_pending):
+
+    chunks = _iter_chunks(llm_texts, chunk_size)
+
+    if ordered:
+        for chunk in chunks:
+            pending.append( executor.submit(_render_chunk, chunk, return_exceptions) )
+            while len(pending) >= max_pending:
+                yield from _iter_chunk_results(pending[0].result(), ordered,
+                                               return_exceptions)
+                pending.popleft()
+        while pending:
+            yield from _iter_chunk_results(pending[0].result(), ordered,
+                                           return_exceptions)
+            pending.popleft()
+        return
+
+    for chunk in chunks:
+        pending.add( executor.submit(_render_chunk, chunk, return_exceptions) )
+        if len(pending) >= max_pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                pending.discard(future)
+                yield from _iter_chunk_results(future.result(), ordered,
+                                               return_exceptions)
+    while pending:
+        done, _ = concurrent.futures.wait(
+            pending, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        for future in done:
+            pending.discard(future)
+            yield from _iter_chunk_results(future.result(), ordered,
+                                           return_exceptions)
@@ -0,0 +1,163 @@
+import os
+import os.path
+import hashlib
+import tempfile
+import threading
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------------------------
+
+
+class LLMCitationCache:
+    r"""
+    A bounded, in-memory LRU cache of parsed citation texts.
+
+    Set an instance of this class as the `citation_cache` of a
+    :py:class:`~llm.feature.cite.FeatureExternalPrefixedCitations` feature
+    (e.g. ``LLMStandardEnvironment(external_citations_provider=...,
+    citation_cache=LLMCitationCache())``) to avoid retrieving and parsing the
+    same citation again in each document that cites it.  Entries are keyed on
+    the citation prefix and key, and on the environment instance that parsed
+    the citation text.  A citation's full text is assumed to depend only on
+    its prefix and key.
+
+    The citation fragments stored in the cache are shared between all
+    documents that cite the same reference.  Their node lists must therefore
+    be considered read-only.
+
+    The argument `max_size` is the maximum number of parsed citations that are
+    kept in memory.  The least recently used entries are discarded first.
+    """
+
+    def __init__(self, max_size=4096):
+        super().__init__()
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __reduce__(self):
+        # Pickle the cache configuration only, not the cached entries
+        return (self.__class__, (self.max_size,))
+
+    def get_citation_fragment(self, environment, cite_prefix, cite_key):
+        r"""
+        Return the parsed citation text (an
+        :py:class:`~llm.llmfragment.LLMFragment`) for the given citation, or
+        `None` if it is not in the cache.
+        """
+        key = (environment, cite_prefix, cite_key)
+        with self._lock:
+            fragment = self._entries.pop(key, None)
+            if fragment is None:
+                self.misses += 1
+                return None
+            # (re-)insert the item to mark it as most recently used
+            self._entries[key] = fragment
+            self.hits += 1
+        return fragment
+
+    def get_citation_llm_text(self, cite_prefix, cite_key):
+        r"""
+        Called when the requested citation is not found in memory.  Subclasses
+        can reimplement this method to look for the citation's full text (LLM
+        code) in another store.  Return a string or `None`.
+        """
+        return None
+
+    def store_citation(self, environment, cite_prefix, cite_key, citation_llm_text,
+                       fragment):
+        r"""
+        Store the citation's full text `citation_llm_text` and the
+        corresponding parsed `fragment` in the cache.
+        """
+        key = (environment, cite_prefix, cite_key)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = fragment
+            while len(self._entries) > self.max_size:
+                # dictionaries remember insertion order; the first key is the
+                # least recently used one
+                del self._entries[next(iter(self._entries))]
+
+    def clear(self):
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+
+class LLMDiskCitationCache(LLMCitationCache):
+    r"""
+    A citation cache that additionally stores the full text of citations on
+    disk, in the folder `cache_dir`, so that citations don't have to be
+    retrieved again from the citations provider in later process runs (e.g.,
+    when the site is built again).
+
+    Only the citation text (LLM code) is stored on disk, in files whose name is
+    a hash of the citation prefix and key.  The text is parsed again when it is
+    loaded, which can itself be avoided with an
+    :py:class:`~llm.parsecache.LLMDiskParseCache`.  Entries never expire; delete
+    the cache folder to retrieve the citations again.
+
+    Recently used citations are also kept in memory, as in
+    :py:class:`LLMCitationCache`.
+    """
+
+    format_version = 1
+
+    def __init__(self, cache_dir, max_size=4096):
+        super().__init__(max_size=max_size)
+        self.cache_dir = cache_dir
+
+    def __reduce__(self):
+        return (self.__class__, (self.cache_dir, self.max_size))
+
+    def get_file_name(self, cite_prefix, cite_key):
+        r"""
+        Return the full path of the file in which the given citation's text is
+        stored.
+        """
+        h = hashlib.sha256()
+        for part in (str(self.format_version), repr(cite_prefix), cite_key):
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        hexdigest = h.hexdigest()
+        return os.path.join(self.cache_dir, hexdigest[:2], hexdigest[2:] + '.llmcite')
+
+    def get_citation_llm_text(self, cite_prefix, cite_key):
+        fname = self.get_file_name(cite_prefix, cite_key)
+        try:
+            with open(fname, 'r', encoding='utf-8', newline='') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def store_citation(self, environment, cite_prefix, cite_key, citation_llm_text,
+                       fragment):
+
+        super().store_citation(environment, cite_prefix, cite_key,
+                               citation_llm_text, fragment)
+
+        if not isinstance(citation_llm_text, str):
+            return
+        fname = self.get_file_name(cite_prefix, cite_key)
+        if os.path.exists(fname):
+            return
+
+        dirname = os.path.dirname(fname)
+        try:
+            os.makedirs(dirname, exist_ok=True)
+            # write to a temporary file first, so that concurrent processes
+            # never see a partially written file
+            with tempfile.NamedTemporaryFile(dir=dirname, delete=False, mode='w',
+                                             encoding='utf-8', newline='') as f:
+                f.write(citation_llm_text)
+            os.replace(f.name, fname)
+        except OSError as e:
+            logger.warning(f"Cannot write citation cache file {fname}: {e}")
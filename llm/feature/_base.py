@@ -1,3 +1,8 @@
+### BEGIN_LLM_PYTHON_ONLY
+import copy
+### END_LLM_PYTHON_ONLY
+
+
 
 class Feature:
 
@@ -31,7 +36,94 @@ class Feature:
         def postprocess(self, final_value):
             pass
 
+        ### BEGIN_LLM_PYTHON_ONLY
+
+        def derive_render_manager(self, render_context):
+            r"""
+            Return a render manager for `render_context`, which renders the
+            same document in another output format (see
+            :py:meth:`llm.llmdocument.LLMDocument.render_multi()`).
+
+            The returned manager shares this manager's format-independent state
+            (registered labels, endnote and float numbering, etc.), and its
+            `initialize()` method is not called.  The default implementation
+            returns a shallow copy of this manager whose `render_context` is
+            replaced.  Reimplement this method if your render manager keeps
+            state that depends on the output format.
+            """
+            render_manager = copy.copy(self)
+            render_manager.render_context = render_context
+            return render_manager
+
+        def prepare_fragment_render(self, llm_fragment):
+            r"""
+            Called before `llm_fragment` is rendered in this manager's render
+            context, e.g., to retrieve any external resources the fragment's
+            content will need all at once.  The default implementation does
+            nothing.
+            """
+            pass
+
+        async def prepare_fragment_render_async(self, llm_fragment):
+            r"""
+            Called by :py:meth:`llm.llmdocument.LLMDocument.render_async()`
+            before `llm_fragment` is rendered, and before
+            :py:meth:`prepare_fragment_render()`.  Reimplement this method to
+            await any lookups the fragment's content will need, concurrently.
+            The default implementation does nothing.
+            """
+            pass
+
+        async def prefetch_async(self):
+            r"""
+            Called by :py:meth:`llm.llmdocument.LLMDocument.render_async()`
+            after the first render pass, before `process()` is called and
+            before the delayed content is rendered.  Reimplement this method to
+            await the lookups that were registered during the first pass,
+            concurrently.  The default implementation does nothing.
+            """
+            pass
+
+        ### END_LLM_PYTHON_ONLY
+
 
     def add_latex_context_definitions(self):
         return {}
+
+    def latex_context_definitions_key(self):
+        r"""
+        Return a hashable value that fully determines the definitions returned
+        by :py:meth:`add_latex_context_definitions()`, or `None`.
+
+        Environments whose features all return the same keys can share the
+        same frozen latex context (see
+        :py:class:`llm.llmstd.LLMStandardEnvironment`).  The default
+        implementation returns `None`, meaning that the latex context is built
+        anew for each environment that uses this feature.
+        """
+        return None
         
+
+
+
+### BEGIN_LLM_PYTHON_ONLY
+
+def _iter_nodes_with_attribute(nodelist, attrname):
+    # yield all the nodes in nodelist that have the attribute `attrname` set to
+    # something other than None, including those in nested groups,
+    # environments and macro arguments
+    stack = [ nodelist ]
+    while stack:
+        nodes = stack.pop()
+        for node in nodes:
+            if node is None:
+                continue
+            if getattr(node, attrname, None) is not None:
+                yield node
+            if getattr(node, 'nodelist', None) is not None:
+                stack.append(node.nodelist)
+            nodeargd = getattr(node, 'nodeargd', None)
+            if nodeargd is not None and nodeargd.argnlist:
+                stack.append(nodeargd.argnlist)
+
+### END_LLM_PYTHON_ONLY
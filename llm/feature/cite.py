@@ -12,6 +12,11 @@ from .. import fmthelpers
 
 from ._base import Feature
 
+### BEGIN_LLM_PYTHON_ONLY
+import asyncio
+from ._base import _iter_nodes_with_attribute
+### END_LLM_PYTHON_ONLY
+
 from .endnotes import EndnoteCategory
 
 
@@ -64,28 +69,191 @@ class FeatureExternalPrefixedCitations(Feature):
 
         def initialize(self):
             self.citation_endnotes = {}
+            self.citation_content_llms = {}
             self.use_endnotes = self.feature_document_manager.use_endnotes
 
         def get_citation_content_llm(self, cite_prefix, cite_key, *, resource_info):
 
-            # retrieve citation from citations provider --
-            citation_llm_text = \
-                self.feature.external_citations_provider.get_citation_full_text_llm(
-                    cite_prefix, cite_key,
-                    resource_info=resource_info
+            if (cite_prefix, cite_key) in self.citation_content_llms:
+                return self.citation_content_llms[(cite_prefix, cite_key)]
+
+            self.prefetch_citations( [(cite_prefix, cite_key)],
+                                     resource_infos=[resource_info] )
+
+            return self.citation_content_llms[(cite_prefix, cite_key)]
+
+        def prefetch_citations(self, cite_items, *, resource_infos=None):
+            r"""
+            Retrieve and parse the full text of all the citations in
+            `cite_items`, a list of `(cite_prefix, cite_key)` tuples, that
+            weren't retrieved yet.  If given, `resource_infos` is a list of
+            the same length with the resource info of the document in which
+            each citation appears.
+
+            Citations are first looked up in the feature's `citation_cache`,
+            if any.  The other ones are retrieved with a single call to the
+            citations provider's `get_citations_full_text_llm(cite_items, *,
+            resource_infos)` method, if it has one.  That method returns a
+            dictionary mapping `(cite_prefix, cite_key)` to the citation's
+            full text (LLM code); citations missing from the dictionary, and
+            all citations for providers without that method, are retrieved
+            one by one with `get_citation_full_text_llm()`.
+            """
+
+            missing_resource_infos = self._get_missing_citations(cite_items, resource_infos)
+            if not missing_resource_infos:
+                return
+
+            # retrieve citations from citations provider --
+            provider = self.feature.external_citations_provider
+            missing_cite_items = list(missing_resource_infos)
+
+            citation_llm_texts = {}
+            get_citations_full_text_llm = \
+                getattr(provider, 'get_citations_full_text_llm', None)
+            if get_citations_full_text_llm is not None \
+               and len(missing_cite_items) > 1:
+                citation_llm_texts = get_citations_full_text_llm(
+                    missing_cite_items,
+                    resource_infos=[ missing_resource_infos[cite_item]
+                                     for cite_item in missing_cite_items ],
+                )
+
+            for cite_item in missing_cite_items:
+                cite_prefix, cite_key = cite_item
+                citation_llm_text = citation_llm_texts.get(cite_item, None)
+                if citation_llm_text is None:
+                    citation_llm_text = provider.get_citation_full_text_llm(
+                        cite_prefix, cite_key,
+                        resource_info=missing_resource_infos[cite_item]
+                    )
+                self._add_citation(cite_item, citation_llm_text)
+
+        def _get_missing_citations(self, cite_items, resource_infos):
+            # Look up the given citations in the feature's citation cache.
+            # Return a dictionary of the citations that remain to be retrieved
+            # from the citations provider, with their resource info.
+
+            environment = self.render_context.doc.environment
+            citation_cache = self.feature.citation_cache
+
+            missing_resource_infos = {}
+            for j, cite_item in enumerate(cite_items):
+                if cite_item in self.citation_content_llms \
+                   or cite_item in missing_resource_infos:
+                    continue
+                cite_prefix, cite_key = cite_item
+                if citation_cache is not None:
+                    citation_llm = citation_cache.get_citation_fragment(
+                        environment, cite_prefix, cite_key
+                    )
+                    if citation_llm is None:
+                        citation_llm_text = \
+                            citation_cache.get_citation_llm_text(cite_prefix, cite_key)
+                        if citation_llm_text is not None:
+                            citation_llm = self._make_citation_fragment(
+                                cite_prefix, cite_key, citation_llm_text
+                            )
+                            citation_cache.store_citation(
+                                environment, cite_prefix, cite_key,
+                                citation_llm_text, citation_llm
+                            )
+                    if citation_llm is not None:
+                        self.citation_content_llms[cite_item] = citation_llm
+                        continue
+                missing_resource_infos[cite_item] = (
+                    resource_infos[j] if resource_infos is not None else None
+                )
+
+            return missing_resource_infos
+
+        def _add_citation(self, cite_item, citation_llm_text):
+            # parse and remember a citation retrieved from the citations provider
+            cite_prefix, cite_key = cite_item
+
+            citation_llm = self._make_citation_fragment(
+                cite_prefix, cite_key, citation_llm_text
+            )
+
+            #logger.debug("Got citation content LLM nodelist = %r", citation_llm.nodes)
+
+            self.citation_content_llms[cite_item] = citation_llm
+
+            citation_cache = self.feature.citation_cache
+            if citation_cache is not None:
+                citation_cache.store_citation(
+                    self.render_context.doc.environment, cite_prefix, cite_key,
+                    citation_llm_text, citation_llm
                 )
 
-            citation_llm = self.render_context.doc.environment.make_fragment(
+        def _make_citation_fragment(self, cite_prefix, cite_key, citation_llm_text):
+            return self.render_context.doc.environment.make_fragment(
                 citation_llm_text,
                 is_block_level=False,
                 standalone_mode=True,
                 what=f"Citation text for {cite_prefix}:{cite_key}",
             )
 
-            #logger.debug("Got citation content LLM nodelist = %r", citation_llm.nodes)
+        ### BEGIN_LLM_PYTHON_ONLY
+
+        def prepare_fragment_render(self, llm_fragment):
+            # retrieve all the citations of this fragment at once
+            cite_items, resource_infos = _get_fragment_cite_items(llm_fragment)
+            if cite_items:
+                self.prefetch_citations(cite_items, resource_infos=resource_infos)
+
+        async def prepare_fragment_render_async(self, llm_fragment):
+            r"""
+            Retrieve all the citations of `llm_fragment` that aren't known yet
+            concurrently, if the citations provider has the awaitable method
+            `get_citations_full_text_llm_async(cite_items, *,
+            resource_infos)` (same as `get_citations_full_text_llm()`) or
+            `get_citation_full_text_llm_async(cite_prefix, cite_key, *,
+            resource_info)`.  Citations that could not be retrieved this way
+            are retrieved by :py:meth:`prepare_fragment_render()`.
+            """
+            provider = self.feature.external_citations_provider
+            get_citations_async = \
+                getattr(provider, 'get_citations_full_text_llm_async', None)
+            get_citation_async = \
+                getattr(provider, 'get_citation_full_text_llm_async', None)
+            if get_citations_async is None and get_citation_async is None:
+                return
+
+            cite_items, resource_infos = _get_fragment_cite_items(llm_fragment)
+            missing_resource_infos = self._get_missing_citations(cite_items, resource_infos)
+            if not missing_resource_infos:
+                return
+
+            missing_cite_items = list(missing_resource_infos)
+            missing_resource_infos_list = [ missing_resource_infos[cite_item]
+                                            for cite_item in missing_cite_items ]
+            if get_citations_async is not None:
+                citation_llm_texts = await get_citations_async(
+                    missing_cite_items,
+                    resource_infos=missing_resource_infos_list,
+                )
+            else:
+                results = await asyncio.gather(
+                    *[ get_citation_async(cite_prefix, cite_key, resource_info=resource_info)
+                       for (cite_prefix, cite_key), resource_info
+                       in zip(missing_cite_items, missing_resource_infos_list) ],
+                    return_exceptions=True
+                )
+                # errors are reported when the citation is retrieved again
+                # synchronously
+                citation_llm_texts = {
+                    cite_item: result
+                    for cite_item, result in zip(missing_cite_items, results)
+                    if not isinstance(result, BaseException)
+                }
 
-            return citation_llm
-            
+            for cite_item in missing_cite_items:
+                citation_llm_text = citation_llm_texts.get(cite_item, None)
+                if citation_llm_text is not None:
+                    self._add_citation(cite_item, citation_llm_text)
+
+        ### END_LLM_PYTHON_ONLY
 
         def get_citation_endnote(self, cite_prefix, cite_key, *, resource_info):
             endnotes_mgr = None
@@ -110,11 +278,9 @@ class FeatureExternalPrefixedCitations(Feature):
             # "1" for citation "[1]").  It'll be useful for combining a citation
             # number with an optional text as in [31; Theorem 4].
             endnote.formatted_inner_counter_value_llm = \
-                self.render_context.doc.environment.make_fragment(
-                    self.feature_document_manager.endnote_category.inner_counter_formatter_fn(
-                        endnote.number
-                    ),
-                    is_block_level=False,
+                self.render_context.doc.environment.make_counter_fragment(
+                    self.feature_document_manager.endnote_category.inner_counter_formatter_fn,
+                    endnote.number,
                     standalone_mode=True,
                     what=f"citation counter (inner)",
                 )
@@ -130,9 +296,12 @@ class FeatureExternalPrefixedCitations(Feature):
                  counter_formatter='arabic',
                  citation_delimiters=('[',']'),
                  citation_optional_text_separator="; ",
+                 citation_cache=None,
                  ):
         super().__init__()
         self.external_citations_provider = external_citations_provider
+        # e.g., an llm.citationcache.LLMCitationCache() instance
+        self.citation_cache = citation_cache
         self.counter_formatter = counter_formatter
         self.citation_delimiters = citation_delimiters
         self.citation_optional_text_separator = citation_optional_text_separator
@@ -145,6 +314,9 @@ class FeatureExternalPrefixedCitations(Feature):
             )
         self.external_citations_provider = external_citations_provider
 
+    def latex_context_definitions_key(self):
+        return ()
+
     def add_latex_context_definitions(self):
         return {
             'macros': [
@@ -154,6 +326,24 @@ class FeatureExternalPrefixedCitations(Feature):
 
 
 
+
+
+### BEGIN_LLM_PYTHON_ONLY
+
+def _get_fragment_cite_items(llm_fragment):
+    # the cite items of all the \cite commands in llm_fragment, and the
+    # resource info of each one
+    cite_items = []
+    resource_infos = []
+    for node in _iter_nodes_with_attribute(llm_fragment.nodes, 'llmarg_cite_items'):
+        for cite_item in node.llmarg_cite_items:
+            cite_items.append(cite_item)
+            resource_infos.append(node.latex_walker.resource_info)
+    return cite_items, resource_infos
+
+### END_LLM_PYTHON_ONLY
+
+
 class CiteMacro(LLMMacroSpecBase):
 
     allowed_in_standalone_mode = False
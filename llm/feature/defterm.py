@@ -203,6 +203,9 @@ class FeatureDefTerm(Feature):
     render_defterm_with_term = True
     render_defterm_with_term_suffix = ': '
 
+    def latex_context_definitions_key(self):
+        return (self.render_defterm_with_term, self.render_defterm_with_term_suffix)
+
     def add_latex_context_definitions(self):
         return dict(
             macros=[
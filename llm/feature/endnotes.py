@@ -132,6 +132,12 @@ class FeatureEndnotes(Feature):
             for x in categories
         ]
 
+    def latex_context_definitions_key(self):
+        return tuple([
+            (encat.category_name, encat.endnote_command)
+            for encat in self.base_categories
+        ])
+
     def add_latex_context_definitions(self):
 
         macros = []
@@ -188,10 +194,9 @@ class FeatureEndnotes(Feature):
             number = self.endnote_counters[category_name]
             self.endnote_counters[category_name] += 1
 
-            fmtvalue_llm_text = fmtcounter(number)
-            fmtvalue_llm = self.render_context.doc.environment.make_fragment(
-                fmtvalue_llm_text,
-                is_block_level=False,
+            fmtvalue_llm = self.render_context.doc.environment.make_counter_fragment(
+                fmtcounter,
+                number,
                 what=f"{category_name} counter",
             )
 
@@ -46,11 +46,21 @@ def _get_counter_formatter_from_tag_template(tag_template):
     return tag_template
 
 
-# "1.", "2.", ...
+def _enumeration_counter_arabic_dot(n):
+    return f"{n}."
+
+def _enumeration_counter_roman_parens(n):
+    return f"({fmthelpers.romancounter(n)})"
+
+def _enumeration_counter_alph_dash(n):
+    return f"{fmthelpers.alphacounter(n)}-"
+
+# "1.", "2.", ...  (module-level functions rather than lambdas so that the
+# enumeration specs can be pickled)
 _default_enumeration_counter_formatter = [
-    lambda n: f"{n}.",
-    lambda n: f"({fmthelpers.romancounter(n)})",
-    lambda n: f"{fmthelpers.alphacounter(n)}-",
+    _enumeration_counter_arabic_dot,
+    _enumeration_counter_roman_parens,
+    _enumeration_counter_alph_dash,
 ]
 
 
@@ -198,11 +208,17 @@ class Enumeration(LLMEnvironmentSpecBase):
             if 'custom_tag' in item_node_args and item_node_args['custom_tag'].was_provided():
                 items_custom_tags[1+j] = item_node_args['custom_tag'].get_content_nodelist()
 
+        formatted_counters = None
+        if callable(counter_formatter):
+            formatted_counters = fmthelpers.format_counter_range(
+                counter_formatter, 1, 1 + len(node.enumeration_items)
+            )
+
         def the_counter_formatter(n):
             if n in items_custom_tags:
                 return items_custom_tags[n]
-            if callable(counter_formatter):
-                return counter_formatter(n)
+            if formatted_counters is not None:
+                return formatted_counters[n-1]
             return counter_formatter
 
         with render_context.push_logical_state('enumeration', 'nested_depth', nested_depth+1):
@@ -217,6 +233,28 @@ class Enumeration(LLMEnvironmentSpecBase):
             )
         return result
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def get_render_content_nodelists(self, node, render_context):
+        # item contents are rendered in order, each followed by its custom tag
+        # (if any)
+        content_nodelists = []
+        for item_macro, item_content_nodelist in node.enumeration_items:
+            content_nodelists.append( item_content_nodelist )
+            item_node_args = ParsedArgumentsInfo(node=item_macro).get_all_arguments_info(
+                ('custom_tag',),
+            )
+            if 'custom_tag' in item_node_args and item_node_args['custom_tag'].was_provided():
+                content_nodelists.append( item_node_args['custom_tag'].get_content_nodelist() )
+        return content_nodelists
+
+    def get_render_content_logical_state(self, node, render_context):
+        state = render_context.get_logical_state('enumeration')
+        nested_depth = state.get('nested_depth', 0)
+        return render_context.push_logical_state('enumeration', 'nested_depth', nested_depth+1)
+
+    ### END_LLM_PYTHON_ONLY
+
 
 
 default_enumeration_environments = {
@@ -246,6 +284,15 @@ class FeatureEnumeration(Feature):
             enumeration_environments = default_enumeration_environments
         self.enumeration_environments = enumeration_environments
 
+    def latex_context_definitions_key(self):
+        key = []
+        for envname, envinfo in self.enumeration_environments.items():
+            counter_formatter = envinfo['counter_formatter']
+            if isinstance(counter_formatter, list):
+                counter_formatter = tuple(counter_formatter)
+            key.append( (envname, counter_formatter) )
+        return tuple(key)
+
     def add_latex_context_definitions(self):
         return dict(
             environments=[
@@ -169,7 +169,7 @@ class FloatEnvironment(LLMEnvironmentSpecBase):
 
         floats_mgr = render_context.feature_render_manager('floats')
 
-        logger.debug(f"Rendering float: {node=}")
+        logger.debug("Rendering float: node=%r", node)
 
         ref_label_prefix = node.llm_float_label['ref_label_prefix']
         ref_label = node.llm_float_label['ref_label']
@@ -302,6 +302,9 @@ class FeatureFloats(Feature):
 
     make_float_environment_spec = FloatEnvironment
 
+    def latex_context_definitions_key(self):
+        return (self.make_float_environment_spec, tuple(self.float_types))
+
     def add_latex_context_definitions(self):
         environments = []
         for float_type, ftinfo in self.float_types.items():
@@ -349,12 +352,12 @@ class FeatureFloats(Feature):
                 number = self.float_counters[float_type]
                 self.float_counters[float_type] += 1
 
-                fmtvalue_llm_text = fmtcounter(number)
-                fmtvalue_llm = self.render_context.doc.environment.make_fragment(
-                    fmtvalue_llm_text,
-                    is_block_level=False,
-                    what=f"{float_type} {number} counter value",
-                )
+                fmtvalue_llm = \
+                    self.render_context.doc.environment.make_counter_fragment(
+                        fmtcounter,
+                        number,
+                        what=f"{float_type} counter value",
+                    )
             else:
                 number = None
                 fmtvalue_llm = None
@@ -8,6 +8,11 @@ from ..llmspecinfo import LLMMacroSpecBase
 from ..llmenvironment import LLMArgumentSpec
 from ._base import Feature
 
+### BEGIN_LLM_PYTHON_ONLY
+import asyncio
+from ._base import _iter_nodes_with_attribute
+### END_LLM_PYTHON_ONLY
+
 
 class GraphicsResource:
     def __init__(
@@ -125,9 +130,110 @@ class FeatureSimplePathGraphicsResourceProvider(Feature):
 
     feature_name = 'graphics_resource_provider'
 
+    def latex_context_definitions_key(self):
+        return ()
+
     class RenderManager(Feature.RenderManager):
 
         def get_graphics_resource(self, graphics_path, resource_info):
             # return
             return GraphicsResource(src_url=graphics_path)
     
+
+
+
+### BEGIN_LLM_PYTHON_ONLY
+
+class FeatureExternalGraphicsResourceProvider(Feature):
+    r"""
+    Graphics resource provider (use instead of
+    :py:class:`FeatureSimplePathGraphicsResourceProvider`) that looks up the
+    graphics resources for ``\includegraphics`` paths with an external
+    provider.
+
+    The `external_graphics_resource_provider` must implement the method
+    ``get_graphics_resource(graphics_path, *, resource_info)``, which returns a
+    :py:class:`GraphicsResource` instance.  It can also implement the
+    awaitable method ``get_graphics_resource_async(graphics_path, *,
+    resource_info)``.  In that case, when the document is rendered with
+    :py:meth:`llm.llmdocument.LLMDocument.render_async()`, the graphics
+    resources of all the ``\includegraphics`` commands in a fragment are
+    looked up concurrently before the fragment is rendered.
+
+    Graphics resources are remembered for each render context, so each path
+    is looked up only once per document.
+    """
+
+    feature_name = 'graphics_resource_provider'
+
+    def __init__(self, external_graphics_resource_provider):
+        super().__init__()
+        self.external_graphics_resource_provider = external_graphics_resource_provider
+
+    def latex_context_definitions_key(self):
+        return ()
+
+    class RenderManager(Feature.RenderManager):
+
+        def initialize(self):
+            self.graphics_resources = {}
+
+        def get_graphics_resource(self, graphics_path, resource_info):
+            key = _get_graphics_resource_key(graphics_path, resource_info)
+            if key is not None and key in self.graphics_resources:
+                return self.graphics_resources[key]
+            graphics_resource = \
+                self.feature.external_graphics_resource_provider.get_graphics_resource(
+                    graphics_path,
+                    resource_info=resource_info,
+                )
+            if key is not None:
+                self.graphics_resources[key] = graphics_resource
+            return graphics_resource
+
+        async def prepare_fragment_render_async(self, llm_fragment):
+            get_graphics_resource_async = getattr(
+                self.feature.external_graphics_resource_provider,
+                'get_graphics_resource_async',
+                None
+            )
+            if get_graphics_resource_async is None:
+                return
+
+            lookups = {}
+            for node in _iter_nodes_with_attribute(llm_fragment.nodes,
+                                                   'llmarg_graphics_path'):
+                graphics_path = node.llmarg_graphics_path
+                resource_info = node.latex_walker.resource_info
+                key = _get_graphics_resource_key(graphics_path, resource_info)
+                if key is None or key in self.graphics_resources or key in lookups:
+                    continue
+                lookups[key] = (graphics_path, resource_info)
+
+            if not lookups:
+                return
+
+            keys = list(lookups)
+            results = await asyncio.gather(
+                *[ get_graphics_resource_async(lookups[key][0],
+                                               resource_info=lookups[key][1])
+                   for key in keys ],
+                return_exceptions=True
+            )
+            for key, result in zip(keys, results):
+                if isinstance(result, BaseException):
+                    # the error is reported when the resource is looked up
+                    # again synchronously
+                    continue
+                self.graphics_resources[key] = result
+
+
+def _get_graphics_resource_key(graphics_path, resource_info):
+    key = (graphics_path, resource_info)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+### END_LLM_PYTHON_ONLY
@@ -53,6 +53,12 @@ class FeatureHeadings(Feature):
             for level, x in section_commands_by_level.items()
         }
 
+    def latex_context_definitions_key(self):
+        return tuple([
+            (level, sectioncmdspec.cmdname, sectioncmdspec.inline)
+            for level, sectioncmdspec in self.section_commands_by_level.items()
+        ])
+
     def add_latex_context_definitions(self):
         return dict(
             macros=[
@@ -14,6 +14,10 @@ from ..llmenvironment import LLMArgumentSpec
 
 from ._base import Feature
 
+### BEGIN_LLM_PYTHON_ONLY
+import asyncio
+### END_LLM_PYTHON_ONLY
+
 
 
 class RefInstance:
@@ -37,7 +41,130 @@ class FeatureRefsRenderManager(Feature.RenderManager):
 
     def initialize(self):
         self.ref_labels = {}
-        
+        self.external_ref_instances = {}
+        self.external_ref_missing = set()
+        self.pending_external_refs = {}
+        self.formatted_ref_fragments = {}
+
+    def register_pending_ref(self, ref_type, ref_target, *, resource_info):
+        r"""
+        Remember that the reference `(ref_type, ref_target)` will be needed.
+        All references that are registered during the first render pass and
+        that aren't labels in the current document are looked up together
+        with the external ref resolver's `get_refs()` method, if it has one
+        (see :py:meth:`prefetch_external_refs()`).
+        """
+        key = (ref_type, ref_target)
+        if key not in self.pending_external_refs:
+            self.pending_external_refs[key] = resource_info
+
+    def process(self, first_pass_value):
+        self.prefetch_external_refs()
+
+    def prefetch_external_refs(self):
+        r"""
+        Resolve all pending references (see :py:meth:`register_pending_ref()`)
+        that can't be found in the current document with a single call to the
+        external ref resolver's `get_refs()` method.
+
+        The batch resolver protocol is optional.  A resolver that supports it
+        implements ``get_refs(ref_type_and_targets, *, resource_infos)``, where
+        `ref_type_and_targets` is a list of `(ref_type, ref_target)` tuples and
+        `resource_infos` is a list of the same length with the resource info of
+        the document where each reference appears.  It returns a dictionary
+        mapping `(ref_type, ref_target)` to a `RefInstance`.  References that
+        are missing from the dictionary, or mapped to `None`, are remembered
+        as not found and won't be queried again.
+        """
+        resolver = self.feature.external_ref_resolver
+        get_refs = None
+        if resolver is not None:
+            get_refs = getattr(resolver, 'get_refs', None)
+        if get_refs is None:
+            # refs will be resolved one by one
+            self.pending_external_refs = {}
+            return
+
+        ref_type_and_targets, resource_infos = self._pop_unresolved_pending_refs()
+        if not ref_type_and_targets:
+            return
+
+        refs = get_refs(ref_type_and_targets, resource_infos=resource_infos)
+
+        self._add_external_refs(ref_type_and_targets, refs)
+
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    async def prefetch_async(self):
+        r"""
+        Resolve all pending references concurrently, if the external ref
+        resolver has the awaitable method `get_refs_async(ref_type_and_targets,
+        *, resource_infos)` (same as `get_refs()`, see
+        :py:meth:`prefetch_external_refs()`) or `get_ref_async(ref_type,
+        ref_target, *, resource_info)`.  References that could not be resolved
+        this way are resolved again synchronously when they are rendered.
+        """
+        resolver = self.feature.external_ref_resolver
+        if resolver is None:
+            return
+        get_refs_async = getattr(resolver, 'get_refs_async', None)
+        get_ref_async = getattr(resolver, 'get_ref_async', None)
+        if get_refs_async is None and get_ref_async is None:
+            return
+
+        ref_type_and_targets, resource_infos = self._pop_unresolved_pending_refs()
+        if not ref_type_and_targets:
+            return
+
+        if get_refs_async is not None:
+            refs = await get_refs_async(ref_type_and_targets,
+                                        resource_infos=resource_infos)
+            self._add_external_refs(ref_type_and_targets, refs)
+            return
+
+        results = await asyncio.gather(
+            *[ get_ref_async(ref_type, ref_target, resource_info=resource_info)
+               for (ref_type, ref_target), resource_info
+               in zip(ref_type_and_targets, resource_infos) ],
+            return_exceptions=True
+        )
+        for key, result in zip(ref_type_and_targets, results):
+            if isinstance(result, BaseException):
+                # the error is reported when the ref is resolved again
+                # synchronously
+                continue
+            if result is not None:
+                self.external_ref_instances[key] = result
+            else:
+                self.external_ref_missing.add(key)
+
+    ### END_LLM_PYTHON_ONLY
+
+    def _pop_unresolved_pending_refs(self):
+        # Return the pending references that are neither labels in the current
+        # document nor already known, and their resource infos.  The list of
+        # pending references is reset.
+        pending_external_refs = self.pending_external_refs
+        self.pending_external_refs = {}
+
+        ref_type_and_targets = [
+            key
+            for key in pending_external_refs
+            if key not in self.ref_labels
+            and key not in self.external_ref_instances
+            and key not in self.external_ref_missing
+        ]
+        resource_infos = [ pending_external_refs[key] for key in ref_type_and_targets ]
+        return ref_type_and_targets, resource_infos
+
+    def _add_external_refs(self, ref_type_and_targets, refs):
+        for key in ref_type_and_targets:
+            ref = refs.get(key, None)
+            if ref is not None:
+                self.external_ref_instances[key] = ref
+            else:
+                self.external_ref_missing.add(key)
+
     def register_reference(self, ref_type, ref_target, formatted_ref_llm_text, target_href):
         r"""
         `formatted_ref_llm_text` is LLM code.
@@ -58,17 +185,46 @@ class FeatureRefsRenderManager(Feature.RenderManager):
         logger.debug(f"Couldn't find {(ref_type, ref_target)} in current document "
                      f"labels; will query external ref resolver.  {self.ref_labels=}")
 
-        if self.feature.external_ref_resolver is not None:
+        # the same reference might be resolved several times, e.g., when
+        # rendering the document in several formats
+        if (ref_type, ref_target) in self.external_ref_instances:
+            return self.external_ref_instances[(ref_type, ref_target)]
+
+        if ( self.feature.external_ref_resolver is not None
+             and (ref_type, ref_target) not in self.external_ref_missing ):
             ref = self.feature.external_ref_resolver.get_ref(
                 ref_type,
                 ref_target,
                 resource_info=resource_info,
             )
             if ref is not None:
+                self.external_ref_instances[(ref_type, ref_target)] = ref
                 return ref
+            self.external_ref_missing.add( (ref_type, ref_target) )
 
         raise ValueError(f"Ref target not found: ‘{ref_type}:{ref_target}’")
 
+    def get_formatted_ref_fragment(self, ref_instance):
+        r"""
+        Return the formatted reference text of `ref_instance` as an
+        :py:class:`~llm.llmfragment.LLMFragment`.  The LLM text is parsed only
+        once for each reference.
+        """
+        if isinstance(ref_instance.formatted_ref_llm_text, LLMFragment):
+            return ref_instance.formatted_ref_llm_text
+
+        key = (ref_instance.ref_type, ref_instance.ref_target,
+               ref_instance.formatted_ref_llm_text)
+        if key in self.formatted_ref_fragments:
+            return self.formatted_ref_fragments[key]
+
+        fragment = self.render_context.doc.environment.make_fragment(
+            ref_instance.formatted_ref_llm_text,
+            standalone_mode=True
+        )
+        self.formatted_ref_fragments[key] = fragment
+        return fragment
+
 
 
 class FeatureRefs(Feature):
@@ -91,6 +247,9 @@ class FeatureRefs(Feature):
                            "an external refs resolver set.  It will be replaced.")
         self.external_ref_resolver = external_ref_resolver
 
+    def latex_context_definitions_key(self):
+        return ()
+
     def add_latex_context_definitions(self):
         return dict(
             macros=[
@@ -162,7 +321,10 @@ class RefMacro(LLMMacroSpecBase):
         
 
     def prepare_delayed_render(self, node, render_context):
-        pass
+        ref_type, ref_target = node.llm_ref_info['ref_type_and_target']
+        mgr = render_context.feature_render_manager('refs')
+        mgr.register_pending_ref(ref_type, ref_target,
+                                 resource_info=node.latex_walker.resource_info)
 
     def render(self, node, render_context):
 
@@ -184,13 +346,7 @@ class RefMacro(LLMMacroSpecBase):
             )
 
         if display_content_nodelist is None:
-            if isinstance(ref_instance.formatted_ref_llm_text, LLMFragment):
-                display_content_llm = ref_instance.formatted_ref_llm_text
-            else:
-                display_content_llm = render_context.doc.environment.make_fragment(
-                    ref_instance.formatted_ref_llm_text,
-                    standalone_mode=True
-                )
+            display_content_llm = mgr.get_formatted_ref_fragment(ref_instance)
             display_content_nodelist = display_content_llm.nodes
 
 
@@ -96,13 +96,19 @@ def unicodesubscriptcounter(n):
     return customdigitscounter(n, digits=_unicodesubscriptdigits)
 
 
+def arabiccounter(n):
+    return str(n)
+
+
+# Use module-level functions (and not lambdas) here, so that objects that store
+# these formatters can be pickled (e.g., to be sent to multiprocessing workers)
 standard_counter_formatters = {
-    'alph': lambda n: alphacounter(n, lower=True),
-    'Alph': lambda n: alphacounter(n, lower=False),
-    'roman': lambda n: romancounter(n, lower=True),
-    'Roman': lambda n: romancounter(n, lower=False),
-    'arabic': lambda n: str(n),
-    'fnsymbol': lambda n: fnsymbolcounter(n),
+    'alph': alphacounter,
+    'Alph': Alphacounter,
+    'roman': romancounter,
+    'Roman': Romancounter,
+    'arabic': arabiccounter,
+    'fnsymbol': fnsymbolcounter,
     'unicodesuperscript': unicodesuperscriptcounter,
     'unicodesubscript': unicodesubscriptcounter,
 }
@@ -110,3 +116,49 @@ standard_counter_formatters = {
 
 
 
+
+# ------------------------------------------------------------------------------
+
+# Formatted counter values, memoized by (counter_formatter, n).  Formatters
+# are normally module-level functions or long-lived objects; the memo is
+# cleared when it grows too large, in case many short-lived formatters are used.
+_formatted_counters = {}
+_formatted_counters_max_size = 8192
+
+def format_counter(counter_formatter, n):
+    r"""
+    Return `counter_formatter(n)`, remembering the result so that each counter
+    value is only formatted once for a given formatter.
+
+    Only string results are memoized; a formatter that returns something else
+    (e.g., a node list) is called every time.
+    """
+    ### BEGIN_LLM_PYTHON_ONLY
+    key = (counter_formatter, n)
+    try:
+        return _formatted_counters[key]
+    except KeyError:
+        pass
+    except TypeError: # unhashable formatter
+        return counter_formatter(n)
+    value = counter_formatter(n)
+    if isinstance(value, str):
+        if len(_formatted_counters) >= _formatted_counters_max_size:
+            _formatted_counters.clear()
+        _formatted_counters[key] = value
+    return value
+    ### END_LLM_PYTHON_ONLY
+    return counter_formatter(n)
+
+def format_counter_range(counter_formatter, n_start, n_end):
+    r"""
+    Return the list of formatted counter values `counter_formatter(n)` for all
+    `n` with `n_start <= n < n_end`, e.g., for all items of an enumeration.
+
+    Unlike :py:func:`format_counter()`, the values are not memoized, so this
+    function can be used with short-lived formatters (e.g., one created for a
+    specific enumeration's tag template).
+    """
+    if counter_formatter is arabiccounter:
+        return [ str(n) for n in range(n_start, n_end) ]
+    return [ counter_formatter(n) for n in range(n_start, n_end) ]
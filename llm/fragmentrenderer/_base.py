@@ -6,6 +6,19 @@ from pylatexenc.latexnodes import nodes
 
 from ..llmrendercontext import LLMRenderContext
 
+### BEGIN_LLM_PYTHON_ONLY
+import os
+
+# Delimiters of sentinel markers for delayed content, made of characters from
+# Unicode's supplementary private use area.  The start delimiter includes a
+# random per-process suffix so that it won't show up in rendered content by
+# accident.
+_delayed_marker_sentinels = (
+    '\U000F0001' + "".join([ chr(0xF0100 + b) for b in os.urandom(4) ]),
+    '\U000F0002',
+)
+### END_LLM_PYTHON_ONLY
+
 
 class FragmentRenderer:
     r"""
@@ -19,8 +32,36 @@ class FragmentRenderer:
     etc.). If False, then the whole content must be rendered in two passes.
     """
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    render_nodelist_max_recursion_depth = 16
+    r"""
+    Number of nested calls to :py:meth:`render_nodelist()` (e.g., for nested
+    groups, text formats or enumerations) that are rendered recursively.
+    Content that is nested more deeply is rendered with an explicit stack.
+    """
+
+    render_cache = None
+    r"""
+    Set this to a :py:class:`~llm.rendercache.LLMRenderCache` instance to
+    reuse the rendered values of nodes and paragraphs whose rendering does not
+    depend on the render context.  Not used by default.
+    """
+
+    delayed_marker_sentinels = _delayed_marker_sentinels
+    r"""
+    The start and end delimiters of the markers generated by
+    :py:meth:`render_sentinel_delayed_marker()`.
+    """
+
+    ### END_LLM_PYTHON_ONLY
+
 
     def render_fragment(self, llm_fragment, render_context, is_block_level=None):
+        ### BEGIN_LLM_PYTHON_ONLY
+        render_context = self._ensure_render_context(render_context)
+        render_context.prepare_fragment_render(llm_fragment)
+        ### END_LLM_PYTHON_ONLY
         try:
             return self.render_nodelist(llm_fragment.nodes,
                                         self._ensure_render_context(render_context),
@@ -42,8 +83,49 @@ class FragmentRenderer:
         items (enumerations, etc.), then we'll render paragraphs, and otherwise,
         we'll render inline content.  Useful for rendering fragments where we
         don't know if the content is block-level or not.
+
+        Node lists nested more than :py:attr:`render_nodelist_max_recursion_depth`
+        levels deep are rendered with an explicit stack: the nested content of
+        groups, text formats, enumerations, and any node whose specinfo
+        implements
+        :py:meth:`~llm.llmspecinfo.LLMSpecInfo.get_render_content_nodelists()`
+        is rendered innermost nodes first, so that deeply nested content does
+        not require a deep Python call stack.
         """
 
+        ### BEGIN_LLM_PYTHON_ONLY
+        render_context = self._ensure_render_context(render_context)
+        if render_context._prerendered_nodes is None:
+            depth = render_context._render_nodelist_depth
+            if depth < self.render_nodelist_max_recursion_depth:
+                render_context._render_nodelist_depth = depth + 1
+                try:
+                    return self._render_nodelist(nodelist, render_context, is_block_level)
+                finally:
+                    render_context._render_nodelist_depth = depth
+            # nested too deeply, switch to explicit-stack rendering
+            render_context._prerendered_nodes = {}
+            try:
+                self._prerender_nested_nodes(nodelist, render_context)
+                return self._render_nodelist(nodelist, render_context, is_block_level)
+            finally:
+                render_context._prerendered_nodes = None
+        self._prerender_nested_nodes(nodelist, render_context)
+        ### END_LLM_PYTHON_ONLY
+
+        return self._render_nodelist(nodelist, render_context, is_block_level)
+
+    def _render_nodelist(self, nodelist, render_context, is_block_level):
+        node_blocks = self._get_nodelist_blocks(nodelist, is_block_level)
+        if node_blocks is not None:
+            return self.render_blocks(node_blocks, render_context)
+
+        return self.render_inline_content(nodelist, render_context)
+
+    def _get_nodelist_blocks(self, nodelist, is_block_level):
+        # Returns the list of blocks to render for the given node list, or
+        # `None` if the node list is to be rendered as inline content.
+
         if nodelist is None:
             raise ValueError("render_nodelist(): nodelist should not be None")
 
@@ -70,17 +152,73 @@ class FragmentRenderer:
             # that was seen as inline content but which we're now forcing to be
             # rendered as a paragraph in block mode.
             if hasattr(nodelist, 'llm_blocks'):
-                node_blocks = nodelist.llm_blocks
-            else:
-                node_blocks = [nodelist]
+                return nodelist.llm_blocks
+            return [nodelist]
 
-            return self.render_blocks(node_blocks, render_context)
+        return None
 
-        return self.render_inline_content(nodelist, render_context)
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def render_fragment_chunks(self, llm_fragment, render_context, is_block_level=None):
+        r"""
+        Render the given fragment like :py:meth:`render_fragment()`, but return
+        an iterator over pieces of the rendered output instead of a single
+        string.  Each top-level block is rendered only when the iterator gets
+        to it, so the output can be written out (see
+        :py:meth:`LLMDocument.render_to_stream()`) without holding all of it
+        in memory.
+
+        Joining all the pieces together gives the same result as
+        :py:meth:`render_fragment()`, assuming :py:meth:`render_join_blocks()`
+        joins blocks with a fixed separator.
+        """
+        render_context = self._ensure_render_context(render_context)
+        render_context.prepare_fragment_render(llm_fragment)
+        nodelist = llm_fragment.nodes
+
+        node_blocks = self._get_nodelist_blocks(nodelist, is_block_level)
+        if node_blocks is None:
+            yield self.render_inline_content(nodelist, render_context)
+            return
+
+        blocks_joiner = self.render_join_blocks(['', ''])
+        for j, block in enumerate(node_blocks):
+            if j > 0:
+                yield blocks_joiner
+            yield self.render_block(block, render_context)
+
+    ### END_LLM_PYTHON_ONLY
 
 
     def render_node(self, node, render_context):
         render_context = self._ensure_render_context(render_context)
+
+        ### BEGIN_LLM_PYTHON_ONLY
+        # this node might already have been rendered by
+        # _prerender_nested_nodes()
+        prerendered_nodes = render_context._prerendered_nodes
+        if prerendered_nodes:
+            prerendered = prerendered_nodes.pop(id(node), None)
+            if prerendered is not None:
+                if prerendered[0] is self:
+                    return prerendered[1]
+                prerendered_nodes[id(node)] = prerendered
+
+        # single lookup in the dispatch table of this renderer class, see
+        # _get_render_node_method()
+        cls = self.__class__
+        try:
+            render_method = cls.__dict__['_render_node_methods'][node.__class__]
+        except KeyError:
+            render_method = cls._get_render_node_method(node)
+
+        if self.render_cache is not None and node.__class__ is not nodes.LatexCharsNode:
+            return self._render_with_cache(node, render_context,
+                                           render_method, self, node, render_context)
+
+        return render_method(self, node, render_context)
+        ### END_LLM_PYTHON_ONLY
+
         if node.isNodeType(nodes.LatexCharsNode):
             return self.render_node_chars(node, render_context)
         if node.isNodeType(nodes.LatexCommentNode):
@@ -97,7 +235,201 @@ class FragmentRenderer:
             return self.render_node_math(node, render_context)
 
         raise ValueError(f"Invalid node type: {node!r}")
-        
+
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    _render_node_methods_by_node_type = (
+        (nodes.LatexCharsNode, 'render_node_chars'),
+        (nodes.LatexCommentNode, 'render_node_comment'),
+        (nodes.LatexGroupNode, 'render_node_group'),
+        (nodes.LatexMacroNode, 'render_node_macro'),
+        (nodes.LatexEnvironmentNode, 'render_node_environment'),
+        (nodes.LatexSpecialsNode, 'render_node_specials'),
+        (nodes.LatexMathNode, 'render_node_math'),
+    )
+
+    @classmethod
+    def _get_render_node_method(cls, node):
+        # Find the render_node_xxx() method of this renderer class that
+        # render_node() uses for nodes of the same class as `node`, and store
+        # it in the class' dispatch table.  The table is specific to each
+        # renderer class, as subclasses can reimplement these methods.
+        if '_render_node_methods' not in cls.__dict__:
+            cls._render_node_methods = {}
+        for node_type, method_name in cls._render_node_methods_by_node_type:
+            if node.isNodeType(node_type):
+                render_method = getattr(cls, method_name)
+                cls._render_node_methods[node.__class__] = render_method
+                return render_method
+        raise ValueError(f"Invalid node type: {node!r}")
+
+    def _render_with_cache(self, node, render_context, render_fn, *args):
+        # Return render_fn(*args), the rendered value of `node` (a node or a
+        # node list), going through self.render_cache if the rendered value
+        # doesn't depend on the render context.
+        if not self._is_render_context_independent(node, render_context):
+            return render_fn(*args)
+        render_cache = self.render_cache
+        value = render_cache.get_rendered(node, self, render_context)
+        if value is None:
+            value = render_fn(*args)
+            render_cache.store_rendered(node, self, render_context, value)
+        return value
+
+    def _is_render_context_independent(self, node, render_context):
+        # Whether rendering `node` (a node or a node list) only depends on the
+        # node and on the fragment renderer (see
+        # LLMSpecInfo.render_context_independent).  The result is stored on
+        # the node object.
+        try:
+            return node._llm_render_context_independent
+        except AttributeError:
+            pass
+
+        if isinstance(node, nodes.LatexNodeList):
+            content_nodes = node.nodelist
+            is_independent = True
+        elif node.isNodeType(nodes.LatexCharsNode) \
+             or node.isNodeType(nodes.LatexCommentNode) \
+             or node.isNodeType(nodes.LatexMathNode):
+            content_nodes = []
+            is_independent = True
+        elif node.isNodeType(nodes.LatexGroupNode):
+            content_nodes = node.nodelist
+            is_independent = True
+        else:
+            content_nodes = []
+            llm_specinfo = getattr(node, 'llm_specinfo', None)
+            is_independent = (
+                llm_specinfo is not None
+                and llm_specinfo.render_context_independent
+                and not llm_specinfo.delayed_render
+            )
+            if is_independent:
+                content_nodelists = llm_specinfo.get_render_content_nodelists(
+                    node, render_context
+                )
+                if content_nodelists is not None:
+                    content_nodes = [ n
+                                      for nl in content_nodelists
+                                      for n in nl ]
+
+        if is_independent:
+            for n in content_nodes:
+                if not self._is_render_context_independent(n, render_context):
+                    is_independent = False
+                    break
+
+        node._llm_render_context_independent = is_independent
+        return is_independent
+
+    def _prerender_nested_nodes(self, nodelist, render_context):
+        # Render the nested content of the nodes in `nodelist` ahead of time,
+        # using an explicit stack rather than recursive calls.  The result for
+        # each node is stored in render_context._prerendered_nodes, where
+        # render_node() picks it up when the nodes are rendered in the normal
+        # way.  Nodes are rendered in the same order and with the same logical
+        # state as they would be when rendering `nodelist` recursively.
+        prerendered_nodes = render_context._prerendered_nodes
+
+        node_items = self._get_prerender_node_items([nodelist], render_context)
+        if not node_items:
+            return
+
+        # stack frames are [node, node_items, index of next item, logical state]
+        stack = [ [None, node_items, 0, None] ]
+        try:
+            while stack:
+                frame = stack[-1]
+                node_items = frame[1]
+                j = frame[2]
+
+                if j < len(node_items):
+                    frame[2] = j + 1
+                    node, content_nodelists = node_items[j]
+                    if content_nodelists is not None:
+                        logical_state = None
+                        llm_specinfo = getattr(node, 'llm_specinfo', None)
+                        if llm_specinfo is not None:
+                            logical_state = llm_specinfo.get_render_content_logical_state(
+                                node, render_context
+                            )
+                        if logical_state is not None:
+                            logical_state.__enter__()
+                        stack.append([node, None, 0, logical_state])
+                        stack[-1][1] = self._get_prerender_node_items(
+                            content_nodelists, render_context
+                        )
+                        continue
+                    prerendered_nodes[id(node)] = (
+                        self, self.render_node(node, render_context)
+                    )
+                    continue
+
+                # all the nested content of this node is rendered, now render
+                # the node itself
+                stack.pop()
+                logical_state = frame[3]
+                if logical_state is not None:
+                    frame[3] = None
+                    logical_state.__exit__(None, None, None)
+                node = frame[0]
+                if node is not None:
+                    prerendered_nodes[id(node)] = (
+                        self, self.render_node(node, render_context)
+                    )
+        finally:
+            # restore the logical state if we stopped because of an exception
+            for frame in reversed(stack):
+                if frame[3] is not None:
+                    frame[3].__exit__(None, None, None)
+
+    def _get_prerender_node_items(self, nodelists, render_context):
+        # Return the list of (node, content_nodelists) for the nodes that get
+        # rendered when rendering the given node lists, up to the last one with
+        # nested content (the remaining ones don't need to be rendered ahead of
+        # time).  `content_nodelists` is None for nodes whose contents we don't
+        # render ahead of time.
+        prerendered_nodes = render_context._prerendered_nodes
+        node_items = []
+        num_needed = 0
+        for nodelist in nodelists:
+            if nodelist is None or not hasattr(nodelist, 'llm_is_block_level'):
+                # not something we can render; let render_nodelist() report it
+                continue
+            if hasattr(nodelist, 'llm_blocks'):
+                block_nodes = []
+                for block in nodelist.llm_blocks:
+                    if isinstance(block, nodes.LatexNodeList):
+                        block_nodes.extend(block)
+                    else:
+                        block_nodes.append(block)
+            else:
+                block_nodes = nodelist
+            for node in block_nodes:
+                if id(node) in prerendered_nodes:
+                    continue
+                content_nodelists = self._get_prerender_content_nodelists(
+                    node, render_context
+                )
+                node_items.append( (node, content_nodelists) )
+                if content_nodelists is not None:
+                    num_needed = len(node_items)
+        del node_items[num_needed:]
+        return node_items
+
+    def _get_prerender_content_nodelists(self, node, render_context):
+        # The node lists rendered (with render_nodelist()) when rendering
+        # `node`, or None.
+        if node.isNodeType(nodes.LatexGroupNode):
+            return [ node.nodelist ]
+        llm_specinfo = getattr(node, 'llm_specinfo', None)
+        if llm_specinfo is None or llm_specinfo.delayed_render:
+            return None
+        return llm_specinfo.get_render_content_nodelists(node, render_context)
+
+    ### END_LLM_PYTHON_ONLY
+
 
     def render_node_chars(self, node, render_context):
         if hasattr(node, 'llm_chars_value'): # transcrypt doesn't like getattr with default arg
@@ -227,13 +559,26 @@ class FragmentRenderer:
         rendered_blocks = []
 
         for block in node_blocks:
-            if isinstance(block, nodes.LatexNodeList):
-                rendered_blocks.append( self.render_build_paragraph(block, render_context) )
-            else:
-                rendered_blocks.append( self.render_node(block, render_context) )
+            rendered_blocks.append( self.render_block(block, render_context) )
 
         return self.render_join_blocks( rendered_blocks )
 
+    def render_block(self, block, render_context):
+        r"""
+        Render a single block, i.e., an item of a node list's `llm_blocks`:
+        either a node list forming a paragraph, or a block-level node.
+        """
+        if isinstance(block, nodes.LatexNodeList):
+            ### BEGIN_LLM_PYTHON_ONLY
+            if self.render_cache is not None:
+                render_context = self._ensure_render_context(render_context)
+                return self._render_with_cache(block, render_context,
+                                               self.render_build_paragraph,
+                                               block, render_context)
+            ### END_LLM_PYTHON_ONLY
+            return self.render_build_paragraph(block, render_context)
+        return self.render_node(block, render_context)
+
 
     def render_build_paragraph(self, nodelist, render_context):
         r"""
@@ -292,6 +637,72 @@ class FragmentRenderer:
         """
         raise RuntimeError("Reimplement me!")
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def replace_delimited_delayed_markers(self, content, delayed_values,
+                                          marker_start, marker_end):
+        r"""
+        Helper for :py:meth:`replace_delayed_markers_with_final_values()` for
+        fragment renderers whose markers are of the form
+        ``<marker_start><delayed_key><marker_end>``, where `marker_start` can
+        never occur in rendered content other than in a marker.
+
+        The content is searched for `marker_start` with plain substring
+        searches and the result is assembled with a single join; content
+        without any markers is returned unchanged.
+        """
+        find = content.find
+        marker_start_len = len(marker_start)
+        marker_end_len = len(marker_end)
+        pieces = []
+        pos = 0
+        while True:
+            i = find(marker_start, pos)
+            if i == -1:
+                break
+            j = find(marker_end, i + marker_start_len)
+            if j == -1:
+                break
+            delayed_key = content[i+marker_start_len:j].strip()
+            if not delayed_key.isdigit():
+                # not a marker after all
+                pieces.append(content[pos:i+marker_start_len])
+                pos = i + marker_start_len
+                continue
+            pieces.append(content[pos:i])
+            pieces.append(delayed_values[int(delayed_key)])
+            pos = j + marker_end_len
+        if not pieces:
+            return content
+        pieces.append(content[pos:])
+        return "".join(pieces)
+
+    def render_sentinel_delayed_marker(self, delayed_key):
+        r"""
+        Return a marker for delayed content that is made of private-use Unicode
+        characters (see :py:attr:`delayed_marker_sentinels`) rather than of any
+        syntax of the output format.  Fragment renderers that can't reserve a
+        textual syntax for markers (e.g., plain text) can return this from
+        :py:meth:`render_delayed_marker()` and use
+        :py:meth:`replace_sentinel_delayed_markers()` in
+        :py:meth:`replace_delayed_markers_with_final_values()`, and then set
+        `supports_delayed_render_markers = True`.
+        """
+        marker_start, marker_end = self.delayed_marker_sentinels
+        return marker_start + str(delayed_key) + marker_end
+
+    def replace_sentinel_delayed_markers(self, content, delayed_values):
+        r"""
+        Replace the markers generated by
+        :py:meth:`render_sentinel_delayed_marker()` by their final values.
+        """
+        marker_start, marker_end = self.delayed_marker_sentinels
+        return self.replace_delimited_delayed_markers(
+            content, delayed_values, marker_start, marker_end
+        )
+
+    ### END_LLM_PYTHON_ONLY
+
 
     # --- to be reimplemented ---
 
@@ -74,9 +74,48 @@ class HtmlFragmentRenderer(FragmentRenderer):
     # ------------------
 
     def htmlescape(self, value):
+        ### BEGIN_LLM_PYTHON_ONLY
+        # most pieces of text don't contain any character that needs escaping
+        if ('&' not in value and '<' not in value and '>' not in value
+                and '"' not in value and "'" not in value):
+            return value
+        ### END_LLM_PYTHON_ONLY
         return html.escape(value)
 
     def generate_open_tag(self, tagname, *, attrs=None, class_names=None, self_close_tag=False):
+        ### BEGIN_LLM_PYTHON_ONLY
+        if not attrs:
+            # tags without attributes other than 'class' are generated from a
+            # template that is computed once
+            key = (self.__class__, tagname,
+                   tuple(class_names) if class_names else None, self_close_tag)
+            open_tag = _open_tag_templates.get(key)
+            if open_tag is None:
+                open_tag = self._make_open_tag(tagname, None, class_names, self_close_tag)
+                if len(_open_tag_templates) < _open_tag_templates_max_size:
+                    _open_tag_templates[key] = open_tag
+            return open_tag
+        return self._make_open_tag(tagname, attrs, class_names, self_close_tag)
+
+    def _make_open_tag(self, tagname, attrs, class_names, self_close_tag):
+        if attrs:
+            attrs = dict(attrs) # this way attrs can be either dict or list of 2-tuples
+            if 'class' in attrs:
+                raise ValueError(
+                    "generate_open_tag(): set HTML 'class' attribute with "
+                    "class_names=, not with attrs="
+                )
+            attrs_list = list(attrs.items())
+        else:
+            attrs_list = []
+        if class_names:
+            attrs_list.append( ('class', ' '.join(class_names)) )
+        parts = [ '<', tagname ]
+        for aname, aval in attrs_list:
+            parts.append(f' {aname}="{self.htmlescape(aval)}"')
+        parts.append('/>' if self_close_tag else '>')
+        return "".join(parts)
+        ### END_LLM_PYTHON_ONLY
         s = f'<{tagname}'
         if not attrs:
             attrs = {}
@@ -99,6 +138,12 @@ class HtmlFragmentRenderer(FragmentRenderer):
 
     def wrap_in_tag(self, tagname, content_html, *,
                     attrs=None, class_names=None):
+        ### BEGIN_LLM_PYTHON_ONLY
+        return (
+            f"{self.generate_open_tag(tagname, attrs=attrs, class_names=class_names)}"
+            f"{content_html}</{tagname}>"
+        )
+        ### END_LLM_PYTHON_ONLY
         s = self.generate_open_tag(tagname, attrs=attrs, class_names=class_names)
         s += str(content_html)
         s += f'</{tagname}>'
@@ -140,6 +185,13 @@ class HtmlFragmentRenderer(FragmentRenderer):
         rendered.  Usually you'd want to simply join the strings together with
         no joiner, which is what the default implementation does.
         """
+        ### BEGIN_LLM_PYTHON_ONLY
+        if isinstance(content_list, list):
+            try:
+                return "".join(content_list)
+            except TypeError:
+                pass # not all pieces are strings
+        ### END_LLM_PYTHON_ONLY
         return "".join([str(s) for s in content_list])
 
     def render_join_blocks(self, content_list):
@@ -155,6 +207,36 @@ class HtmlFragmentRenderer(FragmentRenderer):
 
     # ------------------
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def render_node_chars(self, node, render_context):
+        # The escaped chars are stored on the node, so that they are not
+        # escaped again when the node is rendered again.  Only do this if
+        # render_value() and htmlescape() were not reimplemented.
+        if not self._uses_default_render_value():
+            return super().render_node_chars(node, render_context)
+        try:
+            return node._llm_html_escaped_chars
+        except AttributeError:
+            pass
+        value = super().render_node_chars(node, render_context)
+        node._llm_html_escaped_chars = value
+        return value
+
+    @classmethod
+    def _uses_default_render_value(cls):
+        try:
+            return cls.__dict__['_default_render_value']
+        except KeyError:
+            pass
+        cls._default_render_value = (
+            cls.render_value is HtmlFragmentRenderer.render_value
+            and cls.htmlescape is HtmlFragmentRenderer.htmlescape
+        )
+        return cls._default_render_value
+
+    ### END_LLM_PYTHON_ONLY
+
     def render_value(self, value):
         return self.htmlescape(value)
 
@@ -299,18 +381,20 @@ class HtmlFragmentRenderer(FragmentRenderer):
             if target_id_generator is not None:
                 dtattrs['id'] = target_id_generator(enumno)
 
+            # collect all <dt>/<dd> elements in a single list, so that they are
+            # joined only once
             s_items.append(
-                self.render_join([
-                    self.wrap_in_tag(
-                        'dt',
-                        tag_content,
-                        attrs=dtattrs,
-                    ),
-                    self.wrap_in_tag(
-                        'dd',
-                        item_content
-                    ),
-                ])
+                self.wrap_in_tag(
+                    'dt',
+                    tag_content,
+                    attrs=dtattrs,
+                )
+            )
+            s_items.append(
+                self.wrap_in_tag(
+                    'dd',
+                    item_content
+                )
             )
 
         return self.wrap_in_tag(
@@ -345,8 +429,8 @@ class HtmlFragmentRenderer(FragmentRenderer):
         )
         if inline_heading and self.inline_heading_add_space:
             content += ' '
-        logger.debug(f"Rendered heading: {content=!r}; {inline_heading=}; "
-                     f"add_space={self.inline_heading_add_space}")
+        logger.debug("Rendered heading: content=%r; inline_heading=%r; add_space=%r",
+                     content, inline_heading, self.inline_heading_add_space)
         return content
 
     def render_link(self, ref_type, href, display_nodelist, render_context, annotations=None):
@@ -369,6 +453,11 @@ class HtmlFragmentRenderer(FragmentRenderer):
         return f'<!-- delayed:{delayed_key} -->'
 
     def replace_delayed_markers_with_final_values(self, content, delayed_values):
+        ### BEGIN_LLM_PYTHON_ONLY
+        return self.replace_delimited_delayed_markers(
+            content, delayed_values, '<LLM:DLYD:', '/>'
+        )
+        ### END_LLM_PYTHON_ONLY
         return _rx_delayed_markers.sub(
             lambda m: delayed_values[int(m.group('key'))],
             content
@@ -512,5 +601,14 @@ class HtmlFragmentRenderer(FragmentRenderer):
 
 # ------------------
 
+### BEGIN_LLM_PYTHON_ONLY
+
+# (renderer class, tag name, class names, self_close_tag) -> open tag HTML code,
+# see HtmlFragmentRenderer.generate_open_tag()
+_open_tag_templates = {}
+_open_tag_templates_max_size = 4096
+
+### END_LLM_PYTHON_ONLY
+
 
 _rx_delayed_markers = re.compile(r'<LLM:DLYD:(?P<key>\d+)\s*/>')
@@ -1,6 +1,6 @@
 import re
 
-from pylatexenc.latexencode import UnicodeToLatexEncoder
+from pylatexenc.latexencode import UnicodeToLatexEncoder, get_builtin_uni2latex_dict
 
 import logging
 logger = logging.getLogger(__name__)
@@ -8,6 +8,146 @@ logger = logging.getLogger(__name__)
 from ._base import FragmentRenderer
 
 
+class _DefaultLatexEscaper:
+    r"""
+    Escapes text exactly like a `UnicodeToLatexEncoder` with default options,
+    but faster for the most common characters.
+
+    Text that only contains ASCII characters that the encoder leaves unchanged
+    is returned as is.  Other text that only contains ASCII and Latin-1
+    characters is escaped with a precomputed table of the encoder's
+    replacements.  Only text with other characters (or with characters that
+    the encoder doesn't know about) is passed on to the encoder.  Escaped
+    values are remembered, up to `max_cache_size` distinct strings.
+    """
+    def __init__(self, max_cache_size=16384):
+        super().__init__()
+        self.latex_encoder = UnicodeToLatexEncoder()
+        self.max_cache_size = max_cache_size
+        self._cache = {}
+
+        uni2latex = get_builtin_uni2latex_dict()
+
+        # Latin-1 characters that the encoder replaces (the replacement
+        # includes any protecting braces the encoder adds)
+        self._replacements = {
+            chr(o): self.latex_encoder.unicode_to_latex(chr(o))
+            for o in range(256)
+            if o in uni2latex
+        }
+        # characters that the encoder leaves as they are
+        kept_chars = [
+            chr(o)
+            for o in list(range(32, 128)) + [ ord(c) for c in "\n\r\t" ]
+            if o not in uni2latex
+        ]
+
+        def _rx_other_chars(chars):
+            # regular expression matching any character that is not in `chars`
+            return re.compile('[^' + "".join([ re.escape(c) for c in chars ]) + ']')
+
+        self._rx_not_kept = _rx_other_chars(kept_chars)
+        self._rx_not_in_table = _rx_other_chars(kept_chars + list(self._replacements))
+        self._rx_replaced = re.compile(
+            '[' + "".join([ re.escape(c) for c in self._replacements ]) + ']'
+        )
+
+    def latexescape(self, value):
+        if self._rx_not_kept.search(value) is None:
+            return value
+        try:
+            return self._cache[value]
+        except KeyError:
+            pass
+        if self._rx_not_in_table.search(value) is None:
+            result = self._rx_replaced.sub(self._replace_match, value)
+        else:
+            result = self.latex_encoder.unicode_to_latex(value)
+        if len(self._cache) >= self.max_cache_size:
+            self._cache = {}
+        self._cache[value] = result
+        return result
+
+    def _replace_match(self, m):
+        return self._replacements[m.group()]
+
+
+_default_latex_escaper = _DefaultLatexEscaper()
+
+
+# --- helpers for LatexFragmentRenderer.latex_compact_output ---
+
+_latex_safe_separator = "%\n\\relax{}"
+
+_latex_cs_letters = (
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz@'
+)
+
+_rx_latex_comment = re.compile(r'(?:^|[^\\])(?:\\\\)*%', flags=re.MULTILINE)
+
+_rx_latex_delayed_marker_at_end = re.compile(r'\\LLMDLYD\{\d+\}\Z')
+
+def _latex_has_trailing_comment(s):
+    # whether the last line of `s` might contain a comment, in which case
+    # anything appended to `s` would be commented out
+    i = s.rfind('\n') + 1
+    if s.find('%', i) == -1:
+        return False
+    return _rx_latex_comment.search(s, i) is not None
+
+def _latex_tail_kind(s):
+    # Classify how the (nonempty) LaTeX code `s` ends: 'cs' (control word or
+    # control symbol), 'dangling' (a lone backslash), 'space', 'group' (a
+    # brace), or 'char' (any other character token).  Only look at the last
+    # few characters unless they're all letters and backslashes.
+    tail = s[-256:]
+    if len(tail) < len(s) and not tail.strip(_latex_cs_letters + '\\'):
+        tail = s
+    if _rx_latex_delayed_marker_at_end.search(tail) is not None:
+        # the delayed content could end with anything
+        return 'cs'
+    body = tail.rstrip(_latex_cs_letters)
+    if len(body) < len(tail):
+        # ends with letters -- is it a control word?
+        num_backslashes = len(body) - len(body.rstrip('\\'))
+        return 'cs' if num_backslashes % 2 else 'char'
+    num_backslashes = len(tail) - len(tail.rstrip('\\'))
+    if num_backslashes:
+        return 'dangling' if num_backslashes % 2 else 'cs'
+    body = tail[:-1]
+    if (len(body) - len(body.rstrip('\\'))) % 2:
+        return 'cs'
+    c = tail[-1]
+    if c in ' \t\n\r':
+        return 'space'
+    if c in '{}':
+        return 'group'
+    return 'char'
+
+def _latex_compact_separator(a, b):
+    # Return the shortest separator to insert between the (nonempty) pieces of
+    # LaTeX code `a` and `b` such that the tokens on either side don't
+    # interact.
+    if _latex_has_trailing_comment(a):
+        return _latex_safe_separator
+    a_kind = _latex_tail_kind(a)
+    if a_kind == 'dangling':
+        return _latex_safe_separator
+    c = b[0]
+    if a_kind == 'cs' or c in '[*(<' or b.startswith('\\LLMDLYD{'):
+        # stop the control word's name or any lookahead for optional
+        # arguments or stars
+        return '{}'
+    if a_kind == 'space':
+        # don't merge spaces or create a paragraph break
+        return '{}' if c in ' \t\n\r' else ''
+    if a_kind == 'group':
+        return ''
+    # a_kind == 'char' -- avoid ligatures and kerning across the join
+    return '' if c in ' \t\n\r{}' else '{}'
+
+
+
 class LatexFragmentRenderer(FragmentRenderer):
 
     supports_delayed_render_markers = True
@@ -31,10 +171,15 @@ class LatexFragmentRenderer(FragmentRenderer):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.latex_encoder = UnicodeToLatexEncoder()
+        # remember the encoder with default options, see latexescape()
+        self._default_latex_encoder = self.latex_encoder
 
     # ------------------
 
     def latexescape(self, value):
+        if self.latex_encoder is self._default_latex_encoder:
+            # same result as the encoder, but faster
+            return _default_latex_escaper.latexescape(value)
         return self.latex_encoder.unicode_to_latex(value)
 
 
@@ -65,6 +210,18 @@ class LatexFragmentRenderer(FragmentRenderer):
             + r'\end{itemize}'
         )
 
+    latex_compact_output = False
+    r"""
+    Set to `True` to generate more compact LaTeX code.  By default, pieces of
+    rendered inline content are always separated by ``%\n\relax{}`` and
+    blocks by blank lines.  In compact mode, a separator (usually ``{}``) is
+    only inserted where the tokens on either side of the join could interact,
+    e.g., a control word followed by a letter, a character that could form a
+    ligature with the next one, or a command that looks ahead for an optional
+    argument.  Redundant blank lines between blocks are also dropped.  The
+    typeset result is the same.
+    """
+
     use_phantom_section = True
     latex_label_prefix = 'x:'
 
@@ -96,8 +253,31 @@ class LatexFragmentRenderer(FragmentRenderer):
         rendered.  Usually you'd want to simply join the strings together with
         no joiner, which is what the default implementation does.
         """
+        if self.latex_compact_output:
+            return self._render_join_compact(content_list)
         return "%\n\\relax{}".join([str(s) for s in content_list]) + "%\n\\relax{}"
 
+    def _render_join_compact(self, content_list):
+        pieces = []
+        last = None
+        for s in content_list:
+            s = str(s)
+            if not s:
+                continue
+            if last is not None:
+                sep = _latex_compact_separator(last, s)
+                if sep:
+                    pieces.append(sep)
+            pieces.append(s)
+            last = s
+        if last is not None and (
+                _latex_has_trailing_comment(last)
+                or _latex_tail_kind(last) == 'dangling'
+        ):
+            # protect whatever comes after us
+            pieces.append(_latex_safe_separator)
+        return "".join(pieces)
+
     def render_join_blocks(self, content_list):
         r"""
         Join together a collection of pieces of content that have already been
@@ -106,8 +286,23 @@ class LatexFragmentRenderer(FragmentRenderer):
         to simply join the strings together with no joiner, which is what the
         default implementation does.
         """
+        if self.latex_compact_output:
+            return self._render_join_blocks_compact(content_list)
         return "\n\n".join(content_list)
 
+    def _render_join_blocks_compact(self, content_list):
+        # a single blank line between blocks is enough; keep any blank lines
+        # at the very beginning and end, they might be paragraph breaks
+        content_list = list(content_list)
+        blocks = [ s.strip('\n') for s in content_list ]
+        blocks = [ s for s in blocks if s ]
+        if not blocks:
+            return "\n\n".join(content_list)
+        first, last = content_list[0], content_list[-1]
+        leading = first[:len(first) - len(first.lstrip('\n'))]
+        trailing = last[len(last.rstrip('\n')):]
+        return leading + "\n\n".join(blocks) + trailing
+
 
     # ------------------
 
@@ -321,6 +516,11 @@ class LatexFragmentRenderer(FragmentRenderer):
         return f'% delayed:{delayed_key}\n' + r'\relax{}'
 
     def replace_delayed_markers_with_final_values(self, content, delayed_values):
+        ### BEGIN_LLM_PYTHON_ONLY
+        return self.replace_delimited_delayed_markers(
+            content, delayed_values, '\\LLMDLYD{', '}'
+        )
+        ### END_LLM_PYTHON_ONLY
         return _rx_delayed_markers.sub(
             lambda m: delayed_values[int(m.group('key'))],
             content
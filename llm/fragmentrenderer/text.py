@@ -8,15 +8,100 @@ class TextFragmentRenderer(FragmentRenderer):
 
     #supports_delayed_render_markers = False # -- inherited already
 
+    ### BEGIN_LLM_PYTHON_ONLY
+    # Plain text has no syntax we could reserve for markers, so we use
+    # private-use sentinel markers (see
+    # FragmentRenderer.render_sentinel_delayed_marker())
+    supports_delayed_render_markers = True
+    ### END_LLM_PYTHON_ONLY
+
     def render_value(self, value):
         return value
 
     def render_delayed_marker(self, node, delayed_key, render_context):
+        ### BEGIN_LLM_PYTHON_ONLY
+        return self.render_sentinel_delayed_marker(delayed_key)
+        ### END_LLM_PYTHON_ONLY
         return ''
 
     def render_delayed_dummy_placeholder(self, node, delayed_key, render_context):
         return '#DELAYED#'
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def replace_delayed_markers_with_final_values(self, content, delayed_values):
+        content = self.replace_sentinel_delayed_markers(content, delayed_values)
+        if self.delayed_marker_sentinels[0] in content:
+            content = self._replace_heading_layout_markers(content)
+        return content
+
+    def _replace_heading_layout_markers(self, content):
+        # Headings whose text contains delayed content are laid out only once
+        # the final values are known (see render_heading()).  At this point the
+        # only sentinel markers left in `content` are the following ones:
+        #
+        #   'h' -- start of a heading that is to be underlined
+        #   'u' + <char> -- underline the heading with <char>
+        #   'p' + <char> -- append <char> unless preceded by punctuation
+        #   'e' / 'E' -- start / end of an enumeration (see render_enumeration())
+        #   't' / 'T' -- start / end of an enumeration item's tag, to be
+        #                right-aligned with the enclosing enumeration's other tags
+        #
+        marker_start, marker_end = self.delayed_marker_sentinels
+        find = content.find
+        pieces = []
+        pos = 0
+        heading_start = None
+        enumerations = [] # stack of lists of indices in `pieces` of item tags
+        tag_start = None
+        while True:
+            i = find(marker_start, pos)
+            if i == -1:
+                break
+            j = find(marker_end, i + len(marker_start))
+            if j == -1:
+                break
+            what = content[i+len(marker_start):j]
+            pieces.append(content[pos:i])
+            pos = j + len(marker_end)
+            if what == 'e':
+                enumerations.append([])
+            elif what == 't':
+                tag_start = len(pieces)
+            elif what == 'T' and tag_start is not None:
+                # collapse the tag into a single piece
+                pieces[tag_start:] = [ "".join(pieces[tag_start:]) ]
+                if enumerations:
+                    enumerations[-1].append(tag_start)
+                tag_start = None
+            elif what == 'E' and enumerations:
+                tag_indices = enumerations.pop()
+                if tag_indices:
+                    max_item_width = max([ len(pieces[k]) for k in tag_indices ])
+                    for k in tag_indices:
+                        pieces[k] = pieces[k].rjust(max_item_width+2, ' ')
+            elif what == 'h':
+                heading_start = len(pieces)
+            elif what[:1] == 'u' and heading_start is not None:
+                heading = "".join(pieces[heading_start:])
+                if heading.endswith('\n'):
+                    heading = heading[:-1]
+                pieces.append(what[1:] * len(heading))
+                heading_start = None
+            elif what[:1] == 'p':
+                preceding_char = ''
+                for piece in reversed(pieces):
+                    piece = piece.rstrip()
+                    if piece:
+                        preceding_char = piece[-1]
+                        break
+                if preceding_char not in '.,:;?!':
+                    pieces.append(what[1:])
+        pieces.append(content[pos:])
+        return "".join(pieces)
+
+    ### END_LLM_PYTHON_ONLY
+
     def render_nothing(self, annotations=None):
         return ''
 
@@ -65,6 +150,25 @@ class TextFragmentRenderer(FragmentRenderer):
         if not all_items:
             return self.render_semantic_block('', 'enumeration', annotations=annotations)
 
+        ### BEGIN_LLM_PYTHON_ONLY
+        if any([ self.delayed_marker_sentinels[0] in str(fmtcnt)
+                 for fmtcnt, item_content in all_items ]):
+            # some tags contain delayed content, so we can only align them once
+            # we know their final widths
+            mk = self.render_sentinel_delayed_marker
+            return mk('e') + self.render_join_blocks([
+                self.render_semantic_block(
+                    self.render_join([
+                        mk('t') + fmtcnt + mk('T') + ' ',
+                        item_content,
+                    ]),
+                    'enumeration',
+                    annotations=annotations,
+                )
+                for fmtcnt, item_content in all_items
+            ]) + mk('E')
+        ### END_LLM_PYTHON_ONLY
+
         max_item_width = max([ len(fmtcnt) for fmtcnt, item_content in all_items ])
 
         return self.render_join_blocks([
@@ -87,10 +191,27 @@ class TextFragmentRenderer(FragmentRenderer):
 
         def add_punct(x, c):
             x = str(x)
+            ### BEGIN_LLM_PYTHON_ONLY
+            if x.rstrip().endswith(self.delayed_marker_sentinels[1]):
+                # ends with delayed content, decide when we know its value
+                return x + self.render_sentinel_delayed_marker('p' + c)
+            ### END_LLM_PYTHON_ONLY
             if x.rstrip()[-1:] in '.,:;?!':
                 return x
             return x + c
 
+        ### BEGIN_LLM_PYTHON_ONLY
+        if heading_level in (1, 2, 3) \
+           and self.delayed_marker_sentinels[0] in str(rendered_heading):
+            # the heading contains delayed content, so we can only underline it
+            # once we know its final length
+            return (
+                self.render_sentinel_delayed_marker('h')
+                + rendered_heading + '\n'
+                + self.render_sentinel_delayed_marker('u' + '=-~'[heading_level-1])
+            )
+        ### END_LLM_PYTHON_ONLY
+
         if heading_level == 1:
             return f"{rendered_heading}\n{'='*len(rendered_heading)}"
         if heading_level == 2:
@@ -3,6 +3,11 @@ logger = logging.getLogger(__name__)
 
 from .llmrendercontext import LLMRenderContext
 
+### BEGIN_LLM_PYTHON_ONLY
+import tempfile
+import asyncio
+### END_LLM_PYTHON_ONLY
+
 
 class LLMDocumentRenderContext(LLMRenderContext):
     def __init__(self, doc, fragment_renderer, feature_document_managers, **kwargs):
@@ -23,6 +28,13 @@ class LLMDocumentRenderContext(LLMRenderContext):
         self._delayed_render_nodes = {} # key => node
         self._delayed_render_content = {} # key => string-content
 
+        ### BEGIN_LLM_PYTHON_ONLY
+        # event loop on which to await lookups before a fragment is rendered,
+        # set by LLMDocument.render_async() while the render runs in a worker
+        # thread
+        self._async_loop = None
+        ### END_LLM_PYTHON_ONLY
+
     def supports_feature(self, feature_name):
         return ( feature_name in self.feature_render_managers_by_name )
 
@@ -41,6 +53,34 @@ class LLMDocumentRenderContext(LLMRenderContext):
     def get_delayed_render_content(self, node):
         return self._delayed_render_content[node.llm_delayed_render_key]
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def prepare_fragment_render(self, llm_fragment):
+        if self._async_loop is not None:
+            asyncio.run_coroutine_threadsafe(
+                self.prepare_fragment_render_async(llm_fragment),
+                self._async_loop
+            ).result()
+        for feature_name, feature_render_manager in self.feature_render_managers:
+            if feature_render_manager is not None:
+                feature_render_manager.prepare_fragment_render(llm_fragment)
+
+    async def prepare_fragment_render_async(self, llm_fragment):
+        await asyncio.gather(*[
+            feature_render_manager.prepare_fragment_render_async(llm_fragment)
+            for feature_name, feature_render_manager in self.feature_render_managers
+            if feature_render_manager is not None
+        ])
+
+    async def prefetch_async(self):
+        await asyncio.gather(*[
+            feature_render_manager.prefetch_async()
+            for feature_name, feature_render_manager in self.feature_render_managers
+            if feature_render_manager is not None
+        ])
+
+    ### END_LLM_PYTHON_ONLY
+
 
 
 class LLMDocument:
@@ -125,6 +165,18 @@ class LLMDocument:
             feature_render_options=feature_render_options
         )
 
+        value = self._render_in_context(render_context)
+
+        return value, render_context
+
+    def _render_in_context(self, render_context):
+
+        value = self._render_first_pass(render_context)
+
+        return self._render_final(render_context, value)
+
+    def _render_first_pass(self, render_context):
+
         # first pass render or render w/o any delayed content
         value = self.render_callback(render_context)
         if value is None:
@@ -133,21 +185,13 @@ class LLMDocument:
 
         #logger.debug("first pass -> value = %r", value)
 
-        # do any necessary processing required by the feature managers, in the
-        # order they were specified
+        return value
 
-        for feature_name, feature_render_manager in render_context.feature_render_managers:
-            if feature_render_manager is not None:
-                feature_render_manager.process(value)
+    def _render_final(self, render_context, value):
 
-        # now render all the delayed nodes
+        fragment_renderer = render_context.fragment_renderer
 
-        for key, node in render_context._delayed_render_nodes.items():
-            # render the content of these delayed-render nodes now.  We know
-            # that the node's llm_specinfo must have a render() method because
-            # it's a delayed render node.
-            render_context._delayed_render_content[key] = \
-                node.llm_specinfo.render(node, render_context)
+        self._process_first_pass(render_context, value)
 
         # now produce the final, rendered result
 
@@ -164,7 +208,10 @@ class LLMDocument:
                     render_context._delayed_render_content
                 )
 
-            if isinstance(value, dict):
+            if not render_context._delayed_render_content:
+                # nothing was delayed, so there are no markers to replace
+                pass
+            elif isinstance(value, dict):
                 # dictionary, fix it
                 value = {
                     k: fix_string_fn(s)
@@ -183,11 +230,215 @@ class LLMDocument:
 
         #logger.debug("document render final_value = %r", value)
 
+        self._postprocess(render_context, value)
+
+        return value
+
+    def _process_first_pass(self, render_context, value):
+
+        # do any necessary processing required by the feature managers, in the
+        # order they were specified
+
+        for feature_name, feature_render_manager in render_context.feature_render_managers:
+            if feature_render_manager is not None:
+                feature_render_manager.process(value)
+
+        # now render all the delayed nodes
+
+        for key, node in render_context._delayed_render_nodes.items():
+            # render the content of these delayed-render nodes now.  We know
+            # that the node's llm_specinfo must have a render() method because
+            # it's a delayed render node.
+            render_context._delayed_render_content[key] = \
+                node.llm_specinfo.render(node, render_context)
+
+    def _postprocess(self, render_context, value):
         for feature_name, feature_render_manager in render_context.feature_render_managers:
             if feature_render_manager is not None:
                 feature_render_manager.postprocess(value)
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def make_derived_render_context(self, render_context, fragment_renderer):
+        r"""
+        Create a render context for rendering this document with
+        `fragment_renderer`, whose feature render managers share the
+        format-independent state of those of `render_context` (see
+        :py:meth:`llm.feature.Feature.RenderManager.derive_render_manager()`).
+        """
+        derived_render_context = LLMDocumentRenderContext(
+            self,
+            fragment_renderer,
+            self.feature_document_managers,
+        )
+        derived_render_context.feature_render_managers = [
+            ( (feature_name, feature_render_manager.derive_render_manager(
+                derived_render_context
+            ))
+              if feature_render_manager is not None
+              else (feature_name, None) )
+            for feature_name, feature_render_manager
+            in render_context.feature_render_managers
+        ]
+        derived_render_context.feature_render_managers_by_name = \
+            dict(derived_render_context.feature_render_managers)
+        return derived_render_context
+
+    def render_multi(self, fragment_renderers, feature_render_options=None):
+        r"""
+        Render the document in several output formats, e.g., HTML, text and
+        LaTeX, with each of the given `fragment_renderers`.
+
+        The document is rendered with the first fragment renderer just like
+        with :py:meth:`render()`.  The render contexts used for the other
+        fragment renderers share its feature render managers' state (see
+        :py:meth:`make_derived_render_context()`).  Labels, endnote and float
+        numbering, the parsing of their counter values, and the lookups of
+        external references and citations are thus only performed once;
+        only the rendering of the content in each output format is repeated.
+        The feature render managers are initialized once, with
+        `feature_render_options`.
+
+        Returns a list of `(value, render_context)` tuples, one for each
+        fragment renderer, as returned by :py:meth:`render()`.
+        """
+        results = []
+        first_render_context = None
+        for fragment_renderer in fragment_renderers:
+            if first_render_context is None:
+                render_context = self.make_render_context(
+                    fragment_renderer,
+                    feature_render_options=feature_render_options
+                )
+                first_render_context = render_context
+            else:
+                render_context = self.make_derived_render_context(
+                    first_render_context,
+                    fragment_renderer
+                )
+            value = self._render_in_context(render_context)
+            results.append( (value, render_context) )
+        return results
+
+    async def render_async(self, fragment_renderer, feature_render_options=None):
+        r"""
+        Render the document like :py:meth:`render()`, but await the lookups of
+        external resources concurrently.
+
+        The document's render callback (and the rest of the rendering) runs in
+        a worker thread of the event loop's default executor.  Before each
+        fragment is rendered, the feature render managers can look up the
+        resources it needs with their
+        :py:meth:`~llm.feature.Feature.RenderManager.prepare_fragment_render_async()`
+        method on the event loop, e.g., the full text of the citations in the
+        fragment or the graphics resources of its ``\includegraphics``
+        commands.  After the first pass, the lookups registered by the feature
+        render managers, e.g., the references to external targets, are awaited
+        together (see
+        :py:meth:`~llm.feature.Feature.RenderManager.prefetch_async()`) before
+        the delayed content is rendered.  For this to be useful, the external
+        ref resolver, citations provider, or graphics resource provider must
+        provide awaitable lookup methods; lookups that are not awaited this way
+        are performed synchronously as in :py:meth:`render()`.
+
+        Returns a tuple `(value, render_context)` as :py:meth:`render()` does.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        render_context = self.make_render_context(
+            fragment_renderer,
+            feature_render_options=feature_render_options
+        )
+
+        render_context._async_loop = loop
+        try:
+            value = await loop.run_in_executor(
+                None, self._render_first_pass, render_context
+            )
+            await render_context.prefetch_async()
+            value = await loop.run_in_executor(
+                None, self._render_final, render_context, value
+            )
+        finally:
+            render_context._async_loop = None
+
         return value, render_context
 
+    spool_max_size = 8 * 1024 * 1024
+    r"""
+    Maximum number of characters of first-pass output that
+    :py:meth:`render_to_stream()` keeps in memory before spooling it to a
+    temporary file on disk.
+    """
+
+    def render_to_stream(self, stream, fragment_renderer, feature_render_options=None):
+        r"""
+        Render the document and write the result to the file-like object
+        `stream`, without building the full output as a single string.
+
+        For this method, the document's render callback must return an
+        iterable of strings, e.g., the pieces returned by
+        :py:meth:`LLMFragment.render_chunks()`.  The feature render managers'
+        `process()` and `postprocess()` methods are called with `None` instead
+        of the rendered value.
+
+        If the fragment renderer supports delayed render markers, the
+        first-pass output is spooled (in memory up to `spool_max_size`
+        characters, then in a temporary file).  Once the delayed content is
+        rendered, the spooled output is written to `stream` piece by piece,
+        with the markers replaced.  Otherwise, the render callback is called a
+        second time and its output is written directly to `stream`.
+
+        Returns the render context.
+        """
+
+        render_context = self.make_render_context(
+            fragment_renderer,
+            feature_render_options=feature_render_options
+        )
+
+        chunks = self.render_callback(render_context)
+
+        if not fragment_renderer.supports_delayed_render_markers:
+            for chunk in chunks:
+                pass # first pass, output is discarded
+            self._process_first_pass(render_context, None)
+            render_context.two_pass_mode_is_second_pass = True
+            for chunk in self.render_callback(render_context):
+                stream.write(chunk)
+            self._postprocess(render_context, None)
+            return render_context
+
+        with tempfile.SpooledTemporaryFile(max_size=self.spool_max_size, mode='w+',
+                                           encoding='utf-8', newline='') as spool:
+
+            # remember where each chunk ends, so we can read them back in the
+            # same pieces (markers never straddle two chunks)
+            chunk_lengths = []
+            for chunk in chunks:
+                if chunk:
+                    spool.write(chunk)
+                    chunk_lengths.append(len(chunk))
+
+            self._process_first_pass(render_context, None)
+
+            delayed_values = render_context._delayed_render_content
+            spool.seek(0)
+            for chunk_length in chunk_lengths:
+                chunk = spool.read(chunk_length)
+                if delayed_values:
+                    chunk = fragment_renderer.replace_delayed_markers_with_final_values(
+                        chunk,
+                        delayed_values
+                    )
+                stream.write(chunk)
+
+        self._postprocess(render_context, None)
+
+        return render_context
+
+    ### END_LLM_PYTHON_ONLY
+
 
 
@@ -9,6 +9,14 @@ from pylatexenc import latexwalker
 
 from .llmfragment import LLMFragment
 from .llmdocument import LLMDocument
+from . import fmthelpers
+
+### BEGIN_LLM_PYTHON_ONLY
+import copy
+import uuid
+import weakref
+from .llmtokenreader import LLMFastTokenReader
+### END_LLM_PYTHON_ONLY
 
 # ------------------------------------------------------------------------------
 
@@ -253,6 +261,7 @@ class LLMLatexWalker(latexwalker.LatexWalker):
                  standalone_mode=False,
                  resource_info=None,
                  what=None,
+                 fast_token_reader=False,
                  **kwargs):
 
         super().__init__(
@@ -279,6 +288,20 @@ class LLMLatexWalker(latexwalker.LatexWalker):
 
         self._parsing_state_event_handler = parsing_state_event_handler
 
+        self.fast_token_reader = fast_token_reader
+
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def make_token_reader(self, pos=None):
+        if not self.fast_token_reader:
+            return super().make_token_reader(pos=pos)
+        token_reader = LLMFastTokenReader(self.s, tolerant_parsing=self.tolerant_parsing)
+        if pos is not None:
+            token_reader.move_to_pos_chars(pos)
+        return token_reader
+
+    ### END_LLM_PYTHON_ONLY
+
     def parsing_state_event_handler(self):
         if self._parsing_state_event_handler:
             return self._parsing_state_event_handler
@@ -298,7 +321,9 @@ class LLMEnvironment:
                  latex_context,
                  parsing_state,
                  features,
-                 tolerant_parsing=False):
+                 tolerant_parsing=False,
+                 parse_cache=None,
+                 fast_token_reader=False):
         super().__init__()
 
         logger.debug("LLMEnvironment constructor")
@@ -310,25 +335,38 @@ class LLMEnvironment:
         self.features = features
         self.features_by_name = {f.feature_name: f for f in self.features}
         self.tolerant_parsing = tolerant_parsing
+        self.parse_cache = parse_cache
+        self.fast_token_reader = fast_token_reader
 
         self._node_list_finalizer = NodeListFinalizer()
 
-        if self.parsing_state.latex_context is None:
+        # determined lazily by is_plain_text()
+        self._rx_not_plain_text = None
 
-            # set the parsing_state's latex_context appropriately.
-            for f in features:
-                moredefs = f.add_latex_context_definitions()
-                if moredefs:
-                    logger.debug(f"Adding definitions for “{f.feature_name}”")
-                    moredefs2 = dict(moredefs)
-                    moredefs2.update(prepend=True)
-                    self.latex_context.add_context_category(
-                        f'feature--{f.feature_name}',
-                        **moredefs2
-                    )
+        # see make_counter_fragment()
+        self._counter_fragments = {}
 
-            # prevent further changes to latex context
-            self.latex_context.freeze()
+        if self.parsing_state.latex_context is None:
+
+            # A latex context that is already frozen is assumed to already
+            # contain the features' definitions (e.g., it was built for
+            # another environment with the same features).
+            if not self.latex_context.frozen:
+
+                # set the parsing_state's latex_context appropriately.
+                for f in features:
+                    moredefs = f.add_latex_context_definitions()
+                    if moredefs:
+                        logger.debug(f"Adding definitions for “{f.feature_name}”")
+                        moredefs2 = dict(moredefs)
+                        moredefs2.update(prepend=True)
+                        self.latex_context.add_context_category(
+                            f'feature--{f.feature_name}',
+                            **moredefs2
+                        )
+
+                # prevent further changes to latex context
+                self.latex_context.freeze()
 
             # set the parsing state's latex_context
             self.parsing_state.latex_context = self.latex_context
@@ -362,6 +400,7 @@ class LLMEnvironment:
             resource_info=resource_info,
             what=what,
             parsing_state_event_handler=self.parsing_state_event_handler,
+            fast_token_reader=self.fast_token_reader,
         )
 
         return latex_walker
@@ -370,6 +409,80 @@ class LLMEnvironment:
         fragment = LLMFragment(llm_text, environment=self, **kwargs)
         return fragment
 
+    counter_fragments_max_size = 4096
+
+    def make_counter_fragment(self, counter_formatter, number, *,
+                              standalone_mode=False, what='counter value'):
+        r"""
+        Return an inline :py:class:`LLMFragment` with the LLM text
+        `counter_formatter(number)`, e.g., the formatted value of a footnote or
+        a figure counter.
+
+        Both the formatted text (see :py:func:`fmthelpers.format_counter()`)
+        and the fragment are memoized, so a given counter value is only parsed
+        once per environment.  The returned fragment can be shared between
+        different callers and documents; it must not be modified.
+        """
+        llm_text = fmthelpers.format_counter(counter_formatter, number)
+        key = ('S:' if standalone_mode else 'N:') + llm_text
+        if key in self._counter_fragments:
+            return self._counter_fragments[key]
+        fragment = self.make_fragment(
+            llm_text,
+            is_block_level=False,
+            standalone_mode=standalone_mode,
+            what=what,
+        )
+        if len(self._counter_fragments) >= self.counter_fragments_max_size:
+            self._counter_fragments = {}
+        self._counter_fragments[key] = fragment
+        return fragment
+
+    def is_plain_text(self, llm_text):
+        r"""
+        Return `True` if the given LLM text is plain text, i.e., if it contains
+        no character that can start a macro, environment, group, math mode,
+        comment, or specials, no forbidden character, and no paragraph break.
+
+        Plain text always parses into a single chars node.  Fragments whose
+        text is plain text are created without running the full parser.
+        """
+        if self._rx_not_plain_text is None:
+            self._rx_not_plain_text = self._make_rx_not_plain_text()
+        return self._rx_not_plain_text.search(llm_text) is None
+
+    def _make_rx_not_plain_text(self):
+        parsing_state = self.parsing_state
+        special_chars = [ parsing_state.macro_escape_char ]
+        if parsing_state.forbidden_characters:
+            special_chars += list(parsing_state.forbidden_characters)
+        if parsing_state.enable_math:
+            for delimlist in (parsing_state.latex_inline_math_delimiters,
+                              parsing_state.latex_display_math_delimiters):
+                for delimpair in delimlist:
+                    for delim in delimpair:
+                        special_chars.append(delim[0])
+        if parsing_state.enable_comments and parsing_state.comment_start:
+            special_chars.append(parsing_state.comment_start[0])
+        if parsing_state.enable_groups:
+            for delimpair in parsing_state.latex_group_delimiters:
+                for delim in delimpair:
+                    special_chars.append(delim[0])
+        if parsing_state.enable_specials:
+            for spec in parsing_state.latex_context.iter_specials_specs():
+                c = spec.specials_chars[:1]
+                # whitespace is skipped before looking for specials, so
+                # specials that start with whitespace (e.g., '\n\n') are never
+                # matched as such
+                if c.strip():
+                    special_chars.append(c)
+        rx_parts = [
+            '[' + "".join([ re.escape(c) for c in special_chars ]) + ']'
+        ]
+        if parsing_state.enable_double_newline_paragraphs:
+            rx_parts.append(r'\n\s*\n')
+        return re.compile("|".join(rx_parts))
+
 
     def node_list_finalizer(self):
         return self._node_list_finalizer
@@ -396,6 +509,93 @@ class LLMEnvironment:
     def get_parse_error_message(self, exception_object):
         return LatexWalkerParseErrorFormatter(exception_object).to_display_string()
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def get_pickle_token(self):
+        r"""
+        Return a string that uniquely identifies this environment instance
+        across pickling.  When an environment is unpickled several times in the
+        same process (e.g., because many fragments that refer to it are sent to
+        the same worker process), the environment is rebuilt only the first
+        time and the same rebuilt instance is returned every time after that.
+
+        (The original environment instance is not registered; unpickling in the
+        process where the environment was pickled always creates a new
+        environment instance.)
+        """
+        if '_pickle_token' not in self.__dict__:
+            self._pickle_token = uuid.uuid4().hex
+        return self._pickle_token
+
+    def get_pickle_state(self):
+        r"""
+        Return a tuple `(how, state)` describing how to rebuild this environment
+        when it is unpickled.  If `how == 'config'`, the environment is rebuilt
+        by calling the environment class with the keyword arguments `state`.
+        If `how == 'state'`, the environment's attributes are restored from the
+        dictionary `state` without calling the constructor.
+
+        The default implementation stores all the environment's attributes,
+        including the frozen latex context.  Subclasses can reimplement this
+        method to provide a more compact configuration description.
+        """
+        state = dict(self.__dict__)
+        state.pop('_pickle_token', None)
+        state['_counter_fragments'] = {}
+        return ('state', state)
+
+    def __reduce__(self):
+        how, state = self.get_pickle_state()
+        return (
+            _unpickle_environment,
+            (self.get_pickle_token(), self.__class__, how, state)
+        )
+
+    # copy.copy() and copy.deepcopy() would otherwise go through __reduce__()
+    # and the pickle token mechanism
+
+    def __copy__(self):
+        environment = self.__class__.__new__(self.__class__)
+        environment.__dict__.update(self.__dict__)
+        environment.__dict__.pop('_pickle_token', None)
+        # memoized fragments refer to the original environment
+        environment._counter_fragments = {}
+        return environment
+
+    def __deepcopy__(self, memo):
+        environment = self.__class__.__new__(self.__class__)
+        memo[id(self)] = environment
+        state = dict(self.__dict__)
+        state.pop('_pickle_token', None)
+        state['_counter_fragments'] = {}
+        environment.__dict__.update(copy.deepcopy(state, memo))
+        return environment
+
+    ### END_LLM_PYTHON_ONLY
+
+
+
+### BEGIN_LLM_PYTHON_ONLY
+
+_environments_by_pickle_token = weakref.WeakValueDictionary()
+
+def _unpickle_environment(pickle_token, cls, how, state):
+    environment = _environments_by_pickle_token.get(pickle_token, None)
+    if environment is not None:
+        return environment
+    if how == 'config':
+        environment = cls(**state)
+    elif how == 'state':
+        environment = cls.__new__(cls)
+        environment.__dict__.update(state)
+    else:
+        raise ValueError(f"Invalid environment pickle state: {how!r}")
+    environment._pickle_token = pickle_token
+    _environments_by_pickle_token[pickle_token] = environment
+    return environment
+
+### END_LLM_PYTHON_ONLY
+
 
 
 # ------------------------------------------------------------------------------
@@ -8,6 +8,12 @@ import pylatexenc.latexnodes.nodes as latexnodes_nodes
 
 from .llmrendercontext import LLMStandaloneModeRenderContext
 
+### BEGIN_LLM_PYTHON_ONLY
+import threading
+import concurrent.futures
+from .parsecache import dumps_nodes, loads_nodes
+### END_LLM_PYTHON_ONLY
+
 
 class LLMFragment:
     r"""
@@ -27,6 +33,17 @@ class LLMFragment:
     call might wish to look for graphics in the same filesystem folder as a file
     that contained the LLM code; the `resource_info` object can be used to store
     the filesystem folder of the LLM code forming this fragment.
+
+    If `lazy=True`, the LLM text is only parsed when the fragment's nodes are
+    first needed (e.g., when the fragment is rendered, truncated, or when the
+    `nodes` or `latex_walker` attributes are accessed).  Parse errors are then
+    raised at that point instead of in the constructor.  If additionally
+    `background_parse=True`, parsing starts immediately in a background
+    thread; accessing the nodes waits for it to finish.  A lazy fragment can be
+    shared between threads: the text is parsed only once, and other threads
+    that need the nodes in the meantime wait for the parse to complete.  (Lazy
+    parsing is only available in Python; the flags are ignored in the
+    JavaScript version.)
     """
 
     def __init__(
@@ -39,6 +56,8 @@ class LLMFragment:
             standalone_mode=False,
             what='(unknown)',
             silent=False,
+            lazy=False,
+            background_parse=False,
     ):
 
         self.llm_text = llm_text
@@ -58,16 +77,30 @@ class LLMFragment:
             self.llm_text = self.nodes.latex_verbatim()
             return
 
-        try:
-            self.latex_walker, self.nodes = \
-                LLMFragment.parse(
-                    self.llm_text,
-                    self.environment,
-                    standalone_mode=self.standalone_mode,
-                    is_block_level=self.is_block_level,
-                    what=self.what,
-                    resource_info=self.resource_info,
+        ### BEGIN_LLM_PYTHON_ONLY
+        if lazy:
+            # parse later, see __getattr__()
+            self._lazy_parse_future = None
+            self._lazy_parse_lock = threading.Lock()
+            if background_parse:
+                self._lazy_parse_future = _get_background_parse_executor().submit(
+                    self._do_parse
                 )
+            return
+        ### END_LLM_PYTHON_ONLY
+
+        self.latex_walker, self.nodes = self._do_parse()
+
+    def _do_parse(self):
+        try:
+            return LLMFragment.parse(
+                self.llm_text,
+                self.environment,
+                standalone_mode=self.standalone_mode,
+                is_block_level=self.is_block_level,
+                what=self.what,
+                resource_info=self.resource_info,
+            )
         except latexnodes.LatexWalkerParseError as e:
             if not self.silent:
                 error_message = self.environment.get_parse_error_message(e)
@@ -82,6 +115,41 @@ class LLMFragment:
                              f"Given text was:\n‘{self.llm_text}’\n\n")
             raise
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def __getattr__(self, name):
+        # Only called if the attribute doesn't exist -- for lazy fragments,
+        # this is where we parse the LLM text
+        if name in ('nodes', 'latex_walker') and '_lazy_parse_future' in self.__dict__:
+            self._ensure_lazy_parsed()
+            return self.__dict__[name]
+        raise AttributeError(
+            f"'{self.__class__.__name__}' object has no attribute '{name}'"
+        )
+
+    def _ensure_lazy_parsed(self):
+        with self.__dict__['_lazy_parse_lock']:
+            future = self.__dict__.get('_lazy_parse_future', False)
+            if future is False:
+                # another thread parsed the fragment in the meantime
+                return
+            if future is not None:
+                latex_walker, nodes = future.result()
+            else:
+                latex_walker, nodes = self._do_parse()
+            # publish the nodes before marking the fragment as parsed
+            self.latex_walker, self.nodes = latex_walker, nodes
+            del self._lazy_parse_future
+
+    def is_parsed(self):
+        r"""
+        Returns `False` if this is a lazy fragment whose LLM text was not
+        parsed yet, and `True` otherwise.
+        """
+        return '_lazy_parse_future' not in self.__dict__
+
+    ### END_LLM_PYTHON_ONLY
+
 
     def _attributes(self, **kwargs):
         d = dict(
@@ -101,6 +169,20 @@ class LLMFragment:
             **kwargs
         )
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def render_chunks(self, render_context, **kwargs):
+        r"""
+        Like :py:meth:`render()`, but return an iterator over pieces of the
+        rendered output.  See :py:meth:`FragmentRenderer.render_fragment_chunks()`.
+        """
+        return render_context.fragment_renderer.render_fragment_chunks(
+            self, render_context,
+            **kwargs
+        )
+
+    ### END_LLM_PYTHON_ONLY
+
     def render_standalone(self, fragment_renderer):
         if not self.standalone_mode:
             raise ValueError(
@@ -115,6 +197,43 @@ class LLMFragment:
     def parse(cls, llm_text, environment, *,
               standalone_mode=False, resource_info=None, is_block_level=None, what=None):
 
+        if len(llm_text) and environment.is_plain_text(llm_text):
+            # Fast path for plain text -- the result is a single chars node
+            latex_walker = environment.make_latex_walker(
+                llm_text,
+                resource_info=resource_info,
+                standalone_mode=standalone_mode,
+                what=what,
+            )
+            parsing_state = latex_walker.make_parsing_state(is_block_level=is_block_level)
+            chars_node = latex_walker.make_node(
+                latexnodes_nodes.LatexCharsNode,
+                parsing_state=parsing_state,
+                chars=llm_text,
+                pos=0,
+                pos_end=len(llm_text),
+            )
+            nodes = latex_walker.make_nodelist(
+                [ chars_node ],
+                parsing_state=parsing_state,
+                pos=0,
+                pos_end=len(llm_text),
+            )
+            return latex_walker, nodes
+
+        parse_cache = environment.parse_cache
+        if parse_cache is not None:
+            cached = parse_cache.get_parsed(
+                llm_text,
+                environment,
+                is_block_level=is_block_level,
+                standalone_mode=standalone_mode,
+                resource_info=resource_info,
+                what=what,
+            )
+            if cached is not None:
+                return cached
+
         latex_walker = environment.make_latex_walker(
             llm_text,
             resource_info=resource_info,
@@ -129,9 +248,84 @@ class LLMFragment:
             parsing_state=parsing_state,
         )
 
+        if parse_cache is not None:
+            parse_cache.store_parsed(
+                llm_text,
+                environment,
+                is_block_level=is_block_level,
+                standalone_mode=standalone_mode,
+                resource_info=resource_info,
+                latex_walker=latex_walker,
+                nodes=nodes,
+                what=what,
+            )
+
         return latex_walker, nodes
 
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def __reduce__(self):
+        if not self.is_parsed():
+            # no need to parse the fragment only to pickle it
+            return (
+                _unpickle_lazy_fragment,
+                (self.__class__, self.environment, self.llm_text, self._attributes())
+            )
+        # Pickle the parsed nodes without the latex walker, which is recreated
+        # when unpickling.  The environment is pickled separately; it is
+        # restored only once per process even if many fragments refer to it.
+        return (
+            _unpickle_fragment,
+            (
+                self.__class__,
+                self.environment,
+                self.latex_walker.s,
+                self.llm_text,
+                self._attributes(),
+                dumps_nodes(self.nodes, self.environment),
+            )
+        )
+
+    def apply_edit(self, start, end, new_text):
+        r"""
+        Return a new :py:class:`LLMFragment` whose LLM text is this fragment's
+        text with the characters at positions `start:end` replaced by
+        `new_text`.
+
+        For block-level fragments, only the top-level items lying between the
+        nearest block-level nodes (e.g. paragraph breaks or environments)
+        around the edit are parsed again.  The remaining nodes are reused;
+        nodes located after the edit are copied with their positions shifted.
+        Whenever the edited region cannot be reparsed on its own, the full
+        text is parsed again (e.g. if a parse error occurs, this full parse
+        reports it).
+        """
+        old_llm_text = self.llm_text
+        new_llm_text = old_llm_text[:start] + new_text + old_llm_text[end:]
+
+        attributes = self._attributes()
+        if not self.is_parsed():
+            # nothing to reuse
+            return self.environment.make_fragment(new_llm_text, lazy=True,
+                                                  **attributes)
+
+        new_nodes = None
+        if self.latex_walker.s == old_llm_text \
+           and getattr(self.nodes, 'llm_is_block_level', False):
+            try:
+                new_nodes = _IncrementalReparser(
+                    self, start, end, new_llm_text
+                ).reparse()
+            except latexnodes.LatexWalkerParseError:
+                new_nodes = None
+        if new_nodes is None:
+            return self.environment.make_fragment(new_llm_text, **attributes)
+
+        return self.environment.make_fragment(new_nodes, **attributes)
+
+    ### END_LLM_PYTHON_ONLY
+
     def start_node_visitor(self, node_visitor):
         node_visitor.start(self.nodes)
 
@@ -202,6 +396,209 @@ class LLMFragment:
 
 
 
+### BEGIN_LLM_PYTHON_ONLY
+
+def _unpickle_fragment(cls, environment, walker_llm_text, llm_text, attributes,
+                       nodes_data):
+    latex_walker = environment.make_latex_walker(
+        walker_llm_text,
+        standalone_mode=attributes['standalone_mode'],
+        resource_info=attributes['resource_info'],
+        what=attributes['what'],
+    )
+    nodes = loads_nodes(nodes_data, environment, latex_walker)
+    fragment = cls(nodes, environment, **attributes)
+    fragment.llm_text = llm_text
+    return fragment
+
+def _unpickle_lazy_fragment(cls, environment, llm_text, attributes):
+    return cls(llm_text, environment, lazy=True, **attributes)
+
+
+class _IncrementalReparser:
+    r"""
+    Reparse the part of a block-level fragment that is affected by an edit,
+    see :py:meth:`LLMFragment.apply_edit()`.
+    """
+    def __init__(self, fragment, start, end, new_llm_text):
+        super().__init__()
+        self.fragment = fragment
+        self.start = start
+        self.end = end
+        self.new_llm_text = new_llm_text
+        self.delta = len(new_llm_text) - len(fragment.llm_text)
+
+        self.latex_walker = None
+        self._copied = {}
+
+    def reparse(self):
+        r"""
+        Returns the new top-level node list, or `None` if the full text needs
+        to be parsed again.
+        """
+        fragment = self.fragment
+        nodes = fragment.nodes
+        start, end, delta = self.start, self.end, self.delta
+
+        # Find the block-level nodes (paragraph breaks, environments, ...)
+        # that enclose the edited region.  The tokenizer starts afresh at
+        # their boundaries and they separate paragraphs, so the content
+        # between them can be parsed on its own.
+        anchors = [
+            j
+            for j, n in enumerate(nodes)
+            if n is not None and self._is_anchor(n)
+        ]
+        k_left = -1
+        k_right = len(anchors)
+        for k, j in enumerate(anchors):
+            if nodes[j].pos_end < start:
+                k_left = k
+            elif nodes[j].pos > end:
+                k_right = k
+                break
+
+        # A paragraph break absorbs any whitespace around it.  If only
+        # whitespace separates it from the edited region, the edit can change
+        # its extent, so it has to be parsed again along with the region.
+        old_llm_text = fragment.llm_text
+        while k_left >= 0 and self._is_paragraph_break(nodes[anchors[k_left]]) \
+              and not old_llm_text[nodes[anchors[k_left]].pos_end:start].strip():
+            k_left -= 1
+        while k_right < len(anchors) \
+              and self._is_paragraph_break(nodes[anchors[k_right]]) \
+              and not old_llm_text[end:nodes[anchors[k_right]].pos].strip():
+            k_right += 1
+
+        j_left = anchors[k_left] if k_left >= 0 else -1
+        j_right = anchors[k_right] if k_right < len(anchors) else len(nodes)
+
+        if j_left == -1 and j_right == len(nodes):
+            # the whole fragment would be parsed again anyway
+            return None
+
+        seg_start = nodes[j_left].pos_end if j_left >= 0 else 0
+        seg_end = nodes[j_right].pos + delta if j_right < len(nodes) \
+            else len(self.new_llm_text)
+
+        latex_walker = fragment.environment.make_latex_walker(
+            self.new_llm_text,
+            resource_info=fragment.resource_info,
+            standalone_mode=fragment.standalone_mode,
+            what=fragment.what,
+        )
+        self.latex_walker = latex_walker
+        parsing_state = latex_walker.make_parsing_state(
+            is_block_level=fragment.is_block_level
+        )
+
+        stop_tokens = []
+        if j_right < len(nodes):
+            parser = latexnodes_parsers.LatexGeneralNodesParser(
+                stop_token_condition=lambda t: t.pos >= seg_end,
+                handle_stop_condition_token=(
+                    lambda t, **kwargs: stop_tokens.append(t)
+                ),
+            )
+        else:
+            parser = latexnodes_parsers.LatexGeneralNodesParser()
+
+        seg_nodes, parsing_state_delta = latex_walker.parse_content(
+            parser,
+            token_reader=latex_walker.make_token_reader(pos=seg_start),
+            parsing_state=parsing_state,
+        )
+
+        if parsing_state_delta is not None:
+            return None
+        if j_right < len(nodes):
+            if len(stop_tokens) != 1 or stop_tokens[0].pos != seg_end:
+                return None
+        seg_nodes = [ n for n in seg_nodes if n is not None ]
+        if len(seg_nodes) and (seg_nodes[0].pos < seg_start
+                               or seg_nodes[-1].pos_end > seg_end):
+            return None
+
+        newnodes = list(nodes[:j_left+1]) + seg_nodes + [
+            self._copy_shifted(n)
+            for n in nodes[j_right:]
+        ]
+
+        return latex_walker.make_nodelist(
+            newnodes,
+            parsing_state=parsing_state,
+            pos=0,
+            pos_end=len(self.new_llm_text),
+        )
+
+    def _is_anchor(self, n):
+        return (getattr(n, 'llm_is_block_level', False)
+                and not getattr(n, 'llm_is_block_heading', False))
+
+    def _is_paragraph_break(self, n):
+        return (n.isNodeType(latexnodes_nodes.LatexSpecialsNode)
+                and n.specials_chars == '\n\n')
+
+    _node_types = (
+        latexnodes_nodes.LatexNode,
+        latexnodes_nodes.LatexNodeList,
+        latexnodes.ParsedArguments,
+    )
+
+    # attributes that never refer to nodes
+    _skip_attributes = frozenset([
+        'parsing_state', 'llm_specinfo', 'spec', '_fields', '_redundant_fields',
+        'arguments_spec_list', '_argspec',
+    ])
+
+    def _copy_shifted(self, value):
+        # Copy any nodes in `value` (nodes, node lists, parsed arguments, or
+        # containers thereof), shifting their positions to match the edited
+        # text.  Nodes that appear multiple times (e.g., in `llm_blocks`) are
+        # copied only once.
+        if isinstance(value, self._node_types):
+            key = id(value)
+            if key in self._copied:
+                return self._copied[key]
+            newvalue = value.__class__.__new__(value.__class__)
+            self._copied[key] = newvalue
+            newattrs = dict(value.__dict__)
+            for attrname, attrvalue in newattrs.items():
+                if attrvalue is None or attrname in self._skip_attributes:
+                    continue
+                if attrname == 'pos' or attrname == 'pos_end':
+                    newattrs[attrname] = attrvalue + self.delta
+                elif attrname == 'latex_walker':
+                    newattrs[attrname] = self.latex_walker
+                elif isinstance(attrvalue, self._container_types):
+                    newattrs[attrname] = self._copy_shifted(attrvalue)
+            newvalue.__dict__.update(newattrs)
+            return newvalue
+        if isinstance(value, list):
+            return [ self._copy_shifted(v) for v in value ]
+        if isinstance(value, tuple):
+            return tuple([ self._copy_shifted(v) for v in value ])
+        if isinstance(value, dict):
+            return { k: self._copy_shifted(v) for (k, v) in value.items() }
+        return value
+
+    _container_types = _node_types + (list, tuple, dict)
+
+
+_background_parse_executor = None
+
+def _get_background_parse_executor():
+    global _background_parse_executor
+    if _background_parse_executor is None:
+        # Parsing is CPU-bound, so more threads wouldn't help; the point is to
+        # parse while the main thread is waiting for I/O.
+        _background_parse_executor = \
+            concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    return _background_parse_executor
+
+### END_LLM_PYTHON_ONLY
+
+
 class _NodeListTruncator:
     def __init__(self, chars, min_chars=None, truncation_marker=None):
         super().__init__()
@@ -13,6 +13,12 @@ class LLMRenderContext:
         self.doc = doc
         self.fragment_renderer = fragment_renderer
         self._logical_state = {}
+        ### BEGIN_LLM_PYTHON_ONLY
+        # nesting depth of render_nodelist() calls and nodes rendered ahead of
+        # time by the fragment renderer, see FragmentRenderer.render_nodelist()
+        self._render_nodelist_depth = 0
+        self._prerendered_nodes = None
+        ### END_LLM_PYTHON_ONLY
 
     def supports_feature(self, feature_name):
         return False
@@ -26,6 +32,17 @@ class LLMRenderContext:
     def get_delayed_render_content(self, node):
         raise RuntimeError("This render context does not support delayed rendering")
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def prepare_fragment_render(self, llm_fragment):
+        r"""
+        Called by the fragment renderer before it renders `llm_fragment` in
+        this render context.
+        """
+        pass
+
+    ### END_LLM_PYTHON_ONLY
+
 
     def get_logical_state(self, domainname):
         r"""
@@ -61,6 +61,18 @@ class LLMSpecInfo:
     not this node can be rendered independently of any document object.
     """
 
+    render_context_independent = False
+    r"""
+    Set this flag to `True` if :py:meth:`render()` only depends on the node
+    and on the fragment renderer, and neither on the render context (document
+    features, logical state, delayed content, etc.) nor on any other state.
+    Any node lists rendered by :py:meth:`render()` must be reported by
+    :py:meth:`get_render_content_nodelists()`; their nodes must be independent
+    of the render context, too.  The rendered result of such nodes can be
+    cached by the fragment renderer (see
+    :py:class:`~llm.rendercache.LLMRenderCache`).
+    """
+
 
     def postprocess_parsed_node(self, node):
         r"""
@@ -90,6 +102,37 @@ class LLMSpecInfo:
             f"Element ‘{node}’ cannot be placed here, render() not reimplemented."
         )
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def get_render_content_nodelists(self, node, render_context):
+        r"""
+        Return the list of node lists that :py:meth:`render()` renders, in the
+        order in which it renders them, using the same `render_context` and
+        the fragment renderer's `render_nodelist()`.  Return `None` (the
+        default) if this isn't known or doesn't apply.
+
+        Fragment renderers use this information to render the contents of
+        nested nodes ahead of time with an explicit stack instead of
+        recursing into :py:meth:`render()` for each nesting level (see
+        :py:meth:`FragmentRenderer.render_nodelist()`).  The :py:meth:`render()`
+        method is still called as usual, but the nodes in the given node lists
+        are then already rendered.
+        """
+        return None
+
+    def get_render_content_logical_state(self, node, render_context):
+        r"""
+        If :py:meth:`render()` changes the render context's logical state
+        before rendering the node lists returned by
+        :py:meth:`get_render_content_nodelists()`, return a corresponding
+        context manager here (e.g., from `render_context.push_logical_state()`).
+        The fragment renderer enters it while rendering the contents of those
+        node lists ahead of time.  By default, returns `None`.
+        """
+        return None
+
+    ### END_LLM_PYTHON_ONLY
+
 
     # ---
 
@@ -149,6 +192,8 @@ class LLMSpecInfoConstantValue(LLMSpecInfo):
 
     allowed_in_standalone_mode = True
 
+    render_context_independent = True
+
     def __init__(self, *args, value, **kwargs):
         super().__init__(*args, **kwargs)
         self.value = value
@@ -189,6 +234,8 @@ class TextFormatMacro(LLMMacroSpecBase):
 
     allowed_in_standalone_mode = True
 
+    render_context_independent = True
+
     # internal, used when truncating fragments to a certain number of characters
     # (see fragment.truncate_to())
     _llm_main_text_argument = 'text'
@@ -212,6 +259,16 @@ class TextFormatMacro(LLMMacroSpecBase):
             render_context,
         )
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def get_render_content_nodelists(self, node, render_context):
+        node_args = ParsedArgumentsInfo(node=node).get_all_arguments_info(
+            ('text',) ,
+        )
+        return [ node_args['text'].get_content_nodelist() ]
+
+    ### END_LLM_PYTHON_ONLY
+
 
 class LLMSpecInfoParagraphBreak(LLMSpecInfo):
 
@@ -323,6 +380,8 @@ class HrefHyperlinkMacro(LLMMacroSpecBase):
 
     allowed_in_standalone_mode = True
 
+    render_context_independent = True
+
     def __init__(
             self,
             macroname,
@@ -406,11 +465,24 @@ class HrefHyperlinkMacro(LLMMacroSpecBase):
             render_context,
         )
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def get_render_content_nodelists(self, node, render_context):
+        display_text_nodelist = node.llm_href_info['display_text_nodelist']
+        if display_text_nodelist is None:
+            # render() displays the URL
+            return []
+        return [ display_text_nodelist ]
+
+    ### END_LLM_PYTHON_ONLY
+
 
 class VerbatimSpecInfo(LLMSpecInfo):
 
     allowed_in_standalone_mode = True
 
+    render_context_independent = True
+
     r"""
     Wraps an argument, or an environment body, as verbatim content.
 
@@ -453,7 +525,7 @@ class VerbatimSpecInfo(LLMSpecInfo):
         else:
             verbatim_contents = node.latex_verbatim()
         
-        annotations = self.annotations or []
+        annotations = list(self.annotations or [])
         if environment_node_name is not None:
             annotations.append(environment_node_name)
 
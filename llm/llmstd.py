@@ -218,6 +218,7 @@ def standard_features(
         endnotes=True,
         citations=True,
         external_citations_provider=None,
+        citation_cache=None,
         footnote_counter_formatter=None,
         citation_counter_formatter=None,
         use_simple_path_graphics_resource_provider=True,
@@ -266,6 +267,7 @@ def standard_features(
                 external_citations_provider=external_citations_provider,
                 counter_formatter=citation_counter_formatter,
                 citation_delimiters=('[', ']'),
+                citation_cache=citation_cache,
             )
         )
     if use_simple_path_graphics_resource_provider:
@@ -288,6 +290,32 @@ def standard_features(
 
 
 
+### BEGIN_LLM_PYTHON_ONLY
+
+# Frozen latex contexts built by LLMStandardEnvironment, indexed by the
+# features' latex_context_definitions_key().  The spec objects in a frozen
+# latex context are never modified, so the context can be shared between
+# environments.
+_frozen_standard_latex_contexts = {}
+_frozen_standard_latex_contexts_max_size = 64
+
+def _get_standard_latex_context_key(features):
+    key = []
+    for f in features:
+        fkey = f.latex_context_definitions_key()
+        if fkey is None:
+            return None
+        key.append( (f.__class__, f.feature_name, fkey) )
+    key = tuple(key)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+### END_LLM_PYTHON_ONLY
+
+
 class LLMStandardEnvironment(LLMEnvironment):
     def __init__(self,
                  latex_context=None,
@@ -296,24 +324,41 @@ class LLMStandardEnvironment(LLMEnvironment):
                  *,
                  enable_comments=None,
                  external_citations_provider=None,
+                 citation_cache=None,
                  external_ref_resolver=None,
                  footnote_counter_formatter=None,
                  citation_counter_formatter=None,
                  **kwargs):
 
-        if latex_context is None:
-            latex_context = standard_latex_context_db()
-        if parsing_state is None:
-            parsing_state = standard_parsing_state(
-                enable_comments=enable_comments,
-            )
         if features is None:
             features = standard_features(
                 external_citations_provider=external_citations_provider,
+                citation_cache=citation_cache,
                 external_ref_resolver=external_ref_resolver,
                 footnote_counter_formatter=footnote_counter_formatter,
                 citation_counter_formatter=citation_counter_formatter,
             )
+        standard_latex_context_is_used = False
+        latex_context_key = None
+        if latex_context is None:
+            ### BEGIN_LLM_PYTHON_ONLY
+            # reuse the frozen latex context of an earlier environment with the
+            # same features, if possible
+            latex_context_key = _get_standard_latex_context_key(features)
+            if latex_context_key is not None:
+                latex_context = _frozen_standard_latex_contexts.get(latex_context_key)
+            ### END_LLM_PYTHON_ONLY
+            if latex_context is None:
+                latex_context = standard_latex_context_db()
+            standard_latex_context_is_used = True
+        if parsing_state is None:
+            parsing_state = standard_parsing_state(
+                enable_comments=enable_comments,
+            )
+
+        # we can describe this environment by its configuration, for pickling,
+        # if we built the latex context ourselves.
+        self._config_pickleable = standard_latex_context_is_used
 
         super().__init__(
             latex_context=latex_context,
@@ -322,9 +367,41 @@ class LLMStandardEnvironment(LLMEnvironment):
             **kwargs
         )
 
+        ### BEGIN_LLM_PYTHON_ONLY
+        if latex_context_key is not None \
+           and latex_context_key not in _frozen_standard_latex_contexts:
+            if len(_frozen_standard_latex_contexts) >= \
+               _frozen_standard_latex_contexts_max_size:
+                _frozen_standard_latex_contexts.clear()
+            _frozen_standard_latex_contexts[latex_context_key] = self.latex_context
+        ### END_LLM_PYTHON_ONLY
+
 
     parsing_state_event_handler = LLMLatexWalkerParsingStateEventHandler()
 
+    ### BEGIN_LLM_PYTHON_ONLY
+
+    def get_pickle_state(self):
+        if (not self._config_pickleable
+            or type(self).__init__ is not LLMStandardEnvironment.__init__):
+            return super().get_pickle_state()
+
+        parsing_state_fields = self.parsing_state.get_fields()
+        parsing_state_fields['latex_context'] = None
+        parsing_state_fields.pop('s', None)
+        return (
+            'config',
+            dict(
+                parsing_state=self.parsing_state.__class__(**parsing_state_fields),
+                features=self.features,
+                tolerant_parsing=self.tolerant_parsing,
+                parse_cache=self.parse_cache,
+                fast_token_reader=self.fast_token_reader,
+            )
+        )
+
+    ### END_LLM_PYTHON_ONLY
+
     def get_parse_error_message(self, exception_object):
         msg = None
         error_type_info = exception_object.error_type_info
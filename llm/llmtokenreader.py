@@ -0,0 +1,476 @@
+import re
+import weakref
+
+import logging
+logger = logging.getLogger(__name__)
+
+from pylatexenc import latexnodes
+from pylatexenc.latexnodes import LatexWalkerEndOfStream
+
+
+# Python's `\s` matches exactly the characters for which `str.isspace()` is
+# true, which is what pylatexenc's LatexTokenReader uses to skip whitespace.
+_rx_space = re.compile(r'\s*')
+
+
+# Parsing state fields that determine how tokens are read.  (Fields like
+# `in_math_mode` are only relevant to code paths that we defer to the base
+# class.)
+_token_parsing_state_fields = (
+    'latex_group_delimiters',
+    'latex_inline_math_delimiters',
+    'latex_display_math_delimiters',
+    'enable_double_newline_paragraphs',
+    'enable_macros',
+    'enable_environments',
+    'enable_comments',
+    'enable_groups',
+    'enable_specials',
+    'enable_math',
+    'macro_alpha_chars',
+    'macro_escape_char',
+    'comment_start',
+    'forbidden_characters',
+)
+
+def _hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple([ _hashable(v) for v in value ])
+    return value
+
+
+class _TokenInfo:
+    r"""
+    Information about a parsing state that the fast token reader needs to
+    quickly decide how to read the next token, including the master regular
+    expression for that parsing state.
+
+    Instances are shared between all parsing states that have the same token
+    reading configuration, see :py:func:`_get_token_info()`.
+    """
+    def __init__(self, parsing_state, specials_table):
+        super().__init__()
+
+        # Any character in this set requires a closer look before we can
+        # return a simple 'char' token.  It's fine if this set contains too
+        # many characters.
+        special_chars = set(parsing_state.forbidden_characters)
+        special_chars.add(parsing_state.macro_escape_char)
+        if parsing_state.enable_math:
+            special_chars.update(parsing_state._math_delims_info_startchars)
+        if parsing_state.enable_comments and parsing_state.comment_start:
+            special_chars.add(parsing_state.comment_start[0])
+        if parsing_state.enable_groups:
+            special_chars.update(parsing_state._latex_group_delimchars_by_open)
+            special_chars.update(parsing_state._latex_group_delimchars_close)
+
+        self.specials_table = specials_table
+        if parsing_state.latex_context is not None and parsing_state.enable_specials:
+            if specials_table is None:
+                # unfrozen context -- any character might be a specials
+                special_chars = None
+            else:
+                special_chars.update(specials_table.keys())
+
+        self.special_chars = special_chars
+
+        escape_char = parsing_state.macro_escape_char
+
+        # We can directly read macros (without going through the generic
+        # code path) unless the escape character might start a math
+        # delimiter.  The escape character is the start of the math delimiters
+        # `\(` and `\[`, but these cannot be followed by a letter, so we can
+        # still directly read macros with an alphabetical name.
+        self.read_alpha_macros = bool(parsing_state.enable_macros)
+        self.read_symbol_macros = bool(parsing_state.enable_macros)
+        if parsing_state.enable_math and escape_char in parsing_state._math_delims_info_startchars:
+            self.read_symbol_macros = False
+            for delim, _ in parsing_state._math_all_delims_by_len:
+                if delim.startswith(escape_char) \
+                   and (len(delim) == 1 or delim[1] in parsing_state.macro_alpha_chars):
+                    self.read_alpha_macros = False
+
+        self.read_environments = bool(parsing_state.enable_environments)
+
+        self.enable_double_newline_paragraphs = \
+            parsing_state.enable_double_newline_paragraphs
+
+        # Characters that the base class checks for before checking for groups
+        # and specials.  Groups and specials starting with one of these
+        # characters are left to the generic code path.
+        precedence_chars = set([ escape_char ])
+        if parsing_state.enable_math:
+            precedence_chars.update(parsing_state._math_delims_info_startchars)
+        if parsing_state.enable_comments and parsing_state.comment_start:
+            precedence_chars.add(parsing_state.comment_start[0])
+
+        rx_groups = []
+        if parsing_state.enable_groups:
+            rx_groups = [
+                (group_name, [
+                    c for c in delimchars
+                    if c not in precedence_chars
+                ])
+                for group_name, delimchars in (
+                        ('brace_open', parsing_state._latex_group_delimchars_by_open),
+                        ('brace_close', parsing_state._latex_group_delimchars_close),
+                )
+            ]
+
+        self.specs_by_specials_chars = {}
+        if specials_table is not None and parsing_state.enable_specials:
+            group_chars = set(precedence_chars)
+            if parsing_state.enable_groups:
+                group_chars.update(parsing_state._latex_group_delimchars_by_open)
+                group_chars.update(parsing_state._latex_group_delimchars_close)
+            for c, entries in specials_table.items():
+                if c in group_chars:
+                    continue
+                # entries are sorted such that the first matching alternative
+                # in the regular expression is the correct one
+                for specials_chars, spec in entries:
+                    self.specs_by_specials_chars[specials_chars] = spec
+        rx_specials = [
+            re.escape(specials_chars)
+            for specials_chars in self.specs_by_specials_chars
+        ]
+
+        # The master regular expression.  It reads the whitespace preceding
+        # the token and then either a plain character, or a macro with its name
+        # and the whitespace that follows it, or the escape character followed
+        # by a non-letter character, or a group delimiter, or a specials.  If
+        # none of these groups match, we need to look at the next character
+        # more closely.
+        if special_chars is not None:
+            rx_char = _make_charclass(special_chars, negate=True)
+        else:
+            rx_char = '(?!)'
+        rx_alpha = _make_charclass(parsing_state.macro_alpha_chars)
+        self.rx_master = re.compile(
+            r'(?P<space>\s*)'
+            r'(?:'
+            r'(?P<char>' + rx_char + r')'
+            r'|' + re.escape(escape_char) + r'(?:'
+            r'(?P<macro>' + rx_alpha + r'+)(?P<post_space>\s*)'
+            r'|(?P<symbol>(?!' + rx_alpha + r').)'
+            r')'
+            + "".join([
+                r'|(?P<' + group_name + r'>' + _make_charclass(delimchars) + r')'
+                for group_name, delimchars in rx_groups
+            ])
+            + r'|(?P<specials>' + ('|'.join(rx_specials) or '(?!)') + r')'
+            r')?',
+            flags=re.DOTALL,
+        )
+
+        # _TokenInfo instances for sub-contexts, see _get_token_info()
+        self.derived_infos = {}
+
+
+def _make_charclass(chars, negate=False):
+    if not chars:
+        return '(?!)' if not negate else '.'
+    return '[' + ('^' if negate else '') + "".join([
+        ('\\' + c if c in '\\]^-[' else c)
+        for c in sorted(chars)
+    ]) + ']'
+
+
+# Caches are cleared when they grow beyond this size.  (They'd only grow that
+# large if many different latex contexts with different specials are used.)
+_max_cache_size = 256
+
+_token_infos_by_parsing_state = weakref.WeakKeyDictionary()
+_token_infos = {}
+
+def _get_token_info(parsing_state):
+    r"""
+    Return the :py:class:`_TokenInfo` instance for the given parsing state.
+    The same instance is returned for all parsing states that have the same
+    token reading configuration.  (New parsing states and latex contexts are
+    created all the time during parsing, e.g., for each macro argument and
+    each math mode section, and we don't want to recompute the information for
+    each of them.)
+    """
+    try:
+        return _token_infos_by_parsing_state[parsing_state]
+    except KeyError:
+        pass
+
+    info = None
+    parent, diff_fields = parsing_state._parent_parsing_state_info
+    if parent is not None and 'latex_context' not in diff_fields:
+        parent_info = _get_token_info(parent)
+        if parent_info is not None:
+            diff_key = tuple([
+                (f, _hashable(diff_fields[f]))
+                for f in _token_parsing_state_fields
+                if f in diff_fields
+            ])
+            try:
+                info = parent_info.derived_infos[diff_key]
+            except KeyError:
+                info = _get_token_info_by_fields(parsing_state)
+                parent_info.derived_infos[diff_key] = info
+    if info is None:
+        info = _get_token_info_by_fields(parsing_state)
+
+    _token_infos_by_parsing_state[parsing_state] = info
+    return info
+
+def _get_token_info_by_fields(parsing_state):
+    specials_table = None
+    if parsing_state.latex_context is not None:
+        specials_table = get_specials_prefix_table(parsing_state.latex_context)
+        if specials_table is None:
+            # unfrozen latex context, don't cache anything
+            return _TokenInfo(parsing_state, None)
+    key = tuple([
+        _hashable(getattr(parsing_state, f))
+        for f in _token_parsing_state_fields
+    ]) + (id(specials_table),) # the info object keeps specials_table alive
+    try:
+        return _token_infos[key]
+    except KeyError:
+        pass
+    info = _TokenInfo(parsing_state, specials_table)
+    if len(_token_infos) >= _max_cache_size:
+        _token_infos.clear()
+    _token_infos[key] = info
+    return info
+
+
+
+_specials_prefix_tables = weakref.WeakKeyDictionary()
+_specials_prefix_tables_by_entries = {}
+
+def get_specials_prefix_table(latex_context):
+    r"""
+    Return a dictionary that maps the first character of each specials defined
+    in the given latex context to a list of tuples `(specials_chars,
+    specials_spec)`.  The lists are sorted such that the first matching entry
+    is the one that :py:meth:`LatexContextDb.test_for_specials()` would
+    return.
+
+    The tables are cached, but only for frozen latex contexts.  If the latex
+    context is not frozen, `None` is returned.  Latex contexts that define the
+    same specials (e.g., contexts derived with `extended_with()` for math
+    mode) share the same table object.
+    """
+    if not latex_context.frozen:
+        return None
+    try:
+        return _specials_prefix_tables[latex_context]
+    except KeyError:
+        pass
+
+    # test_for_specials() returns the longest match; among matches of the same
+    # length, the one in the first category is returned.
+    entries = []
+    seen = set()
+    for cat in latex_context.category_list:
+        for specials_chars, spec in latex_context.d[cat]['specials'].items():
+            if not specials_chars or specials_chars in seen:
+                continue
+            seen.add(specials_chars)
+            entries.append( (specials_chars, spec) )
+
+    entries_key = tuple([ (specials_chars, id(spec)) for specials_chars, spec in entries ])
+    try:
+        table, _ = _specials_prefix_tables_by_entries[entries_key]
+    except KeyError:
+        table = {}
+        for specials_chars, spec in entries:
+            table.setdefault(specials_chars[0], []).append( (specials_chars, spec) )
+        for c in table:
+            # sort() is stable, so the category order is kept for equal lengths
+            table[c].sort(key=lambda e: -len(e[0]))
+        if len(_specials_prefix_tables_by_entries) >= _max_cache_size:
+            _specials_prefix_tables_by_entries.clear()
+        # keep references to the specs so that their ids remain valid
+        _specials_prefix_tables_by_entries[entries_key] = (table, entries)
+
+    _specials_prefix_tables[latex_context] = table
+    return table
+
+
+
+class LLMFastTokenReader(latexnodes.LatexTokenReader):
+    r"""
+    A token reader that produces exactly the same tokens as pylatexenc's
+    `LatexTokenReader`, but which is faster on typical LLM content.
+
+    Each token is read with a single match of a master regular expression
+    that is compiled once for each token reading configuration of the parsing
+    state.  The master regular expression reads the whitespace preceding the
+    token and recognizes plain characters that cannot start any special
+    construct, macros (including their name and the whitespace that follows
+    them), group delimiters and specials.  The specials alternatives are built
+    from a table indexed by their first character (see
+    :py:func:`get_specials_prefix_table()`) instead of testing every known
+    specials in turn.  Less common cases (math delimiters, environment names,
+    comments, paragraph breaks, error handling) are deferred to the base
+    class' code, which guarantees that they are handled in exactly the same
+    way.
+
+    Enable this token reader with `LLMEnvironment(..., fast_token_reader=True)`.
+    """
+
+    def __init__(self, s, **kwargs):
+        super().__init__(s, **kwargs)
+        self._token_infos = {}
+
+    def _get_token_info(self, parsing_state):
+        ps_id = id(parsing_state)
+        try:
+            # store the parsing state object itself, too, to keep its id valid
+            ps, info = self._token_infos[ps_id]
+            if ps is parsing_state:
+                return info
+        except KeyError:
+            pass
+        info = _get_token_info(parsing_state)
+        self._token_infos[ps_id] = (parsing_state, info)
+        return info
+
+    def impl_peek_space_chars(self, s, pos, parsing_state):
+        pos_end = _rx_space.match(s, pos).end()
+        return (s[pos:pos_end], pos, pos_end)
+
+    def impl_peek_token(self, parsing_state):
+
+        s = self.s
+
+        info = self._get_token_info(parsing_state)
+
+        m = info.rx_master.match(s, self._pos)
+
+        pre_space = m.group('space')
+
+        if info.enable_double_newline_paragraphs and pre_space.count('\n') >= 2:
+            # new paragraph token -- let the base class handle that
+            return super().impl_peek_token(parsing_state)
+
+        pos = m.end('space')
+
+        if m.group('char') is not None:
+            # fast path for a simple char
+            return self.make_token(tok='char', arg=m.group('char'),
+                                   pos=pos, pos_end=pos+1,
+                                   pre_space=pre_space)
+
+        macro = m.group('macro')
+        if macro is not None:
+            if info.read_alpha_macros:
+                if info.read_environments and (macro == 'begin' or macro == 'end'):
+                    return self.impl_read_environment(s=s, pos=pos,
+                                                      parsing_state=parsing_state,
+                                                      beginend=macro,
+                                                      pre_space=pre_space)
+                post_space = m.group('post_space')
+                post_space_pos_end = m.end('post_space')
+                # but make sure we put back whitespace that breaks into a new
+                # paragraph:
+                if post_space.count('\n') >= 2:
+                    # only keep whitespace up to the first newline character
+                    newline_rel_pos = post_space.find('\n')
+                    post_space_pos_end = m.start('post_space') + newline_rel_pos
+                    post_space = post_space[:newline_rel_pos]
+                return self.make_token(tok='macro', arg=macro,
+                                       pos=pos, pos_end=post_space_pos_end,
+                                       pre_space=pre_space, post_space=post_space)
+
+        elif m.group('symbol') is not None:
+            if info.read_symbol_macros:
+                return self.make_token(tok='macro', arg=m.group('symbol'),
+                                       pos=pos, pos_end=pos+2,
+                                       pre_space=pre_space, post_space='')
+
+        elif m.group('specials') is not None:
+            specials_chars = m.group('specials')
+            return self.make_token(tok='specials',
+                                   arg=info.specs_by_specials_chars[specials_chars],
+                                   pos=pos, pos_end=pos+len(specials_chars),
+                                   pre_space=pre_space)
+
+        else:
+            tok = m.lastgroup
+            if tok == 'brace_open' or tok == 'brace_close':
+                return self.make_token(tok=tok, arg=m.group(tok), pos=pos, pos_end=pos+1,
+                                       pre_space=pre_space)
+
+        return self._read_token_generic(s, pos, parsing_state, info, pre_space)
+
+
+    def _read_token_generic(self, s, pos, parsing_state, info, pre_space):
+
+        len_s = len(s)
+
+        if pos >= len_s:
+            raise LatexWalkerEndOfStream(final_space=pre_space)
+
+        c = s[pos]
+
+        # Same logic as in the base class implementation -->
+
+        if c in parsing_state._math_delims_info_startchars and parsing_state.enable_math:
+            t = self.impl_maybe_read_math_mode_delimiter(s, pos, parsing_state, pre_space)
+            if t is not None:
+                return t
+
+        if c == parsing_state.macro_escape_char:
+
+            if parsing_state.enable_environments:
+                if s.startswith('begin', pos+1):
+                    beginend = 'begin'
+                elif s.startswith('end', pos+1):
+                    beginend = 'end'
+                else:
+                    beginend = None
+                if beginend:
+                    pastbeginendpos = pos+1+len(beginend)
+                    if pastbeginendpos >= len_s \
+                       or s[pastbeginendpos] not in parsing_state.macro_alpha_chars:
+                        return self.impl_read_environment(s=s, pos=pos,
+                                                          parsing_state=parsing_state,
+                                                          beginend=beginend,
+                                                          pre_space=pre_space)
+
+            if parsing_state.enable_macros:
+                return self.impl_read_macro(s=s, pos=pos,
+                                            parsing_state=parsing_state,
+                                            pre_space=pre_space)
+
+        if parsing_state.enable_comments \
+           and c == parsing_state.comment_start[0] \
+           and s.startswith(parsing_state.comment_start, pos):
+            return self.impl_read_comment(s=s, pos=pos,
+                                          parsing_state=parsing_state,
+                                          pre_space=pre_space)
+
+        if parsing_state.enable_groups:
+            if c in parsing_state._latex_group_delimchars_by_open:
+                return self.make_token(tok='brace_open', arg=c, pos=pos, pos_end=pos+1,
+                                       pre_space=pre_space)
+            if c in parsing_state._latex_group_delimchars_close:
+                return self.make_token(tok='brace_close', arg=c, pos=pos, pos_end=pos+1,
+                                       pre_space=pre_space)
+
+        if parsing_state.latex_context is not None and parsing_state.enable_specials:
+            specials_table = info.specials_table
+            sspec = None
+            if specials_table is None:
+                sspec = parsing_state.latex_context.test_for_specials(
+                    s, pos, parsing_state=parsing_state
+                )
+            else:
+                for specials_chars, spec in specials_table.get(c, ()):
+                    if s.startswith(specials_chars, pos):
+                        sspec = spec
+                        break
+            if sspec is not None:
+                return self.make_token(tok='specials', arg=sspec,
+                                       pos=pos, pos_end=pos+len(sspec.specials_chars),
+                                       pre_space=pre_space)
+
+        return self.impl_char_token(c, pos, pos+1, parsing_state, pre_space)
@@ -30,6 +30,8 @@ class MathEnvironment(LLMEnvironmentSpecBase):
 
     allowed_in_standalone_mode = True
 
+    render_context_independent = True
+
     def __init__(self, environmentname):
         super().__init__(environmentname=environmentname)
 
@@ -0,0 +1,491 @@
+import os
+import os.path
+import io
+import hashlib
+import pickle
+import tempfile
+import threading
+import weakref
+import zlib
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------------------------------------------------------
+
+
+def _describe_value(value, depth=0):
+    r"""
+    Return a string description of `value` that is stable across process runs
+    (no memory addresses).  Only simple values are described in full; other
+    objects are described by their type.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return repr(value)
+    if depth > 3:
+        return '...'
+    if isinstance(value, (list, tuple)):
+        return '[' + ",".join([ _describe_value(v, depth+1) for v in value ]) + ']'
+    if isinstance(value, dict):
+        return '{' + ",".join([
+            _describe_value(k, depth+1) + ':' + _describe_value(v, depth+1)
+            for k, v in sorted(value.items(), key=lambda kv: repr(kv[0]))
+        ]) + '}'
+    if callable(value) and hasattr(value, '__qualname__'):
+        return f"<{getattr(value, '__module__', '?')}.{value.__qualname__}>"
+    return f"<{type(value).__module__}.{type(value).__qualname__}>"
+
+
+def _describe_spec(spec):
+    spec_type = type(spec)
+    desc = f"{spec_type.__module__}.{spec_type.__qualname__}("
+    attrs = []
+    for attrname, attrvalue in sorted(vars(spec).items()):
+        if attrname == 'arguments_spec_list' and attrvalue:
+            attrvalue = [
+                (getattr(a, 'argname', None), type(getattr(a, 'parser', a)).__qualname__)
+                for a in attrvalue
+            ]
+        attrs.append(attrname + '=' + _describe_value(attrvalue))
+    return desc + ",".join(attrs) + ")"
+
+
+def describe_environment(environment):
+    r"""
+    Return a string that describes the parsing-relevant configuration of the
+    given :py:class:`~llm.llmenvironment.LLMEnvironment` instance: the
+    definitions contained in its frozen latex context and the settings of its
+    parsing state.
+
+    Two environments with the same description parse LLM text in the same
+    way.  The description does not depend on object identities, so it is also
+    stable across different process runs.
+    """
+
+    from . import __version__ as llm_version
+
+    latex_context = environment.parsing_state.latex_context
+
+    parts = [ f"llm={llm_version}" ]
+
+    for category in latex_context.category_list:
+        category_dicts = latex_context.d[category]
+        for which in ('macros', 'environments', 'specials'):
+            for name, spec in category_dicts[which].items():
+                parts.append(f"{category}/{which}/{name!r}:{_describe_spec(spec)}")
+
+    for which in ('unknown_macro_spec', 'unknown_environment_spec',
+                  'unknown_specials_spec'):
+        spec = getattr(latex_context, which, None)
+        if spec is not None:
+            parts.append(f"{which}:{_describe_spec(spec)}")
+
+    parsing_state = environment.parsing_state
+    for field in parsing_state._fields:
+        if field in ('s', 'latex_context'):
+            continue
+        parts.append(f"parsing_state.{field}={_describe_value(getattr(parsing_state, field))}")
+
+    parts.append(f"tolerant_parsing={environment.tolerant_parsing!r}")
+    parts.append(f"environment={_describe_value(type(environment))}")
+    parts.append(
+        f"parsing_state_event_handler="
+        f"{_describe_value(environment.parsing_state_event_handler)}"
+    )
+
+    return "\n".join(parts)
+
+
+
+# ------------------------------------------------------------------------------
+
+
+class LLMParseCache:
+    r"""
+    A bounded, in-memory LRU cache of parsed LLM content.
+
+    Set an instance of this class as the `parse_cache` of an
+    :py:class:`~llm.llmenvironment.LLMEnvironment` (e.g.
+    ``LLMStandardEnvironment(parse_cache=LLMParseCache())``) to avoid parsing
+    the same LLM text over and over again.  Entries are keyed on the LLM text,
+    the `is_block_level`, `standalone_mode`, `resource_info` and `what`
+    arguments, and on the environment instance.  (The latex walker and the
+    nodes refer to the environment, so parsed content is never shared between
+    different environments, even if they are equivalent.  A single cache
+    instance can nevertheless be shared between several environments.)
+
+    The latex walker and node list stored in the cache are shared between all
+    fragments that were created from the same LLM text in the same
+    environment.  These node lists must therefore be considered read-only.
+    This is the same situation as when the same fragment is rendered several
+    times, possibly in different documents.
+
+    The argument `max_size` is the maximum number of parsed fragments that are
+    kept in memory.  The least recently used entries are discarded first.
+
+    Only content that is given as a string and whose `resource_info` and
+    `what` are hashable is cached.  Content that fails to parse is never cached.
+    """
+
+    def __init__(self, max_size=4096):
+        super().__init__()
+        self.max_size = max_size
+        self._entries = {}
+        # the cache can be used by lazy fragments parsed in a background thread
+        self._lock = threading.Lock()
+        self._environment_fingerprints = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def __reduce__(self):
+        # Pickle the cache configuration only, not the cached entries
+        return (self.__class__, (self.max_size,))
+
+    def environment_fingerprint(self, environment):
+        r"""
+        Return a fingerprint of the given environment's parsing configuration.
+        The fingerprint is computed once per environment instance.
+        """
+        try:
+            return self._environment_fingerprints[environment]
+        except KeyError:
+            pass
+        fingerprint = describe_environment(environment)
+        self._environment_fingerprints[environment] = fingerprint
+        return fingerprint
+
+    def make_key(self, llm_text, environment, *, is_block_level, standalone_mode,
+                 resource_info, what):
+        r"""
+        Return the key to use for the given parse request, or `None` if the
+        request cannot be cached.
+        """
+        if not isinstance(llm_text, str):
+            return None
+        try:
+            hash( (resource_info, what) )
+        except TypeError:
+            return None
+        return (
+            llm_text,
+            is_block_level,
+            bool(standalone_mode),
+            resource_info,
+            what,
+            environment,
+            self.environment_fingerprint(environment),
+        )
+
+    def get_parsed(self, llm_text, environment, *, is_block_level, standalone_mode,
+                   resource_info, what=None):
+        r"""
+        Return a tuple `(latex_walker, nodes)` if the given content was found in
+        the cache, or `None`.
+        """
+        key = self.make_key(llm_text, environment, is_block_level=is_block_level,
+                            standalone_mode=standalone_mode,
+                            resource_info=resource_info, what=what)
+        if key is None:
+            return None
+        with self._lock:
+            value = self._entries.pop(key, None)
+        if value is None:
+            value = self.load_parsed(llm_text, environment,
+                                     is_block_level=is_block_level,
+                                     standalone_mode=standalone_mode,
+                                     resource_info=resource_info,
+                                     what=what)
+            if value is None:
+                self.misses += 1
+                return None
+        with self._lock:
+            # (re-)insert the item to mark it as most recently used
+            self._entries[key] = value
+            self._evict()
+        self.hits += 1
+        return value
+
+    def load_parsed(self, llm_text, environment, *, is_block_level, standalone_mode,
+                    resource_info, what):
+        r"""
+        Called when the requested content is not found in memory.  Subclasses
+        can reimplement this method to look for the content in another store.
+        Return a tuple `(latex_walker, nodes)` or `None`.
+        """
+        return None
+
+    def store_parsed(self, llm_text, environment, *, is_block_level, standalone_mode,
+                     resource_info, latex_walker, nodes, what=None):
+        r"""
+        Store the result of parsing the given content in the cache.
+        """
+        key = self.make_key(llm_text, environment, is_block_level=is_block_level,
+                            standalone_mode=standalone_mode,
+                            resource_info=resource_info, what=what)
+        if key is None:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (latex_walker, nodes)
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            # dictionaries remember insertion order; the first key is the least
+            # recently used one
+            del self._entries[next(iter(self._entries))]
+
+    def clear(self):
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+
+# ------------------------------------------------------------------------------
+
+
+_persistent_ids_by_environment = weakref.WeakKeyDictionary()
+
+def _get_environment_persistent_ids(environment):
+    try:
+        return _persistent_ids_by_environment[environment]
+    except KeyError:
+        pass
+
+    latex_context = environment.parsing_state.latex_context
+
+    persistent_ids = {}
+    objects = {}
+
+    def _add(obj, pid):
+        if id(obj) in persistent_ids:
+            return
+        persistent_ids[id(obj)] = pid
+        objects[pid] = obj
+
+    _add(environment.parsing_state, ('parsing_state',))
+    _add(latex_context, ('latex_context',))
+    for category in latex_context.category_list:
+        category_dicts = latex_context.d[category]
+        _add(category_dicts, ('category', category))
+        for which in ('macros', 'environments', 'specials'):
+            _add(category_dicts[which], ('category', category, which))
+            for name, spec in category_dicts[which].items():
+                _add(spec, ('spec', category, which, name))
+    for which in ('unknown_macro_spec', 'unknown_environment_spec',
+                  'unknown_specials_spec'):
+        spec = getattr(latex_context, which, None)
+        if spec is not None:
+            _add(spec, ('spec', which))
+
+    result = (persistent_ids, objects)
+    _persistent_ids_by_environment[environment] = result
+    return result
+
+
+class _NodesPickler(pickle.Pickler):
+    def __init__(self, file, environment, latex_walker):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.environment = environment
+        self.latex_walker = latex_walker
+        self.persistent_ids, _ = _get_environment_persistent_ids(environment)
+
+    def persistent_id(self, obj):
+        if obj is self.latex_walker:
+            return ('latex_walker',)
+        if obj is self.environment:
+            return ('environment',)
+        return self.persistent_ids.get(id(obj), None)
+
+
+class _NodesUnpickler(pickle.Unpickler):
+    def __init__(self, file, environment, latex_walker):
+        super().__init__(file)
+        self.environment = environment
+        self.latex_walker = latex_walker
+        _, self.objects = _get_environment_persistent_ids(environment)
+
+    def persistent_load(self, pid):
+        if pid == ('latex_walker',):
+            return self.latex_walker
+        if pid == ('environment',):
+            return self.environment
+        try:
+            return self.objects[pid]
+        except KeyError:
+            raise pickle.UnpicklingError(f"Unknown persistent object id: {pid!r}")
+
+
+def dumps_nodes(nodes, environment):
+    r"""
+    Serialize the given parsed node list into a compact byte string.
+
+    The latex walker, the environment, and the definitions of the
+    environment's latex context are stored by reference only.  The node list
+    can be restored with :py:func:`loads_nodes()` using an equivalent
+    environment (one that has the same :py:func:`describe_environment()`),
+    possibly in a different process.
+    """
+    f = io.BytesIO()
+    _NodesPickler(f, environment, nodes.latex_walker).dump(nodes)
+    return zlib.compress(f.getvalue(), 1)
+
+
+def loads_nodes(data, environment, latex_walker):
+    r"""
+    Restore a node list that was serialized with :py:func:`dumps_nodes()`.  The
+    restored nodes refer to the given `latex_walker`.
+    """
+    f = io.BytesIO(zlib.decompress(data))
+    return _NodesUnpickler(f, environment, latex_walker).load()
+
+
+def _stable_repr(value):
+    # Return a repr() of value if it is guaranteed to be stable across process
+    # runs, or None
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return repr(value)
+    if isinstance(value, tuple):
+        items = [ _stable_repr(v) for v in value ]
+        if None in items:
+            return None
+        return '(' + ",".join(items) + ')'
+    return None
+
+
+
+class LLMDiskParseCache(LLMParseCache):
+    r"""
+    A parse cache that additionally stores parsed LLM content on disk, in the
+    folder `cache_dir`, so that it can be reused across process runs.
+
+    Entries are stored in files whose name is a hash of the LLM text, of the
+    `is_block_level`, `standalone_mode` and `resource_info` arguments, and of
+    the environment's fingerprint (see :py:func:`describe_environment()`).  If
+    the definitions of the latex context or of the features change, the
+    fingerprint changes and the outdated entries are simply no longer used.
+    (You can delete the cache folder at any time to reclaim disk space.)
+
+    Content is only stored on disk if its `resource_info` is `None`, a string,
+    a number, or a tuple of these, since other objects have no stable
+    representation across process runs.  Parsed nodes that cannot be
+    serialized (e.g., because a custom node attribute refers to an object that
+    cannot be pickled) are only kept in memory.
+
+    Recently used entries are also kept in memory, as in
+    :py:class:`LLMParseCache`.
+    """
+
+    format_version = 1
+
+    def __init__(self, cache_dir, max_size=4096):
+        super().__init__(max_size=max_size)
+        self.cache_dir = cache_dir
+        self._environment_fingerprint_hashes = weakref.WeakKeyDictionary()
+
+    def __reduce__(self):
+        return (self.__class__, (self.cache_dir, self.max_size))
+
+    def environment_fingerprint_hash(self, environment):
+        try:
+            return self._environment_fingerprint_hashes[environment]
+        except KeyError:
+            pass
+        fingerprint_hash = hashlib.sha256(
+            self.environment_fingerprint(environment).encode('utf-8')
+        ).hexdigest()
+        self._environment_fingerprint_hashes[environment] = fingerprint_hash
+        return fingerprint_hash
+
+    def get_file_name(self, llm_text, environment, *, is_block_level, standalone_mode,
+                      resource_info):
+        r"""
+        Return the full path of the file in which the given content is stored,
+        or `None` if the content cannot be stored on disk.
+        """
+        resource_info_repr = _stable_repr(resource_info)
+        if resource_info_repr is None:
+            return None
+        h = hashlib.sha256()
+        for part in (
+                str(self.format_version),
+                self.environment_fingerprint_hash(environment),
+                repr(is_block_level),
+                repr(bool(standalone_mode)),
+                resource_info_repr,
+                llm_text,
+        ):
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        hexdigest = h.hexdigest()
+        return os.path.join(self.cache_dir, hexdigest[:2], hexdigest[2:] + '.llmparse')
+
+    def load_parsed(self, llm_text, environment, *, is_block_level, standalone_mode,
+                    resource_info, what):
+
+        fname = self.get_file_name(llm_text, environment,
+                                   is_block_level=is_block_level,
+                                   standalone_mode=standalone_mode,
+                                   resource_info=resource_info)
+        if fname is None:
+            return None
+
+        try:
+            with open(fname, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        latex_walker = environment.make_latex_walker(
+            llm_text,
+            resource_info=resource_info,
+            standalone_mode=standalone_mode,
+            what=what,
+        )
+        try:
+            nodes = loads_nodes(data, environment, latex_walker)
+        except Exception as e:
+            logger.debug(f"Ignoring invalid parse cache file {fname}: {e}")
+            return None
+
+        return (latex_walker, nodes)
+
+    def store_parsed(self, llm_text, environment, *, is_block_level, standalone_mode,
+                     resource_info, latex_walker, nodes, what=None):
+
+        super().store_parsed(llm_text, environment,
+                             is_block_level=is_block_level,
+                             standalone_mode=standalone_mode,
+                             resource_info=resource_info,
+                             latex_walker=latex_walker,
+                             nodes=nodes,
+                             what=what)
+
+        if not isinstance(llm_text, str):
+            return
+        fname = self.get_file_name(llm_text, environment,
+                                   is_block_level=is_block_level,
+                                   standalone_mode=standalone_mode,
+                                   resource_info=resource_info)
+        if fname is None:
+            return
+
+        try:
+            data = dumps_nodes(nodes, environment)
+        except Exception as e:
+            logger.debug(f"Cannot store parsed nodes in disk cache: {e}")
+            return
+
+        dirname = os.path.dirname(fname)
+        try:
+            os.makedirs(dirname, exist_ok=True)
+            # write to a temporary file first, so that concurrent processes
+            # never see a partially written file
+            with tempfile.NamedTemporaryFile(dir=dirname, delete=False) as f:
+                f.write(data)
+            os.replace(f.name, fname)
+        except OSError as e:
+            logger.warning(f"Cannot write parse cache file {fname}: {e}")
@@ -0,0 +1,232 @@
+import os
+import threading
+import sqlite3
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .llmfragment import LLMFragment
+from .feature.refs import RefInstance
+
+
+# ------------------------------------------------------------------------------
+
+
+class LLMSQLiteRefIndex:
+    r"""
+    A persistent index of reference targets across a collection of documents,
+    stored in the SQLite database file `db_path`.  An instance can be used as
+    the `external_ref_resolver` of the `refs` feature (e.g.
+    ``LLMStandardEnvironment(external_ref_resolver=LLMSQLiteRefIndex(path))``),
+    so that ``\ref{...}`` commands can refer to labels defined in other
+    documents of the collection.
+
+    The index is populated with the labels that are registered while a
+    document is rendered, with :py:meth:`update_document_from_render_context()`.
+    This includes the labels registered via
+    :py:meth:`llm.feature.refs.FeatureRefsRenderManager.register_reference()`
+    by floats, defined terms, and any other feature.  Each document's labels
+    are stored under a document ID, and are replaced as a whole each time the
+    document is updated.  Lookups by `(ref_type, ref_target)` use the table's
+    primary key index.
+
+    The database is used in WAL mode, so any number of readers, e.g., the
+    worker processes of :py:func:`llm.render_many()`, can query the index
+    while it is being updated.  Each thread and each process uses its own
+    connection.  Only the path of the database and the `timeout` are pickled.
+
+    The database's tables are created when the index is constructed, unless
+    `create_tables=False` is specified, in which case they must already exist.
+    An unpickled index never writes to the database on its own.
+    """
+
+    def __init__(self, db_path, *, timeout=30.0, create_tables=True):
+        super().__init__()
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+        if create_tables:
+            self._create_tables()
+
+    def __reduce__(self):
+        # the tables were already created by the pickled instance
+        return (_unpickle_ref_index, (self.__class__, self.db_path, self.timeout))
+
+    def _get_connection(self):
+        # one connection per thread and per process (connections must not be
+        # shared with a forked child process)
+        local = self._local
+        pid = os.getpid()
+        if getattr(local, 'connection', None) is None or local.pid != pid:
+            connection = sqlite3.connect(self.db_path, timeout=self.timeout)
+            local.connection = connection
+            local.pid = pid
+        return local.connection
+
+    def _create_tables(self):
+        connection = self._get_connection()
+        connection.execute('PRAGMA journal_mode=WAL')
+        with connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS llm_refs ('
+                ' ref_type TEXT NOT NULL,'
+                ' ref_target TEXT NOT NULL,'
+                ' formatted_ref_llm_text TEXT NOT NULL,'
+                ' target_href TEXT,'
+                ' document_id TEXT NOT NULL,'
+                ' PRIMARY KEY (ref_type, ref_target)'
+                ') WITHOUT ROWID'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS llm_refs_document_id '
+                'ON llm_refs (document_id)'
+            )
+
+    def close(self):
+        r"""
+        Close the current thread's connection to the database.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    # --- external_ref_resolver interface ---
+
+    def get_ref(self, ref_type, ref_target, *, resource_info=None):
+        r"""
+        Return the :py:class:`~llm.feature.refs.RefInstance` for the given
+        target, or `None` if it is not in the index.
+        """
+        row = self._get_connection().execute(
+            'SELECT formatted_ref_llm_text, target_href FROM llm_refs '
+            'WHERE ref_type = ? AND ref_target = ?',
+            (_ref_type_to_db(ref_type), ref_target)
+        ).fetchone()
+        if row is None:
+            return None
+        return RefInstance(
+            ref_type=ref_type,
+            ref_target=ref_target,
+            formatted_ref_llm_text=row[0],
+            target_href=row[1],
+        )
+
+    def get_refs(self, ref_type_and_targets, *, resource_infos=None):
+        r"""
+        Look up several targets at once (see
+        :py:meth:`llm.feature.refs.FeatureRefsRenderManager.prefetch_external_refs()`).
+        Returns a dictionary mapping the `(ref_type, ref_target)` tuples that
+        were found to their :py:class:`~llm.feature.refs.RefInstance`.
+        """
+        connection = self._get_connection()
+        refs = {}
+        for ref_type, ref_target in ref_type_and_targets:
+            row = connection.execute(
+                'SELECT formatted_ref_llm_text, target_href FROM llm_refs '
+                'WHERE ref_type = ? AND ref_target = ?',
+                (_ref_type_to_db(ref_type), ref_target)
+            ).fetchone()
+            if row is not None:
+                refs[(ref_type, ref_target)] = RefInstance(
+                    ref_type=ref_type,
+                    ref_target=ref_target,
+                    formatted_ref_llm_text=row[0],
+                    target_href=row[1],
+                )
+        return refs
+
+    # --- populating the index ---
+
+    def update_document(self, document_id, ref_instances):
+        r"""
+        Replace all the labels of the document `document_id` by the given
+        :py:class:`~llm.feature.refs.RefInstance` objects, in a single
+        transaction.  A target that is already defined by another document is
+        reassigned to this document (a warning is logged).
+        """
+        rows = []
+        for ref_instance in ref_instances:
+            formatted_ref_llm_text = ref_instance.formatted_ref_llm_text
+            if isinstance(formatted_ref_llm_text, LLMFragment):
+                formatted_ref_llm_text = formatted_ref_llm_text.llm_text
+            rows.append((
+                _ref_type_to_db(ref_instance.ref_type),
+                ref_instance.ref_target,
+                formatted_ref_llm_text,
+                ref_instance.target_href,
+                document_id,
+            ))
+
+        connection = self._get_connection()
+        with connection:
+            connection.execute('DELETE FROM llm_refs WHERE document_id = ?',
+                               (document_id,))
+            for row in rows:
+                other = connection.execute(
+                    'SELECT document_id FROM llm_refs '
+                    'WHERE ref_type = ? AND ref_target = ?',
+                    row[:2]
+                ).fetchone()
+                if other is not None:
+                    logger.warning(
+                        f"Reference target ‘{row[0]}:{row[1]}’ of document "
+                        f"‘{document_id}’ was already defined in document ‘{other[0]}’"
+                    )
+            connection.executemany(
+                'INSERT OR REPLACE INTO llm_refs '
+                '(ref_type, ref_target, formatted_ref_llm_text, target_href, document_id) '
+                'VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+
+    def update_document_from_render_context(self, document_id, render_context, *,
+                                            document_href):
+        r"""
+        Replace all the labels of the document `document_id` by the labels
+        that were registered while rendering it in `render_context` (the
+        render context returned by :py:meth:`llm.llmdocument.LLMDocument.render()`).
+
+        The targets of these labels are relative to the document, e.g.
+        ``#figure-1``.  Their `target_href` is stored prefixed by
+        `document_href`, the URL of the rendered document.
+        """
+        refs_mgr = render_context.feature_render_manager('refs')
+        ref_instances = []
+        for ref_instance in refs_mgr.ref_labels.values():
+            target_href = ref_instance.target_href
+            if target_href is not None and target_href.startswith('#'):
+                target_href = document_href + target_href
+            ref_instances.append(RefInstance(
+                ref_type=ref_instance.ref_type,
+                ref_target=ref_instance.ref_target,
+                formatted_ref_llm_text=ref_instance.formatted_ref_llm_text,
+                target_href=target_href,
+            ))
+        self.update_document(document_id, ref_instances)
+
+    def remove_document(self, document_id):
+        r"""
+        Remove all the labels of the document `document_id` from the index.
+        """
+        connection = self._get_connection()
+        with connection:
+            connection.execute('DELETE FROM llm_refs WHERE document_id = ?',
+                               (document_id,))
+
+    def __len__(self):
+        return self._get_connection().execute(
+            'SELECT COUNT(*) FROM llm_refs'
+        ).fetchone()[0]
+
+
+def _unpickle_ref_index(cls, db_path, timeout):
+    return cls(db_path, timeout=timeout, create_tables=False)
+
+
+def _ref_type_to_db(ref_type):
+    # ref_type is None for \ref{target} without any prefix; NULL values can't
+    # be looked up by the primary key
+    if ref_type is None:
+        return ''
+    return ref_type
@@ -0,0 +1,146 @@
+import threading
+import weakref
+
+import logging
+logger = logging.getLogger(__name__)
+
+from .parsecache import _describe_value
+
+
+# ------------------------------------------------------------------------------
+
+
+def describe_fragment_renderer(fragment_renderer):
+    r"""
+    Return a string that describes the configuration of the given fragment
+    renderer: its class and its instance attributes.  Two fragment renderers
+    with the same description render the same nodes in the same way.
+    """
+    renderer_type = type(fragment_renderer)
+    attrs = []
+    for attrname, attrvalue in sorted(vars(fragment_renderer).items()):
+        if attrname == 'render_cache':
+            continue
+        attrs.append(attrname + '=' + _describe_value(attrvalue))
+    return (
+        f"{renderer_type.__module__}.{renderer_type.__qualname__}("
+        + ",".join(attrs) + ")"
+    )
+
+
+class LLMRenderCache:
+    r"""
+    A bounded, in-memory LRU cache of rendered nodes.
+
+    Set an instance of this class as the `render_cache` attribute of a
+    :py:class:`~llm.fragmentrenderer.FragmentRenderer` to avoid rendering the
+    same nodes over and over again, e.g., when the same fragments are
+    rendered again in several documents or in different page templates.
+    A single cache instance can be shared between several fragment
+    renderers.
+
+    Only nodes whose rendering does not depend on the render context are
+    cached, i.e., nodes whose specinfo sets
+    :py:attr:`~llm.llmspecinfo.LLMSpecInfo.render_context_independent` and
+    whose contents are themselves independent of the render context (see
+    :py:meth:`FragmentRenderer.render_node()`), as well as paragraphs
+    consisting only of such nodes.  Entries are keyed on the identity of the
+    node object, on the fragment renderer's configuration (see
+    :py:func:`describe_fragment_renderer()`) and on whether we are rendering
+    in standalone mode.  The cache keeps a reference to the nodes it holds
+    results for.  Nodes are shared between fragments that were created from
+    the same text if the environment has a
+    :py:class:`~llm.parsecache.LLMParseCache`.
+
+    The argument `max_size` is the maximum number of rendered nodes kept in
+    memory, and `max_total_length` is the maximum total length of the cached
+    rendered values.  The least recently used entries are discarded first.
+    """
+
+    def __init__(self, max_size=4096, max_total_length=16*1024*1024):
+        super().__init__()
+        self.max_size = max_size
+        self.max_total_length = max_total_length
+        self._entries = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+        self._renderer_fingerprints = weakref.WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def __reduce__(self):
+        # Pickle the cache configuration only, not the cached entries
+        return (self.__class__, (self.max_size, self.max_total_length))
+
+    def fragment_renderer_fingerprint(self, fragment_renderer):
+        r"""
+        Return a fingerprint of the given fragment renderer's configuration.
+        The fingerprint is computed once per fragment renderer instance.
+        """
+        try:
+            return self._renderer_fingerprints[fragment_renderer]
+        except KeyError:
+            pass
+        fingerprint = describe_fragment_renderer(fragment_renderer)
+        self._renderer_fingerprints[fragment_renderer] = fingerprint
+        return fingerprint
+
+    def make_key(self, node, fragment_renderer, render_context):
+        r"""
+        Return the key under which the rendered value of `node` (a node, or a
+        node list that forms a paragraph) is stored.
+        """
+        return (
+            id(node),
+            self.fragment_renderer_fingerprint(fragment_renderer),
+            render_context.is_standalone_mode,
+        )
+
+    def get_rendered(self, node, fragment_renderer, render_context):
+        r"""
+        Return the cached rendered value of `node`, or `None`.
+        """
+        key = self.make_key(node, fragment_renderer, render_context)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            # re-insert the item to mark it as most recently used
+            self._entries[key] = entry
+            self.hits += 1
+        return entry[1]
+
+    def store_rendered(self, node, fragment_renderer, render_context, value):
+        r"""
+        Store the rendered value of `node` in the cache.
+        """
+        key = self.make_key(node, fragment_renderer, render_context)
+        length = len(value)
+        if length > self.max_total_length:
+            return
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self._total_length -= len(old_entry[1])
+            # keep a reference to the node, so that its id() doesn't get reused
+            # by another object while the entry is in the cache
+            self._entries[key] = (node, value)
+            self._total_length += length
+            self._evict()
+
+    def _evict(self):
+        while (len(self._entries) > self.max_size
+               or self._total_length > self.max_total_length):
+            # dictionaries remember insertion order; the first key is the least
+            # recently used one
+            key = next(iter(self._entries))
+            self._total_length -= len(self._entries.pop(key)[1])
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._total_length = 0
+
+    def __len__(self):
+        return len(self._entries)
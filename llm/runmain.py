@@ -7,6 +7,7 @@ from pylatexenc.latexnodes import LatexWalkerParseError
 
 from . import llmstd
 from . import fmthelpers
+from .parsecache import LLMDiskParseCache
 
 from .fragmentrenderer.text import TextFragmentRenderer
 from .fragmentrenderer.html import HtmlFragmentRenderer
@@ -24,9 +25,11 @@ from .feature.defterm import FeatureDefTerm
 
 LLMMainArguments = namedtuple('LLMMainArguments',
                               ['llm_content', 'files', 'config', 'format',
-                               'suppress_final_newline', 'verbose'],
+                               'suppress_final_newline', 'verbose',
+                               'parse_cache_dir'],
                               defaults=[None, None, None, 'html',
-                                        False, False],
+                                        False, False,
+                                        None],
                               )
 
 parsing_defaults = dict(
@@ -230,9 +233,14 @@ def runmain(args):
     std_parsing_state = llmstd.standard_parsing_state(**config.get('parsing',{}))
     std_features = setup_features(config.get('features',{}))
 
+    parse_cache = None
+    if args.parse_cache_dir:
+        parse_cache = LLMDiskParseCache(args.parse_cache_dir)
+
     environ = llmstd.LLMStandardEnvironment(
         parsing_state=std_parsing_state,
         features=std_features,
+        parse_cache=parse_cache,
     )
 
     # Get the LLM content
@@ -255,12 +263,12 @@ def runmain(args):
         silent=True, # we'll report errors ourselves
     )
     
-    doc = environ.make_document(fragment.render)
+    doc = environ.make_document(fragment.render_chunks)
 
     #
-    # Render the main document
+    # Render the main document, writing it out as it gets rendered
     #
-    result, render_context = doc.render(fragment_renderer)
+    render_context = doc.render_to_stream(sys.stdout, fragment_renderer)
 
     #
     # Render endnotes
@@ -270,12 +278,12 @@ def runmain(args):
         endnotes_result = endnotes_mgr.render_endnotes(
             **config.get('features',{}).get('endnotes',{}).get('render_options',{})
         )
-        result = fragment_renderer.render_join_blocks([
-            result,
+        # the blocks joiner, followed by the endnotes
+        sys.stdout.write(fragment_renderer.render_join_blocks([
+            '',
             endnotes_result,
-        ])
+        ]))
 
-    sys.stdout.write(result)
     if not args.suppress_final_newline:
         sys.stdout.write("\n")
     return
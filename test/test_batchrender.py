@@ -0,0 +1,97 @@
+import unittest
+
+import llm
+from llm.batchrender import render_many, RenderManyTaskError
+from llm.llmstd import LLMStandardEnvironment
+from llm.fragmentrenderer.html import HtmlFragmentRenderer
+
+
+class TestRenderMany(unittest.TestCase):
+
+    def test_ordered(self):
+
+        llm_texts = [ f"Item \\emph{{{j}}}" for j in range(20) ]
+
+        results = list(llm.render_many(llm_texts, 'html', max_workers=2, chunk_size=3))
+
+        self.assertEqual(
+            results,
+            [ f'Item <span class="textit">{j}</span>' for j in range(20) ]
+        )
+
+    def test_unordered_with_options(self):
+
+        llm_texts = [
+            ("Hello", dict(is_block_level=True)),
+            r"\textbf{World}",
+            (r"Footnote\footnote{here}", dict(standalone_mode=False)),
+        ]
+
+        results = dict(render_many(llm_texts, 'text', ordered=False, max_workers=2,
+                                   chunk_size=1))
+
+        self.assertEqual(results[0], 'Hello')
+        self.assertEqual(results[1], 'World')
+        self.assertEqual(results[2], 'Footnotea')
+
+    def test_environment_and_renderer(self):
+
+        environment = LLMStandardEnvironment(enable_comments=True)
+        fragment_renderer = HtmlFragmentRenderer()
+        fragment_renderer.html_blocks_joiner = "\n--\n"
+
+        results = list(render_many(
+            [ "A % comment\n\nB" ],
+            environment=environment,
+            fragment_renderer=fragment_renderer,
+            max_workers=1,
+        ))
+
+        self.assertEqual(results, [ "<p>A </p>\n--\n<p>B</p>" ])
+
+    def test_errors(self):
+
+        llm_texts = [ "OK", r"\invalidmacro", "OK too" ]
+
+        results = list(render_many(llm_texts, 'text', max_workers=1,
+                                   return_exceptions=True))
+        self.assertEqual(results[0], 'OK')
+        self.assertIsInstance(results[1], RenderManyTaskError)
+        self.assertEqual(results[1].index, 1)
+        self.assertEqual(results[2], 'OK too')
+
+        with self.assertRaises(RenderManyTaskError):
+            list(render_many(llm_texts, 'text', max_workers=1))
+
+        # the results preceding the error are yielded, even from the same chunk
+        results = render_many(llm_texts, 'text', max_workers=1, chunk_size=3)
+        self.assertEqual(next(results), 'OK')
+        with self.assertRaises(RenderManyTaskError) as cm:
+            next(results)
+        self.assertEqual(cm.exception.index, 1)
+
+    def test_stop_early(self):
+
+        consumed = []
+        def gen_llm_texts():
+            for j in range(1000):
+                consumed.append(j)
+                yield f"Item {j}"
+
+        for ordered in (True, False):
+            consumed.clear()
+            results = render_many(gen_llm_texts(), 'text', ordered=ordered,
+                                  max_workers=1, chunk_size=1)
+            first = next(results)
+            results.close()
+            if ordered:
+                self.assertEqual(first, 'Item 0')
+            else:
+                index, result = first
+                self.assertEqual(result, f'Item {index}')
+            # the input was not read in advance
+            self.assertLessEqual(len(consumed), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import tempfile
+import pickle
+
+from llm.llmstd import LLMStandardEnvironment
+from llm.citationcache import LLMCitationCache, LLMDiskCitationCache
+from llm.fragmentrenderer.html import HtmlFragmentRenderer
+
+
+class _SingleCitationsProvider:
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def get_citation_full_text_llm(self, cite_prefix, cite_key, **kwargs):
+        self.calls.append( (cite_prefix, cite_key) )
+        return f"\\textit{{{cite_prefix}}} paper {cite_key}"
+
+
+class _BatchCitationsProvider(_SingleCitationsProvider):
+    def get_citations_full_text_llm(self, cite_items, *, resource_infos):
+        self.calls.append( ('batch', list(cite_items)) )
+        assert len(resource_infos) == len(cite_items)
+        return {
+            (cite_prefix, cite_key): f"\\textit{{{cite_prefix}}} paper {cite_key}"
+            for (cite_prefix, cite_key) in cite_items
+        }
+
+
+_llm_text = (
+    r"See \cite{arxiv:1111.2222,arxiv:3333.4444} and "
+    r"\emph{also}\footnote{Cf. \cite[Thm.~2]{doi:10.1000/xyz}.}, "
+    r"and again \cite{arxiv:1111.2222}."
+)
+
+
+def _render(environ):
+    frag = environ.make_fragment(_llm_text)
+
+    def render_fn(render_context):
+        return (
+            frag.render(render_context)
+            + render_context.feature_render_manager('endnotes').render_endnotes()
+        )
+
+    doc = environ.make_document(render_fn)
+    result, _ = doc.render(HtmlFragmentRenderer())
+    return result
+
+
+class TestCitationCache(unittest.TestCase):
+
+    def test_batched_retrieval(self):
+
+        expected_result = _render(
+            LLMStandardEnvironment(external_citations_provider=_SingleCitationsProvider())
+        )
+
+        provider = _BatchCitationsProvider()
+        environ = LLMStandardEnvironment(external_citations_provider=provider)
+        self.assertEqual(_render(environ), expected_result)
+        self.assertEqual(provider.calls, [
+            ('batch', [ ('arxiv', '1111.2222'), ('arxiv', '3333.4444'),
+                        ('doi', '10.1000/xyz') ]),
+        ])
+
+    def test_shared_between_documents(self):
+
+        provider = _SingleCitationsProvider()
+        cache = LLMCitationCache()
+        environ = LLMStandardEnvironment(external_citations_provider=provider,
+                                         citation_cache=cache)
+
+        result = _render(environ)
+        self.assertEqual(len(provider.calls), 3)
+        self.assertEqual(len(cache), 3)
+
+        self.assertEqual(_render(environ), result)
+        self.assertEqual(len(provider.calls), 3)
+        self.assertEqual(cache.hits, 3)
+
+    def test_max_size(self):
+        cache = LLMCitationCache(max_size=2)
+        environ = LLMStandardEnvironment(external_citations_provider=_SingleCitationsProvider(),
+                                         citation_cache=cache)
+        _render(environ)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get_citation_fragment(environ, 'arxiv', '1111.2222'))
+        self.assertIsNotNone(cache.get_citation_fragment(environ, 'doi', '10.1000/xyz'))
+
+    def test_disk_cache(self):
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+
+            provider = _BatchCitationsProvider()
+            environ = LLMStandardEnvironment(
+                external_citations_provider=provider,
+                citation_cache=LLMDiskCitationCache(cache_dir),
+            )
+            result = _render(environ)
+            self.assertEqual(len(provider.calls), 1)
+
+            # e.g., in a later build
+            provider2 = _BatchCitationsProvider()
+            cache2 = pickle.loads(pickle.dumps(LLMDiskCitationCache(cache_dir)))
+            environ2 = LLMStandardEnvironment(
+                external_citations_provider=provider2,
+                citation_cache=cache2,
+            )
+            self.assertEqual(_render(environ2), result)
+            self.assertEqual(provider2.calls, [])
+            self.assertEqual(len(cache2), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
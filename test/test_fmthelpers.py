@@ -59,5 +59,38 @@ class TestStandardCounterFormatters(unittest.TestCase):
 
 
 
+class TestFormatCounter(unittest.TestCase):
+
+    def test_format_counter(self):
+        calls = []
+        def my_counter(n):
+            calls.append(n)
+            return f"({n})"
+        self.assertEqual(fmthelpers.format_counter(my_counter, 3), '(3)')
+        self.assertEqual(fmthelpers.format_counter(my_counter, 3), '(3)')
+        self.assertEqual(fmthelpers.format_counter(my_counter, 4), '(4)')
+        self.assertEqual(calls, [3, 4])
+
+        self.assertEqual(
+            fmthelpers.format_counter(fmthelpers.romancounter, 4),
+            'iv'
+        )
+
+    def test_format_counter_range(self):
+        self.assertEqual(
+            fmthelpers.format_counter_range(fmthelpers.arabiccounter, 1, 4),
+            ['1', '2', '3']
+        )
+        self.assertEqual(
+            fmthelpers.format_counter_range(fmthelpers.Alphacounter, 25, 29),
+            ['Y', 'Z', 'AA', 'BB']
+        )
+        self.assertEqual(
+            fmthelpers.format_counter_range(fmthelpers.romancounter, 1, 1),
+            []
+        )
+
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,6 +1,10 @@
+import sys
 import unittest
 
 from llm.fragmentrenderer import FragmentRenderer
+from llm.fragmentrenderer.html import HtmlFragmentRenderer
+from llm.fragmentrenderer.text import TextFragmentRenderer
+from llm.fragmentrenderer.latex import LatexFragmentRenderer
 
 from llm.llmstd import LLMStandardEnvironment
 from llm.llmfragment import LLMFragment
@@ -296,6 +300,97 @@ Hello |[world]|. There are no paragraphs here, but some nodes are not only chars
 """.strip()
         )
 
+    def test_render_node_dispatch_per_renderer_class(self):
+
+        class _UppercaseCharsRenderer(_MyTestFragmentRenderer):
+            def render_node_chars(self, node, render_context):
+                return super().render_node_chars(node, render_context).upper()
+
+        class _NoMathRenderer(_UppercaseCharsRenderer):
+            def render_node_math(self, node, render_context):
+                return '(math)'
+
+        env = LLMStandardEnvironment()
+        frag = env.make_fragment(r'Hello \textbf{world}, \(1+2=3\).',
+                                 what='example text fragment')
+
+        store = {'calls': []}
+        self.assertEqual(
+            _MyTestFragmentRenderer(store).render_fragment(frag, None),
+            r'Hello [world], \(1+2=3\).'
+        )
+        self.assertEqual(
+            _UppercaseCharsRenderer(store).render_fragment(frag, None),
+            r'HELLO [WORLD], \(1+2=3\).'
+        )
+        self.assertEqual(
+            _NoMathRenderer(store).render_fragment(frag, None),
+            r'HELLO [WORLD], (math).'
+        )
+        self.assertEqual(
+            _UppercaseCharsRenderer(store).render_fragment(frag, None),
+            r'HELLO [WORLD], \(1+2=3\).'
+        )
+
+    def test_render_deeply_nested_content_with_explicit_stack(self):
+
+        env = LLMStandardEnvironment()
+        depth = 30
+        frag = env.make_fragment(
+            (r'\begin{itemize}\item A {b} \textbf{c \emph{d}}' * depth)
+            + r'\textit{{x}}' + (r'\end{itemize}' * depth),
+            what='example text fragment',
+            standalone_mode=True,
+        )
+
+        for fragment_renderer_class in (HtmlFragmentRenderer, TextFragmentRenderer):
+            recursive_fr = fragment_renderer_class()
+            recursive_fr.render_nodelist_max_recursion_depth = 10000
+            expected_result = frag.render_standalone(recursive_fr)
+
+            fr = fragment_renderer_class()
+            fr.render_nodelist_max_recursion_depth = 2
+
+            # the call stack doesn't grow with the nesting depth
+            frame, stack_depth = sys._getframe(), 0
+            while frame is not None:
+                frame, stack_depth = frame.f_back, stack_depth + 1
+            recursion_limit = sys.getrecursionlimit()
+            sys.setrecursionlimit(stack_depth + 150)
+            try:
+                result = frag.render_standalone(fr)
+            finally:
+                sys.setrecursionlimit(recursion_limit)
+
+            self.assertEqual(result, expected_result)
+
+    def test_replace_delayed_markers_with_final_values(self):
+
+        delayed_values = { 1: 'ONE', 2: 'TWO', 12: 'TWELVE' }
+
+        fr = HtmlFragmentRenderer()
+        content = (
+            '<p>See <LLM:DLYD:1/> and <LLM:DLYD:12/>.</p><LLM:DLYD:2/>'
+            '<p>Not a marker: <LLM:DLYD:x/></p>'
+        )
+        self.assertEqual(
+            fr.replace_delayed_markers_with_final_values(content, delayed_values),
+            '<p>See ONE and TWELVE.</p>TWO<p>Not a marker: <LLM:DLYD:x/></p>'
+        )
+        content = '<p>No markers here.</p>'
+        self.assertIs(
+            fr.replace_delayed_markers_with_final_values(content, delayed_values),
+            content
+        )
+
+        fr = LatexFragmentRenderer()
+        self.assertEqual(
+            fr.replace_delayed_markers_with_final_values(
+                r'See \LLMDLYD{2}, \LLMDLYD{1}{}.', delayed_values
+            ),
+            r'See TWO, ONE{}.'
+        )
+
 
 
 if __name__ == '__main__':
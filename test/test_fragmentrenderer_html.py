@@ -0,0 +1,84 @@
+import unittest
+
+from llm.llmstd import LLMStandardEnvironment
+from llm.fragmentrenderer.html import HtmlFragmentRenderer
+
+
+class TestHtmlFragmentRenderer(unittest.TestCase):
+
+    def test_generate_open_tag(self):
+        fr = HtmlFragmentRenderer()
+        for j in range(2): # second time uses the precomputed template
+            self.assertEqual(fr.generate_open_tag('p'), '<p>')
+            self.assertEqual(
+                fr.generate_open_tag('span', class_names=['textbf', 'a<b']),
+                '<span class="textbf a&lt;b">'
+            )
+            self.assertEqual(
+                fr.generate_open_tag('br', self_close_tag=True),
+                '<br/>'
+            )
+        self.assertEqual(
+            fr.generate_open_tag('img', attrs=[('src', 'a"b.png'), ('alt', 'x')],
+                                 class_names=['c'], self_close_tag=True),
+            '<img src="a&quot;b.png" alt="x" class="c"/>'
+        )
+        with self.assertRaises(ValueError):
+            fr.generate_open_tag('span', attrs={'class': 'x'})
+
+    def test_templates_follow_htmlescape(self):
+        class MyHtmlFragmentRenderer(HtmlFragmentRenderer):
+            def htmlescape(self, value):
+                return super().htmlescape(value).upper()
+
+        self.assertEqual(
+            HtmlFragmentRenderer().generate_open_tag('span', class_names=['x']),
+            '<span class="x">'
+        )
+        self.assertEqual(
+            MyHtmlFragmentRenderer().generate_open_tag('span', class_names=['x']),
+            '<span class="X">'
+        )
+
+    def test_htmlescape(self):
+        fr = HtmlFragmentRenderer()
+        self.assertEqual(fr.htmlescape('plain text, é'), 'plain text, é')
+        self.assertEqual(fr.htmlescape('''a<b & "c" 'd'>'''),
+                         'a&lt;b &amp; &quot;c&quot; &#x27;d&#x27;&gt;')
+
+    def test_escaped_chars_cached_on_node(self):
+        environ = LLMStandardEnvironment()
+        frag = environ.make_fragment(r"A < B \emph{& C}", standalone_mode=True)
+
+        self.assertEqual(frag.render_standalone(HtmlFragmentRenderer()),
+                         'A &lt; B <span class="textit">&amp; C</span>')
+
+        chars_node = frag.nodes[0]
+        self.assertEqual(chars_node._llm_html_escaped_chars, 'A &lt; B ')
+
+        # renderers that escape differently don't use the cached value
+        class MyHtmlFragmentRenderer(HtmlFragmentRenderer):
+            def render_value(self, value):
+                return '[' + super().render_value(value) + ']'
+
+        self.assertEqual(
+            frag.render_standalone(MyHtmlFragmentRenderer()),
+            '[A &lt; B ]<span class="textit">[&amp; C]</span>'
+        )
+        self.assertEqual(frag.render_standalone(HtmlFragmentRenderer()),
+                         'A &lt; B <span class="textit">&amp; C</span>')
+
+    def test_wrap_in_tag_and_join(self):
+        fr = HtmlFragmentRenderer()
+        self.assertEqual(
+            fr.wrap_in_tag('dd', fr.render_join(['a', 1, 'b']), attrs={'id': 'x&y'}),
+            '<dd id="x&amp;y">a1b</dd>'
+        )
+        self.assertEqual(
+            fr.render_join( (s for s in ['a', 'b']) ),
+            'ab'
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import random
+
+from pylatexenc.latexencode import UnicodeToLatexEncoder
+
+from llm.llmstd import LLMStandardEnvironment
+from llm.fragmentrenderer.latex import LatexFragmentRenderer
+
+
+class TestLatexFragmentRenderer(unittest.TestCase):
+
+    def test_latexescape_same_as_encoder(self):
+
+        encoder = UnicodeToLatexEncoder(unknown_char_warning=False)
+        fr = LatexFragmentRenderer()
+
+        values = [
+            '',
+            'Plain text, with (some) punctuation: done!',
+            r'50% of $x & y_1 #2 {a} \b ^c ~d "e" <f>',
+            'Crème brûlée à la française, 2 × 3 ± 1, ½ ß',
+            'Ünïcödé ∀ x ∈ ℝ, αβγ — “quotes” …',
+            'é combining accent, tab\tand\nnewline\r',
+            '\x01\x85 control characters',
+        ]
+
+        rng = random.Random(12345)
+        alphabets = [
+            [ chr(o) for o in range(32, 128) ],
+            [ chr(o) for o in range(0, 256) ],
+            [ chr(o) for o in range(0, 0x400) ] + ['–', '∀', '\U0001d400'],
+        ]
+        for j in range(300):
+            alphabet = alphabets[j % len(alphabets)]
+            values.append(
+                "".join([ rng.choice(alphabet) for k in range(rng.randint(1, 30)) ])
+            )
+
+        for value in values:
+            for k in range(2): # second time, value might be cached
+                self.assertEqual(fr.latexescape(value),
+                                 encoder.unicode_to_latex(value))
+
+    def test_latexescape_custom_encoder(self):
+        fr = LatexFragmentRenderer()
+        fr.latex_encoder = UnicodeToLatexEncoder(non_ascii_only=True)
+        self.assertEqual(fr.latexescape('50% é'), r"50% \'e")
+        self.assertEqual(LatexFragmentRenderer().latexescape('50% é'), r"50\% \'e")
+
+    def test_compact_join(self):
+        fr = LatexFragmentRenderer()
+        fr.latex_compact_output = True
+        for content_list, result in [
+                ([ r'\emph{a}', 'b' ], r'\emph{a}b'),
+                ([ 'a ', r'\textbf{b}' ], r'a \textbf{b}'),
+                ([ r'\LaTeX', 'b' ], r'\LaTeX{}b'),
+                ([ r'\LaTeX', ' b' ], r'\LaTeX{} b'),
+                ([ r'\\', 'b' ], r'\\{}b'),
+                ([ r'\&', 'b' ], r'\&{}b'),
+                ([ r'\item', '[x]' ], r'\item{}[x]'),
+                ([ r'\end{x}', '*' ], r'\end{x}{}*'),
+                ([ 'a ', ' b' ], 'a {} b'),
+                ([ 'f', 'i' ], 'f{}i'),
+                ([ '-', '-' ], '-{}-'),
+                ([ 'a', ' b' ], 'a b'),
+                ([ 'a', '{b}' ], 'a{b}'),
+                ([ '', 'a', '', 'b' ], 'a{}b'),
+                ([ r'a\LLMDLYD{1}', 'b' ], r'a\LLMDLYD{1}{}b'),
+                ([ r'50\%', ' off' ], r'50\%{} off'),
+                ([ '% comment', 'b' ], '% comment%\n\\relax{}b'),
+                ([ 'a\n% comment', 'b' ], 'a\n% comment%\n\\relax{}b'),
+                ([ 'a', '% comment' ], 'a{}% comment%\n\\relax{}'),
+                ([ 'a\\', 'b' ], 'a\\%\n\\relax{}b'),
+                ([ '% comment\n', 'b' ], '% comment\nb'),
+        ]:
+            self.assertEqual(fr.render_join(content_list), result)
+
+    def test_compact_join_blocks(self):
+        fr = LatexFragmentRenderer()
+        fr.latex_compact_output = True
+        self.assertEqual(
+            fr.render_join_blocks(["\n\nA\n\n", "\n\nB\n\n", "", "C"]),
+            "\n\nA\n\nB\n\nC"
+        )
+        self.assertEqual(fr.render_join_blocks([]), "")
+
+    def test_compact_output(self):
+        environ = LLMStandardEnvironment()
+        frag = environ.make_fragment(
+            r"Hello \textbf{world}, \emph{ffi}.\begin{itemize}\item One"
+            r"\item Two\end{itemize}",
+        )
+
+        def render(latex_compact_output):
+            fr = LatexFragmentRenderer()
+            fr.latex_compact_output = latex_compact_output
+            return environ.make_document(frag.render).render(fr)[0]
+
+        result = render(True)
+        self.assertEqual(
+            result.strip('\n').split('\n\n')[0],
+            r"Hello \textbf{world}, \textit{ffi}."
+        )
+        self.assertLess(len(result), len(render(False)))
+
+
+if __name__ == '__main__':
+    unittest.main()
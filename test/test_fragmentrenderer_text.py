@@ -0,0 +1,32 @@
+import unittest
+
+from llm.llmstd import LLMStandardEnvironment
+from llm.fragmentrenderer.text import TextFragmentRenderer
+
+
+class TestTextFragmentRenderer(unittest.TestCase):
+
+    def test_enumeration_delayed_tag_width(self):
+        environ = LLMStandardEnvironment()
+        frag = environ.make_fragment(
+            r"\begin{enumerate}\item[\ref{figure:a}] first \item[(b)] second"
+            r"\end{enumerate}"
+            "\n\n"
+            r"\begin{figure}\includegraphics{a.png}\caption{C}\label{figure:a}"
+            r"\end{figure}"
+        )
+
+        class TwoPassTextFragmentRenderer(TextFragmentRenderer):
+            supports_delayed_render_markers = False
+
+        expected_result = (
+            "  Figure\xa01 first\n\n"
+            "       (b) second\n\n"
+        )
+        for fr in (TextFragmentRenderer(), TwoPassTextFragmentRenderer()):
+            result, _ = environ.make_document(frag.render).render(fr)
+            self.assertEqual(result.split('·')[0], expected_result)
+
+
+if __name__ == '__main__':
+    unittest.main()
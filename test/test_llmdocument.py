@@ -1,10 +1,15 @@
 import unittest
+import io
+import asyncio
 
 from llm.llmdocument import LLMDocument
 from llm.fragmentrenderer.text import TextFragmentRenderer
 from llm.fragmentrenderer.html import HtmlFragmentRenderer
+from llm.fragmentrenderer.latex import LatexFragmentRenderer
 from llm.llmstd import LLMStandardEnvironment
 from llm import llmstd
+from llm.feature import refs as feature_refs
+from llm.feature import graphics as feature_graphics
 
 # ------------------
 
@@ -301,6 +306,234 @@ we can also have an equation, like this: \begin{align}
 
 
 
+    def test_delayed_render_text_single_pass(self):
+
+        environ = LLMStandardEnvironment()
+
+        frag = environ.make_fragment(
+            "\\section{About \\ref{figure:my-figure}}\n"
+            "See \\ref{figure:my-figure}.\n"
+            "\\paragraph{On \\ref{figure:my-figure}} Text.\n\n"
+            "\\begin{figure}\n\\includegraphics{fig.png}\n"
+            "\\caption{My figure}\\label{figure:my-figure}\n\\end{figure}"
+        )
+
+        num_calls = []
+        def render_fn(render_context):
+            num_calls.append(True)
+            return frag.render(render_context)
+
+        doc = environ.make_document(render_fn)
+        result, _ = doc.render(TextFragmentRenderer())
+
+        # rendered in a single pass
+        self.assertEqual(len(num_calls), 1)
+
+        self.assertEqual(
+            result,
+            "About Figure\xa01\n"
+            "==============\n\n"
+            "See Figure\xa01.\n\n"
+            "On Figure\xa01:  Text.\n\n"
+            + '·'*80 + "\n"
+            + f"{'[fig.png]':^80}" + "\n\n"
+            "Figure\xa01: My figure\n"
+            + '·'*80
+        )
+
+    def test_render_to_stream(self):
+
+        environ = LLMStandardEnvironment()
+
+        frag = environ.make_fragment(
+            "\\textbf{Hello} \\textit{world}. See \\ref{figure:my-figure}.\n\n"
+            "\\begin{itemize}\\item One\\item Two\\end{itemize}\n\n"
+            + "".join([ f"Paragraph {j}.\\footnote{{Note {j}.}}\n\n" for j in range(20) ])
+            + "\\begin{figure}\n\\includegraphics{fig.png}\n"
+            "\\caption{My figure}\\label{figure:my-figure}\n\\end{figure}"
+        )
+
+        for fr in (HtmlFragmentRenderer(), TextFragmentRenderer()):
+
+            doc = environ.make_document(frag.render)
+            expected_result, _ = doc.render(fr)
+
+            chunks_doc = environ.make_document(frag.render_chunks)
+            # make sure the spooled output goes to a temporary file
+            chunks_doc.spool_max_size = 100
+
+            stream = io.StringIO()
+            render_context = chunks_doc.render_to_stream(stream, fr)
+            self.assertEqual(stream.getvalue(), expected_result)
+
+            self.assertEqual(
+                len(render_context.feature_render_manager('endnotes').endnotes['footnote']),
+                20
+            )
+
+    def test_render_multi(self):
+
+        lookups = []
+
+        class MyRefResolver:
+            def get_ref(self, ref_type, ref_target, **kwargs):
+                lookups.append( (ref_type, ref_target) )
+                return feature_refs.RefInstance(
+                    ref_type=ref_type,
+                    ref_target=ref_target,
+                    formatted_ref_llm_text=r'the \emph{surface} code',
+                    target_href='https://errorcorrectionzoo.org/c/surface',
+                )
+
+        class MyCitationsProvider:
+            def get_citation_full_text_llm(self, cite_prefix, cite_key, **kwargs):
+                lookups.append( (cite_prefix, cite_key) )
+                return f"\\textit{{arXiv}} paper arXiv:{cite_key}"
+
+        environ = LLMStandardEnvironment(
+            external_ref_resolver=MyRefResolver(),
+            external_citations_provider=MyCitationsProvider(),
+        )
+
+        frag = environ.make_fragment(
+            "\\textbf{Hello}.\\footnote{Note.} See \\ref{figure:my-figure} and "
+            "\\ref{code:surface} \\cite{arxiv:1234.56789}.\n\n"
+            "\\begin{figure}\n\\includegraphics{fig.png}\n"
+            "\\caption{My figure}\\label{figure:my-figure}\n\\end{figure}"
+        )
+
+        fragment_renderers = [
+            HtmlFragmentRenderer(),
+            TextFragmentRenderer(),
+            LatexFragmentRenderer(),
+        ]
+
+        expected_results = []
+        for fr in fragment_renderers:
+            doc = environ.make_document(frag.render)
+            result, _ = doc.render(fr)
+            expected_results.append(result)
+
+        del lookups[:]
+
+        doc = environ.make_document(frag.render)
+        results = doc.render_multi(fragment_renderers)
+
+        self.assertEqual([ result for result, _ in results ], expected_results)
+
+        # external lookups were performed only once
+        self.assertEqual(sorted(lookups), [ ('arxiv', '1234.56789'), ('code', 'surface') ])
+
+        # endnotes are shared, and rendered in each format
+        for fr, (result, render_context) in zip(fragment_renderers, results):
+            self.assertIs(render_context.fragment_renderer, fr)
+            endnotes_mgr = render_context.feature_render_manager('endnotes')
+            self.assertIs(endnotes_mgr.render_context, render_context)
+            self.assertEqual(len(endnotes_mgr.endnotes['footnote']), 1)
+            self.assertEqual(len(endnotes_mgr.endnotes['citation']), 1)
+        self.assertEqual(
+            results[0][1].feature_render_manager('endnotes')
+            .render_endnotes(target_id=None),
+            '<div class="endnotes"><dl class="enumeration footnote-list">'
+            '<dt id="footnote-1">a</dt><dd>Note.</dd></dl>\n'
+            '<dl class="enumeration citation-list"><dt id="citation-1">[1]</dt>'
+            '<dd><span class="textit">arXiv</span> paper arXiv:1234.56789</dd>'
+            '</dl></div>'
+        )
+
+    def test_render_async(self):
+
+        lookups = []
+        in_flight = [0, 0] # current, max
+
+        async def lookup(what):
+            lookups.append(what)
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+            await asyncio.sleep(0.01)
+            in_flight[0] -= 1
+
+        def make_ref(ref_type, ref_target):
+            return feature_refs.RefInstance(
+                ref_type=ref_type,
+                ref_target=ref_target,
+                formatted_ref_llm_text=f'the \\emph{{{ref_target}}} code',
+                target_href=f'https://errorcorrectionzoo.org/c/{ref_target}',
+            )
+
+        def make_citation(cite_key):
+            return f"\\textit{{arXiv}} paper arXiv:{cite_key}"
+
+        def make_graphics_resource(graphics_path):
+            return feature_graphics.GraphicsResource(
+                src_url=f'https://example.com/{graphics_path}'
+            )
+
+        class MyRefResolver:
+            def get_ref(self, ref_type, ref_target, **kwargs):
+                lookups.append( ('sync', ref_type, ref_target) )
+                return make_ref(ref_type, ref_target)
+            async def get_ref_async(self, ref_type, ref_target, **kwargs):
+                await lookup( (ref_type, ref_target) )
+                return make_ref(ref_type, ref_target)
+
+        class MyCitationsProvider:
+            def get_citation_full_text_llm(self, cite_prefix, cite_key, **kwargs):
+                lookups.append( ('sync', cite_prefix, cite_key) )
+                return make_citation(cite_key)
+            async def get_citation_full_text_llm_async(self, cite_prefix, cite_key,
+                                                       **kwargs):
+                await lookup( (cite_prefix, cite_key) )
+                return make_citation(cite_key)
+
+        class MyGraphicsResourceProvider:
+            def get_graphics_resource(self, graphics_path, **kwargs):
+                lookups.append( ('sync', graphics_path) )
+                return make_graphics_resource(graphics_path)
+            async def get_graphics_resource_async(self, graphics_path, **kwargs):
+                await lookup( graphics_path )
+                return make_graphics_resource(graphics_path)
+
+        features = llmstd.standard_features(
+            external_ref_resolver=MyRefResolver(),
+            external_citations_provider=MyCitationsProvider(),
+            use_simple_path_graphics_resource_provider=False,
+        ) + [
+            feature_graphics.FeatureExternalGraphicsResourceProvider(
+                MyGraphicsResourceProvider()
+            ),
+        ]
+        environ = LLMStandardEnvironment(features=features)
+
+        frag = environ.make_fragment(
+            "See \\ref{code:surface}, \\ref{code:toric} and \\ref{figure:a}, "
+            "\\cite{arxiv:1111.22222,arxiv:3333.44444}.\n\n"
+            "\\begin{figure}\\includegraphics{a.png}"
+            "\\caption{\\cite{arxiv:1111.22222}}\\label{figure:a}\\end{figure}\n\n"
+            "\\begin{figure}\\includegraphics{b.png}\\end{figure}"
+        )
+
+        doc = environ.make_document(frag.render)
+        expected_result, _ = doc.render(HtmlFragmentRenderer())
+        self.assertIn('https://example.com/b.png', expected_result)
+
+        del lookups[:]
+
+        doc = environ.make_document(frag.render)
+        result, render_context = asyncio.run(doc.render_async(HtmlFragmentRenderer()))
+
+        self.assertEqual(result, expected_result)
+        self.assertIsNone(render_context._async_loop)
+
+        # every lookup was awaited once, and they were awaited concurrently
+        self.assertEqual(
+            sorted(lookups, key=str),
+            sorted([ ('code', 'surface'), ('code', 'toric'),
+                     ('arxiv', '1111.22222'), ('arxiv', '3333.44444'),
+                     'a.png', 'b.png', ], key=str)
+        )
+        self.assertGreaterEqual(in_flight[1], 2)
+
     # ------------------
 
     def test_more_basic_features_html(self):
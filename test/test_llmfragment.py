@@ -1,9 +1,15 @@
 import unittest
+import copy
+import pickle
+import threading
+import concurrent.futures
 
 from llm.llmfragment import LLMFragment
 from llm.llmstd import LLMStandardEnvironment
+from llm.fragmentrenderer.html import HtmlFragmentRenderer
 
 import pylatexenc.latexnodes.nodes as latexnodes_nodes
+import pylatexenc.latexnodes.parsers as latexnodes_parsers
 from pylatexenc.latexnodes import LatexWalkerParseError
 
 
@@ -25,6 +31,45 @@ class TestLLMFragment(unittest.TestCase):
         self.assertTrue(frag.nodes[0].isNodeType(latexnodes_nodes.LatexCharsNode))
         self.assertEqual(frag.nodes[0].chars, s)
 
+    def test_plain_text_fast_path(self):
+
+        env = LLMStandardEnvironment()
+
+        def describe(nodes):
+            return dict(
+                pos=nodes.pos,
+                pos_end=nodes.pos_end,
+                is_block_level=nodes.parsing_state.is_block_level,
+                llm_is_block_level=nodes.llm_is_block_level,
+                llm_blocks=[
+                    [ (n.chars, n.pos, n.pos_end) for n in block ]
+                    for block in getattr(nodes, 'llm_blocks', [])
+                ],
+                nodes=[
+                    (n.__class__, n.chars, n.pos, n.pos_end, n.parsing_state is nodes.parsing_state,
+                     getattr(n, 'llm_chars_value', None))
+                    for n in nodes
+                ],
+            )
+
+        for s in ('Hello, world.', '  Hello,\n  world!  ', '   ', 'Unicode — “quotes” ``and\'\''):
+            self.assertTrue(env.is_plain_text(s))
+            for is_block_level in (None, True, False):
+                with self.subTest(s=s, is_block_level=is_block_level):
+                    frag = env.make_fragment(s, is_block_level=is_block_level)
+                    latex_walker = env.make_latex_walker(s, standalone_mode=False,
+                                                         resource_info=None)
+                    nodes, _ = latex_walker.parse_content(
+                        latexnodes_parsers.LatexGeneralNodesParser(),
+                        parsing_state=latex_walker.make_parsing_state(
+                            is_block_level=is_block_level
+                        ),
+                    )
+                    self.assertEqual(describe(frag.nodes), describe(nodes))
+
+        for s in (r'\emph{x}', 'a~b', 'a{b}', 'a\n \nb', 'a $ b', r'\(x\)', 'a %'):
+            self.assertFalse(env.is_plain_text(s))
+
     def test_failure(self):
 
         env = LLMStandardEnvironment()
@@ -38,6 +83,129 @@ class TestLLMFragment(unittest.TestCase):
                 what='example text fragment'
             )
 
+    def test_lazy(self):
+
+        env = LLMStandardEnvironment()
+
+        frag = env.make_fragment(r'Hello \emph{world}', lazy=True, standalone_mode=True)
+        self.assertFalse(frag.is_parsed())
+        self.assertTrue(frag)
+        self.assertEqual(frag.render_standalone(HtmlFragmentRenderer()),
+                         r'Hello <span class="textit">world</span>')
+        self.assertTrue(frag.is_parsed())
+        self.assertEqual(frag.nodes[1].macroname, 'emph')
+
+        frag = env.make_fragment(r'\UnknownMacroThatRaisesAnError', lazy=True, silent=True)
+        with self.assertRaises(LatexWalkerParseError):
+            frag.get_first_paragraph()
+
+        with self.assertRaises(AttributeError):
+            frag.no_such_attribute
+
+        # lazy fragments are pickled without being parsed
+        frag = env.make_fragment(r'Lazy \textbf{fragment}', lazy=True)
+        frag2 = pickle.loads(pickle.dumps(frag))
+        self.assertFalse(frag.is_parsed())
+        self.assertFalse(frag2.is_parsed())
+        self.assertEqual(frag2.nodes.latex_verbatim(), frag.llm_text)
+
+    def test_lazy_background_parse(self):
+
+        env = LLMStandardEnvironment()
+
+        llm_text = r'Hello \emph{world}, and more text'
+        frag = env.make_fragment(llm_text, lazy=True, background_parse=True)
+        self.assertEqual(frag.truncate_to(chars=10).llm_text,
+                         env.make_fragment(llm_text).truncate_to(chars=10).llm_text)
+
+        frag = env.make_fragment(r'\UnknownMacroThatRaisesAnError', lazy=True,
+                                 background_parse=True, silent=True)
+        with self.assertRaises(LatexWalkerParseError):
+            frag.nodes
+
+    def test_lazy_threads(self):
+
+        env = LLMStandardEnvironment()
+
+        frag = env.make_fragment(r'Hello \emph{world}, and more text', lazy=True)
+        results = []
+        errors = []
+        def reader():
+            try:
+                results.append(frag.nodes)
+            except Exception as e:
+                errors.append(e)
+        threads = [ threading.Thread(target=reader) for j in range(8) ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertTrue(frag.is_parsed())
+        # all threads see the same, single parse result
+        self.assertTrue(all([ nodes is frag.nodes for nodes in results ]))
+        self.assertEqual(len(results), 8)
+
+    def test_apply_edit(self):
+
+        env = LLMStandardEnvironment()
+
+        llm_text = (
+            'First \\emph{paragraph}.\n\n'
+            'Second paragraph.\n\n'
+            '\\begin{itemize}\\item one\\item two\\end{itemize}\n\n'
+            'Last \\textbf{one}.'
+        )
+        frag = env.make_fragment(llm_text, standalone_mode=True)
+
+        def node_positions(nodes):
+            return [
+                (n.__class__.__name__, n.pos, n.pos_end, n.latex_verbatim())
+                for n in nodes
+            ]
+
+        def check_edit(frag, start, end, new_text):
+            new_llm_text = frag.llm_text[:start] + new_text + frag.llm_text[end:]
+            frag2 = frag.apply_edit(start, end, new_text)
+            full = env.make_fragment(new_llm_text, standalone_mode=True)
+            self.assertEqual(frag2.llm_text, new_llm_text)
+            self.assertEqual(node_positions(frag2.nodes), node_positions(full.nodes))
+            self.assertEqual(frag2.render_standalone(HtmlFragmentRenderer()),
+                             full.render_standalone(HtmlFragmentRenderer()))
+
+        for start, end, new_text in [
+                (12, 21, 'edited \\textit{text}'), # first paragraph
+                (32, 32, 'nice '), # second paragraph
+                (32, 32, 'split\n\ninto two '), # new paragraph break
+                (23, 25, ' '), # merge two paragraphs
+                (65, 68, 'three'), # inside the itemize environment
+                (len(llm_text)-2, len(llm_text), 'ONE}!'),
+                (0, len(llm_text), 'Everything replaced'),
+        ]:
+            check_edit(frag, start, end, new_text)
+
+        # whitespace next to a paragraph break becomes part of it
+        for other_llm_text, start, end, new_text in [
+                ('  \n  \n \naa', 8, 8, '\n'),
+                ('First.\n\n a', 9, 9, '\n'),
+                ('\\emph{e}\n\n aa', 11, 11, '\n\n'),
+                ('First.\n\nSecond. \n\nThird.', 15, 15, '\n'),
+        ]:
+            check_edit(env.make_fragment(other_llm_text, standalone_mode=True),
+                       start, end, new_text)
+
+        # paragraphs before the edit are reused, the original fragment is not
+        # modified
+        last_pos = frag.nodes[-1].pos
+        frag2 = frag.apply_edit(32, 32, 'nice ')
+        self.assertIs(frag2.nodes[0], frag.nodes[0])
+        self.assertEqual(frag.nodes[-1].pos, last_pos)
+        self.assertEqual(frag2.nodes[-1].pos, last_pos + 5)
+        self.assertIs(frag2.nodes[-1].latex_walker, frag2.latex_walker)
+
+        with self.assertRaises(LatexWalkerParseError):
+            frag.apply_edit(32, 32, '\\UnknownMacro ')
+
     def test_get_first_paragraph(self):
 
         env = LLMStandardEnvironment()
@@ -130,6 +298,49 @@ with two newline characters.
         self.assertEqual(frag_1.nodes[1].nodeargd.argnlist[0].nodelist[0].chars, 'an ...')
 
 
+    def test_pickle(self):
+
+        env = LLMStandardEnvironment()
+
+        frag = env.make_fragment(
+            r"\textbf{Hello} \(x^2\)\footnote{See \emph{this}.}"
+            "\n\n"
+            r"\begin{enumerate}\item A\item B\end{enumerate}"
+        )
+
+        data = pickle.dumps(frag)
+
+        frag2 = pickle.loads(data)
+        self.assertIsNot(frag2.environment, env)
+        # the environment is rebuilt only once
+        self.assertIs(pickle.loads(data).environment, frag2.environment)
+        self.assertIsNot(copy.deepcopy(frag).environment, env)
+        self.assertIs(frag2.latex_walker.llm_environment, frag2.environment)
+        self.assertEqual(frag2.llm_text, frag.llm_text)
+        self.assertEqual(_render_fragment_html(frag2), _render_fragment_html(frag))
+
+    def test_pickle_multiprocessing(self):
+
+        env = LLMStandardEnvironment()
+
+        frags = [
+            env.make_fragment(r"Fragment \emph{one}", standalone_mode=True),
+            env.make_fragment(r"Fragment \textbf{two}", standalone_mode=True),
+        ]
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(_render_fragment_html, frags))
+
+        self.assertEqual(results, [ _render_fragment_html(f) for f in frags ])
+
+
+def _render_fragment_html(fragment):
+    doc = fragment.environment.make_document(fragment.render)
+    result, _ = doc.render(HtmlFragmentRenderer())
+    return result
+
+
+
 
 
 if __name__ == '__main__':
@@ -1,8 +1,13 @@
 import unittest
+import copy
+import pickle
 
 from pylatexenc.latexnodes import LatexWalkerParseError
 
 from llm.llmstd import LLMStandardEnvironment
+from llm import llmenvironment
+from llm import fmthelpers
+from llm.parsecache import describe_environment
 from llm.fragmentrenderer.html import HtmlFragmentRenderer
 
 from llm.feature.endnotes import FeatureEndnotes, EndnoteCategory
@@ -275,6 +280,74 @@ r'''<div id="my-endnotes" class="endnotes"><dl class="enumeration footnote-list"
 )
 
 
+    def test_shared_latex_context(self):
+
+        env1 = LLMStandardEnvironment()
+        env2 = LLMStandardEnvironment(footnote_counter_formatter='roman')
+        self.assertIs(env2.latex_context, env1.latex_context)
+        self.assertIs(env2.parsing_state.latex_context, env1.latex_context)
+        self.assertIsNot(env2.parsing_state, env1.parsing_state)
+        self.assertEqual(describe_environment(env2), describe_environment(env1))
+
+        # different definitions -- \cite is only defined with a citations
+        # provider
+        env3 = LLMStandardEnvironment(external_citations_provider=object())
+        self.assertIsNot(env3.latex_context, env1.latex_context)
+        self.assertIsNotNone(env3.latex_context.get_macro_spec('cite'))
+        self.assertIs(
+            LLMStandardEnvironment(external_citations_provider=object()).latex_context,
+            env3.latex_context
+        )
+
+        # features that don't describe their definitions are not shared
+        class MyFeature(FeatureEndnotes):
+            def latex_context_definitions_key(self):
+                return None
+        features = [
+            MyFeature(categories=[
+                EndnoteCategory('footnote', 'arabic', 'Notes', endnote_command='fn'),
+            ])
+        ]
+        env4 = LLMStandardEnvironment(features=features)
+        env5 = LLMStandardEnvironment(features=features)
+        self.assertIsNot(env5.latex_context, env4.latex_context)
+
+        frag = env2.make_fragment(r'Hello \emph{world}', standalone_mode=True)
+        self.assertEqual(frag.render_standalone(HtmlFragmentRenderer()),
+                         r'Hello <span class="textit">world</span>')
+
+    def test_make_counter_fragment(self):
+
+        environ = LLMStandardEnvironment()
+
+        frag = environ.make_counter_fragment(fmthelpers.romancounter, 4)
+        self.assertEqual(frag.llm_text, 'iv')
+        self.assertFalse(frag.is_block_level)
+        self.assertIs(environ.make_counter_fragment(fmthelpers.romancounter, 4), frag)
+        self.assertIsNot(
+            environ.make_counter_fragment(fmthelpers.romancounter, 4,
+                                          standalone_mode=True),
+            frag
+        )
+
+        # footnote marks reuse the memoized counter fragments
+        frag1 = environ.make_fragment(r"A\footnote{One} B\footnote{Two}")
+        def render_fn(render_context):
+            return frag1.render(render_context)
+        doc = environ.make_document(render_fn)
+        for j in range(2):
+            _, render_context = doc.render(HtmlFragmentRenderer())
+            endnotes = render_context.feature_render_manager('endnotes').endnotes
+            self.assertEqual(
+                [ en.formatted_counter_value_llm.llm_text
+                  for en in endnotes['footnote'] ],
+                ['a', 'b']
+            )
+            self.assertIs(
+                endnotes['footnote'][1].formatted_counter_value_llm,
+                environ.make_counter_fragment(fmthelpers.alphacounter, 2),
+            )
+
     def test_provides_citations_by_default_if_given_external_citations_provider(self):
 
         class MyCitationsProvider:
@@ -383,6 +456,60 @@ r'''<div id="my-endnotes" class="endnotes"><dl class="enumeration footnote-list"
 
 
 
+    def test_ref_external_batch(self):
+
+        calls = []
+
+        class MyRefResolver:
+            def get_refs(self, ref_type_and_targets, *, resource_infos):
+                calls.append( ('get_refs', list(ref_type_and_targets)) )
+                self.num_resource_infos = len(resource_infos)
+                return {
+                    ('code', 'surface'): feature_refs.RefInstance(
+                        ref_type='code',
+                        ref_target='surface',
+                        formatted_ref_llm_text=r'Kitaev \emph{surface} code',
+                        target_href='https://errorcorrectionzoo.org/c/surface',
+                    ),
+                }
+            def get_ref(self, ref_type, ref_target, **kwargs):
+                calls.append( ('get_ref', (ref_type, ref_target)) )
+                return None
+
+        resolver = MyRefResolver()
+        environ = LLMStandardEnvironment(
+            external_ref_resolver=resolver
+        )
+
+        frag1 = environ.make_fragment(
+            r"""
+See \ref{code:surface}, \ref{figure:fig} and \hyperref[code:surface]{the code}.
+\begin{figure}
+\includegraphics{fig.png}
+\caption{My figure}\label{figure:fig}
+\end{figure}
+""".strip()
+        )
+
+        doc = environ.make_document(frag1.render)
+        result, render_context = doc.render(HtmlFragmentRenderer())
+        self.assertIn(
+            '<a href="https://errorcorrectionzoo.org/c/surface" '
+            'class="href-ref ref-code">Kitaev <span class="textit">surface</span> code</a>',
+            result
+        )
+        # single batch lookup, without the document's own labels
+        self.assertEqual(calls, [ ('get_refs', [('code', 'surface')]) ])
+        self.assertEqual(resolver.num_resource_infos, 1)
+
+        # targets that weren't found aren't looked up again
+        mgr = render_context.feature_render_manager('refs')
+        for j in range(2):
+            with self.assertRaises(ValueError):
+                mgr.get_ref('code', 'missing', resource_info=None)
+        self.assertEqual(calls[1:], [ ('get_ref', ('code', 'missing')) ])
+
+
     def test_inner_math_mode_changes(self):
         
         environ = LLMStandardEnvironment()
@@ -551,6 +678,45 @@ as \{is.\end{verbatim\ ha no, gotcha parser!
         )
 
 
+    def test_pickle(self):
+
+        environ = LLMStandardEnvironment(
+            footnote_counter_formatter='roman',
+            enable_comments=True,
+        )
+
+        data = pickle.dumps(environ)
+
+        # the environment is rebuilt once, then reused for further unpicklings
+        environ2 = pickle.loads(data)
+        self.assertIsNot(environ2, environ)
+        self.assertIs(pickle.loads(data), environ2)
+        self.assertTrue(environ2.parsing_state.latex_context.frozen)
+        self.assertEqual(describe_environment(environ2), describe_environment(environ))
+
+        # simulate unpickling in a fresh process
+        llmenvironment._environments_by_pickle_token.clear()
+        self.assertIsNot(pickle.loads(data), environ2)
+
+    def test_copy(self):
+
+        environ = LLMStandardEnvironment()
+        pickle.dumps(environ) # sets the pickle token
+
+        environ2 = copy.deepcopy(environ)
+        self.assertIsNot(environ2, environ)
+        self.assertIsNot(copy.deepcopy(environ), environ2)
+        self.assertIsNot(environ2.features[0], environ.features[0])
+
+        environ3 = copy.copy(environ)
+        self.assertIsNot(environ3, environ)
+        self.assertIs(environ3.parsing_state, environ.parsing_state)
+
+        frag = environ2.make_fragment(r'Hello \emph{world}', standalone_mode=True)
+        self.assertEqual(frag.render_standalone(HtmlFragmentRenderer()),
+                         r'Hello <span class="textit">world</span>')
+
+
 
 if __name__ == '__main__':
     unittest.main()
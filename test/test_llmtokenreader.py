@@ -0,0 +1,119 @@
+import unittest
+import itertools
+
+from pylatexenc import latexnodes
+from pylatexenc.latexnodes import LatexWalkerEndOfStream, LatexWalkerTokenParseError
+
+from llm.llmstd import LLMStandardEnvironment
+from llm.llmtokenreader import LLMFastTokenReader, get_specials_prefix_table
+from llm.fragmentrenderer.html import HtmlFragmentRenderer
+
+
+def _read_all_tokens(token_reader, parsing_state):
+    tokens = []
+    last_pos_end = None
+    while True:
+        try:
+            tok = token_reader.next_token(parsing_state=parsing_state)
+        except LatexWalkerEndOfStream as e:
+            tokens.append( ('end', getattr(e, 'final_space', None)) )
+            return tokens
+        except LatexWalkerTokenParseError as e:
+            tokens.append( ('error', e.msg, e.pos) )
+            return tokens
+        tokens.append( dict(vars(tok)) )
+        if tok.pos_end == last_pos_end:
+            # recovery tokens in tolerant parsing mode might not advance the
+            # reader; stop here
+            tokens.append( ('stuck', tok.pos_end) )
+            return tokens
+        last_pos_end = tok.pos_end
+
+
+class TestLLMFastTokenReader(unittest.TestCase):
+
+    llm_texts = [
+        r"Hello, world.",
+        "  Leading and trailing \t space\n ",
+        r"\textbf{Bold}~and \emph  {spaced} \textit" "\n\n" r"new paragraph",
+        r"Math \(a+b\) and \[ x^2 \] display, \{braces\} and \% escapes",
+        r"\begin{enumerate}\item[a] one\item two\end{enumerate}\endgame",
+        "Quotes ``like this'' --- or -- this.\n\n\n\nMany newlines\n",
+        r"Forbidden $ dollar",
+        "Trailing escape \\",
+        r"Symbols \\ \{ \, \beginning \endgame \end",
+        r"Bad \begin environment",
+        "Comment % here\n\\% not a comment, \\%}",
+        "Unicode  non-breaking thin space éè",
+    ]
+
+    def test_same_tokens(self):
+
+        env = LLMStandardEnvironment()
+        parsing_states = [
+            env.parsing_state,
+            env.parsing_state.sub_context(in_math_mode=True, math_mode_delimiter=r'\('),
+            env.parsing_state.sub_context(enable_comments=True, forbidden_characters='$',
+                                          enable_environments=False),
+            env.parsing_state.sub_context(enable_macros=False, enable_groups=False,
+                                          enable_math=False, enable_specials=False),
+        ]
+
+        llm_texts = self.llm_texts + [ r"x^{2} \alpha\) and \(" ]
+
+        for llm_text, parsing_state, tolerant_parsing in itertools.product(
+                llm_texts, parsing_states, (False, True)
+        ):
+            with self.subTest(llm_text=llm_text, parsing_state=parsing_state,
+                              tolerant_parsing=tolerant_parsing):
+                self.assertEqual(
+                    _read_all_tokens(
+                        LLMFastTokenReader(llm_text, tolerant_parsing=tolerant_parsing),
+                        parsing_state
+                    ),
+                    _read_all_tokens(
+                        latexnodes.LatexTokenReader(llm_text,
+                                                    tolerant_parsing=tolerant_parsing),
+                        parsing_state
+                    ),
+                )
+
+    def test_same_rendered_output(self):
+
+        env = LLMStandardEnvironment()
+        env_fast = LLMStandardEnvironment(fast_token_reader=True)
+
+        llm_text = (
+            r"\section{Title} Some \emph{text} \(x^2\)\footnote{Note}~here."
+            "\n\n"
+            r"\begin{itemize}\item A\item B\end{itemize}"
+        )
+
+        def render(environment):
+            fragment = environment.make_fragment(llm_text)
+            doc = environment.make_document(fragment.render)
+            result, _ = doc.render(HtmlFragmentRenderer())
+            return result
+
+        self.assertEqual(render(env_fast), render(env))
+
+    def test_specials_prefix_table(self):
+
+        env = LLMStandardEnvironment()
+        latex_context = env.parsing_state.latex_context
+
+        table = get_specials_prefix_table(latex_context)
+        self.assertIs(get_specials_prefix_table(latex_context), table)
+
+        for c, entries in table.items():
+            lengths = [ len(specials_chars) for specials_chars, _ in entries ]
+            self.assertEqual(lengths, sorted(lengths, reverse=True))
+            for specials_chars, spec in entries:
+                self.assertIs(
+                    latex_context.test_for_specials(specials_chars, 0),
+                    spec
+                )
+
+
+if __name__ == '__main__':
+    unittest.main()
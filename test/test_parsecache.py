@@ -0,0 +1,181 @@
+import unittest
+import os
+import tempfile
+
+from pylatexenc.latexnodes import LatexWalkerParseError
+
+from llm.llmstd import LLMStandardEnvironment
+from llm.parsecache import LLMParseCache, LLMDiskParseCache
+from llm.feature.headings import FeatureHeadings
+from llm.fragmentrenderer.html import HtmlFragmentRenderer
+
+
+class TestLLMParseCache(unittest.TestCase):
+
+    def test_reuses_parsed_nodes(self):
+
+        cache = LLMParseCache()
+        env = LLMStandardEnvironment(parse_cache=cache)
+
+        frag1 = env.make_fragment(r'Hello \textbf{world}', standalone_mode=True)
+        frag2 = env.make_fragment(r'Hello \textbf{world}', standalone_mode=True)
+
+        self.assertIs(frag1.nodes, frag2.nodes)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(
+            frag2.render_standalone(HtmlFragmentRenderer()),
+            r'Hello <span class="textbf">world</span>'
+        )
+
+    def test_key_includes_flags(self):
+
+        cache = LLMParseCache()
+        env = LLMStandardEnvironment(parse_cache=cache)
+
+        frag1 = env.make_fragment(r'\emph{Hello}', is_block_level=True)
+        frag2 = env.make_fragment(r'\emph{Hello}', is_block_level=False)
+        frag3 = env.make_fragment(r'\emph{Hello}', is_block_level=False, standalone_mode=True)
+
+        self.assertIsNot(frag1.nodes, frag2.nodes)
+        self.assertIsNot(frag2.nodes, frag3.nodes)
+        self.assertEqual(len(cache), 3)
+
+    def test_shared_between_environments(self):
+
+        cache = LLMParseCache()
+        env1 = LLMStandardEnvironment(parse_cache=cache)
+        env2 = LLMStandardEnvironment(parse_cache=cache)
+        env3 = LLMStandardEnvironment(parse_cache=cache, enable_comments=True)
+
+        self.assertEqual(cache.environment_fingerprint(env1),
+                         cache.environment_fingerprint(env2))
+        self.assertNotEqual(cache.environment_fingerprint(env1),
+                            cache.environment_fingerprint(env3))
+
+        # parsed content refers to its environment, so it is not shared between
+        # environments, even equivalent ones
+        frag1 = env1.make_fragment(r'\emph{Hello}')
+        frag2 = env2.make_fragment(r'\emph{Hello}')
+        frag3 = env3.make_fragment(r'\emph{Hello}')
+        self.assertIsNot(frag1.nodes, frag2.nodes)
+        self.assertIsNot(frag1.nodes, frag3.nodes)
+        self.assertIs(frag2.latex_walker.llm_environment, env2)
+        self.assertIs(env2.make_fragment(r'\emph{Hello}').nodes, frag2.nodes)
+
+    def test_key_includes_what(self):
+
+        cache = LLMParseCache()
+        env = LLMStandardEnvironment(parse_cache=cache)
+
+        frag1 = env.make_fragment(r'\emph{Hello}', what='A')
+        frag2 = env.make_fragment(r'\emph{Hello}', what='B')
+        self.assertIsNot(frag1.nodes, frag2.nodes)
+        self.assertEqual(frag2.latex_walker.what, 'B')
+        self.assertIs(env.make_fragment(r'\emph{Hello}', what='A').nodes, frag1.nodes)
+
+    def test_lru_eviction(self):
+
+        cache = LLMParseCache(max_size=2)
+        env = LLMStandardEnvironment(parse_cache=cache)
+
+        env.make_fragment(r'\emph{A}')
+        env.make_fragment(r'\emph{B}')
+        env.make_fragment(r'\emph{A}')
+        env.make_fragment(r'\emph{C}') # evicts '\emph{B}'
+
+        self.assertEqual(len(cache), 2)
+        cache.hits = 0
+        env.make_fragment(r'\emph{A}')
+        self.assertEqual(cache.hits, 1)
+        env.make_fragment(r'\emph{B}')
+        self.assertEqual(cache.hits, 1)
+
+    def test_plain_text_not_cached(self):
+
+        cache = LLMParseCache()
+        env = LLMStandardEnvironment(parse_cache=cache)
+
+        # plain text is parsed directly without the cache
+        env.make_fragment('Hello')
+        env.make_fragment('Hello')
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.misses, 0)
+
+    def test_errors_not_cached(self):
+
+        cache = LLMParseCache()
+        env = LLMStandardEnvironment(parse_cache=cache)
+
+        for _ in range(2):
+            with self.assertRaises(LatexWalkerParseError):
+                env.make_fragment(r'\UnknownMacroThatRaisesAnError', silent=True)
+
+        self.assertEqual(len(cache), 0)
+
+
+
+class TestLLMDiskParseCache(unittest.TestCase):
+
+    llm_text = (
+        r"\section{Intro}Hello \emph{world}, \(x^2\)\footnote{Note}."
+        "\n\n"
+        r"\begin{enumerate}\item One\item Two\end{enumerate}"
+    )
+
+    def _render(self, env, frag):
+        def render_fn(render_context):
+            return frag.render(render_context)
+        doc = env.make_document(render_fn)
+        result, _ = doc.render(HtmlFragmentRenderer())
+        return result
+
+    def test_reuse_across_instances(self):
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+
+            env1 = LLMStandardEnvironment(parse_cache=LLMDiskParseCache(cache_dir))
+            frag1 = env1.make_fragment(self.llm_text)
+            result1 = self._render(env1, frag1)
+
+            # new cache & environment instances, as in a separate process run
+            cache2 = LLMDiskParseCache(cache_dir)
+            env2 = LLMStandardEnvironment(parse_cache=cache2)
+            frag2 = env2.make_fragment(self.llm_text)
+
+            self.assertEqual(cache2.hits, 1)
+            self.assertIs(frag2.latex_walker.llm_environment, env2)
+            self.assertEqual(frag2.nodes.latex_verbatim(), self.llm_text)
+            self.assertEqual(self._render(env2, frag2), result1)
+
+    def test_invalidated_by_context_change(self):
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+
+            env1 = LLMStandardEnvironment(parse_cache=LLMDiskParseCache(cache_dir))
+            env1.make_fragment(r"\section{Intro}Hello")
+
+            cache2 = LLMDiskParseCache(cache_dir)
+            env2 = LLMStandardEnvironment(
+                features=[ FeatureHeadings() ],
+                parse_cache=cache2,
+            )
+            env2.make_fragment(r"\section{Intro}Hello")
+            self.assertEqual(cache2.hits, 0)
+
+    def test_unstable_resource_info_not_stored(self):
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+
+            cache = LLMDiskParseCache(cache_dir)
+            env = LLMStandardEnvironment(parse_cache=cache)
+            env.make_fragment(r'\emph{Hello}', resource_info=object())
+            env.make_fragment(r'\emph{Hello}', resource_info=('folder', 'a'))
+
+            files = [ f for _, _, fs in os.walk(cache_dir) for f in fs ]
+            self.assertEqual(len(files), 1)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
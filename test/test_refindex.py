@@ -0,0 +1,105 @@
+import unittest
+import os.path
+import tempfile
+import pickle
+import threading
+
+from llm.llmstd import LLMStandardEnvironment
+from llm.refindex import LLMSQLiteRefIndex
+from llm.feature.refs import RefInstance
+from llm.fragmentrenderer.html import HtmlFragmentRenderer
+
+
+class TestLLMSQLiteRefIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'refs.sqlite')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_cross_document_refs(self):
+
+        index = LLMSQLiteRefIndex(self.db_path)
+        environ = LLMStandardEnvironment(external_ref_resolver=index)
+
+        frag_a = environ.make_fragment(
+            "Page A.\n\n"
+            "\\begin{figure}\\includegraphics{a.png}"
+            "\\caption{Cap}\\label{figure:fig-a}\\end{figure}"
+        )
+        doc_a = environ.make_document(frag_a.render)
+        _, render_context = doc_a.render(HtmlFragmentRenderer())
+        index.update_document_from_render_context('a', render_context,
+                                                  document_href='/a.html')
+
+        frag_b = environ.make_fragment(r"See \ref{figure:fig-a}.")
+        doc_b = environ.make_document(frag_b.render)
+        result, _ = doc_b.render(HtmlFragmentRenderer())
+        self.assertEqual(
+            result,
+            'See <a href="/a.html#figure-1" class="href-ref ref-figure">'
+            'Figure\xa01</a>.'
+        )
+
+    def test_update_document(self):
+
+        index = LLMSQLiteRefIndex(self.db_path)
+        index.update_document('a', [
+            RefInstance('code', 'surface', r'the \emph{surface} code', '/c/surface'),
+            RefInstance(None, 'intro', 'Intro', '/a.html#intro'),
+        ])
+        index.update_document('b', [
+            RefInstance('code', 'toric', 'the toric code', '/c/toric'),
+        ])
+        self.assertEqual(len(index), 3)
+
+        ref = index.get_ref('code', 'surface')
+        self.assertEqual(
+            (ref.ref_type, ref.ref_target, ref.formatted_ref_llm_text, ref.target_href),
+            ('code', 'surface', r'the \emph{surface} code', '/c/surface')
+        )
+        self.assertEqual(index.get_ref(None, 'intro').target_href, '/a.html#intro')
+        self.assertIsNone(index.get_ref('code', 'intro'))
+
+        # document 'a' changed
+        index.update_document('a', [
+            RefInstance('code', 'color', 'the color code', '/c/color'),
+        ])
+        self.assertIsNone(index.get_ref('code', 'surface'))
+        refs = index.get_refs([ ('code', 'color'), ('code', 'toric'), ('code', 'surface') ],
+                              resource_infos=[None, None, None])
+        self.assertEqual(sorted(refs), [ ('code', 'color'), ('code', 'toric') ])
+
+        index.remove_document('b')
+        self.assertEqual(len(index), 1)
+
+    def test_readers(self):
+
+        index = LLMSQLiteRefIndex(self.db_path, timeout=5.0)
+        index.update_document('a', [
+            RefInstance('code', 'surface', 'the surface code', '/c/surface'),
+        ])
+
+        # e.g., sent to a worker process
+        index2 = pickle.loads(pickle.dumps(index))
+        self.assertEqual(index2.db_path, self.db_path)
+        self.assertEqual(index2.timeout, 5.0)
+        # the unpickled index doesn't write to the database
+        self.assertIsNone(getattr(index2._local, 'connection', None))
+        self.assertEqual(index2.get_ref('code', 'surface').target_href, '/c/surface')
+
+        results = []
+        def reader():
+            results.append(index.get_ref('code', 'surface').target_href)
+        threads = [ threading.Thread(target=reader) for j in range(4) ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, ['/c/surface'] * 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+
+from llm.llmstd import LLMStandardEnvironment
+from llm.rendercache import LLMRenderCache
+from llm.fragmentrenderer.html import HtmlFragmentRenderer
+from llm.fragmentrenderer.text import TextFragmentRenderer
+
+
+class TestLLMRenderCache(unittest.TestCase):
+
+    def test_reuses_rendered_paragraphs(self):
+
+        env = LLMStandardEnvironment()
+        frag = env.make_fragment(
+            r"Hello \textbf{world}, \href{https://example.com/}{\emph{see} this}."
+            "\n\n"
+            r"Second paragraph with \(x^2\).",
+            standalone_mode=True,
+        )
+
+        expected_result = frag.render_standalone(HtmlFragmentRenderer())
+
+        cache = LLMRenderCache()
+        fr = HtmlFragmentRenderer()
+        fr.render_cache = cache
+
+        self.assertEqual(frag.render_standalone(fr), expected_result)
+        self.assertEqual(cache.hits, 0)
+        num_entries = len(cache)
+        self.assertGreater(num_entries, 0)
+
+        self.assertEqual(frag.render_standalone(fr), expected_result)
+        # both paragraphs are found in the cache
+        self.assertEqual(cache.hits, 2)
+        self.assertEqual(len(cache), num_entries)
+
+        # equivalent renderers share cache entries, others don't
+        fr2 = HtmlFragmentRenderer()
+        fr2.render_cache = cache
+        self.assertEqual(frag.render_standalone(fr2), expected_result)
+        self.assertEqual(cache.hits, 4)
+
+        fr3 = HtmlFragmentRenderer()
+        fr3.html_blocks_joiner = "\n\n"
+        fr3.render_cache = cache
+        frag.render_standalone(fr3)
+        self.assertEqual(cache.hits, 4)
+
+        fr4 = TextFragmentRenderer()
+        fr4.render_cache = cache
+        self.assertEqual(
+            frag.render_standalone(fr4),
+            frag.render_standalone(TextFragmentRenderer())
+        )
+
+    def test_context_dependent_content_not_cached(self):
+
+        env = LLMStandardEnvironment()
+        frag = env.make_fragment(
+            r"Plain \emph{paragraph}."
+            "\n\n"
+            r"Text with a footnote\footnote{\textbf{Here}}."
+        )
+
+        def render_fn(render_context):
+            return frag.render(render_context)
+
+        expected_result, _ = env.make_document(render_fn).render(HtmlFragmentRenderer())
+
+        cache = LLMRenderCache()
+        fr = HtmlFragmentRenderer()
+        fr.render_cache = cache
+
+        for j in range(2):
+            result, render_context = env.make_document(render_fn).render(fr)
+            self.assertEqual(result, expected_result)
+            endnotes = render_context.feature_render_manager('endnotes').endnotes
+            self.assertEqual(len(endnotes['footnote']), 1)
+
+        # only the first paragraph was taken from the cache
+        self.assertEqual(cache.hits, 1)
+
+    def test_bounded(self):
+
+        env = LLMStandardEnvironment()
+        frag = env.make_fragment(
+            "\n\n".join([ f"Paragraph \\emph{{{j}}}." for j in range(10) ]),
+            standalone_mode=True,
+        )
+
+        cache = LLMRenderCache(max_size=3)
+        fr = HtmlFragmentRenderer()
+        fr.render_cache = cache
+        frag.render_standalone(fr)
+        self.assertEqual(len(cache), 3)
+
+        cache = LLMRenderCache(max_total_length=100)
+        fr.render_cache = cache
+        frag.render_standalone(fr)
+        self.assertLessEqual(
+            sum([ len(value) for node, value in cache._entries.values() ]),
+            100
+        )
+        self.assertGreater(len(cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()